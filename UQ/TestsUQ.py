@@ -163,7 +163,7 @@ def do_test(d, a, b, f, distris, boundary=True, modified_basis=False, lmax=2, so
         op.calculate_PCE(poly_deg_max, combiinstance)
     else:
         op.calculate_PCE(poly_deg_max, combiinstance, use_combiinstance_solution=False)
-    print("gPCE is ", cp.around(op.get_gPCE(), 3))
+    print("gPCE is ", cp.around(op.get_gPCE().to_chaospy(), 3))
 
     E_PCE, Var_PCE = op.get_expectation_and_variance_PCE()
     first_sens = op.get_first_order_sobol_indices()
@@ -171,7 +171,7 @@ def do_test(d, a, b, f, distris, boundary=True, modified_basis=False, lmax=2, so
 
     print("calculate_PCE_chaospy…")
     op.calculate_PCE_chaospy(poly_deg_max, 12)
-    print("non-sparsegrid gPCE is ", cp.around(op.get_gPCE(), 3))
+    print("non-sparsegrid gPCE is ", cp.around(op.get_gPCE().to_chaospy(), 3))
     E_PCE2, Var_PCE2 = op.get_expectation_and_variance_PCE()
     first_sens2 = op.get_first_order_sobol_indices()
     total_sens2 = op.get_total_order_sobol_indices()
@@ -1,9 +1,11 @@
 from math import log2
 import scipy.integrate as integrate
 import numpy as np
+import scipy.sparse as sparse
 import abc
 from math import isclose, isinf
 from math import log2
+from typing import Tuple
 
 
 class BasisFunction(object):
@@ -23,17 +25,108 @@ class BasisFunction(object):
     def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
         pass
 
+    # evaluates the basis function at all points of the 1D array x; overwrite if a vectorized evaluation is possible
+    def evaluate_points(self, x: np.array) -> np.array:
+        return np.array([self(x_i) for x_i in x], dtype=float)
+
+    # evaluates the first derivative at all points of the 1D array x
+    def evaluate_first_derivative_points(self, x: np.array) -> np.array:
+        return np.array([self.get_first_derivative(x_i) for x_i in x], dtype=float)
+
+    # evaluates the second derivative at all points of the 1D array x
+    def evaluate_second_derivative_points(self, x: np.array) -> np.array:
+        return np.array([self.get_second_derivative(x_i) for x_i in x], dtype=float)
+
+
+# integrates the basis function over [a,b] with the Gauss rule (coordsD, weightsD on [-1,1]) applied to each of the
+# intervals defined by the breakpoints; all quadrature points are evaluated at once
+def integrate_piecewise(basis: BasisFunction, breakpoints: np.array, a: float, b: float, coordsD: np.array,
+                        weightsD: np.array) -> float:
+    breakpoints = np.asarray(breakpoints, dtype=float)
+    left = breakpoints[:-1]
+    right = breakpoints[1:]
+    overlapping = (right >= a) & (left <= b)
+    if not np.any(overlapping):
+        return 0.0
+    left_border = np.maximum(left[overlapping], a)
+    right_border = np.minimum(right[overlapping], b)
+    half_width = (right_border - left_border) / 2.0
+    coords = (np.asarray(coordsD)[None, :] + 1) * half_width[:, None] + left_border[:, None]
+    weights = np.asarray(weightsD)[None, :] * half_width[:, None]
+    f_evals = basis.evaluate_points(coords.ravel())
+    return float(np.inner(f_evals, weights.ravel()))
+
+
+def evaluate_bspline_table(p: int, knots: np.array, x: np.array, derivative: int=0) -> Tuple[np.array, np.array]:
+    # evaluates all B-splines of degree p on the knot vector at the points x with the (non-recursive) triangular
+    # Cox-de Boor scheme; returns the index of the first non-zero spline for each point and the values (or
+    # derivatives) of the p+1 non-zero splines starting at this index (shape: (len(x), p+1))
+    # the splines are defined on half open intervals [knots[i], knots[i+1]) like in the recursive definition
+    knots = np.asarray(knots, dtype=float)
+    x = np.asarray(x, dtype=float)
+    num_splines = len(knots) - p - 1
+    # pad the knot vector with p auxiliary knots on each side so that the triangular scheme never leaves the array;
+    # splines of the original knot vector only depend on their own knots and are therefore not affected
+    spacing_left = knots[1] - knots[0]
+    spacing_right = knots[-1] - knots[-2]
+    padded_knots = np.concatenate((knots[0] - spacing_left * np.arange(p, 0, -1), knots,
+                                   knots[-1] + spacing_right * np.arange(1, p + 1)))
+    interval = np.searchsorted(knots, x, side='right') - 1
+    inside = (interval >= 0) & (x < knots[-1])
+    interval = np.where(inside, interval, 0)
+    mu = interval + p
+    values = np.ones((len(x), 1))
+    for q in range(1, p + 1):
+        # values[:, j] holds N_{mu-q+1+j, q-1}
+        i = mu[:, None] - q + np.arange(q + 1)[None, :]
+        t_i = padded_knots[i]
+        t_i_q = padded_knots[i + q]
+        t_i_1 = padded_knots[i + 1]
+        t_i_q_1 = padded_knots[i + q + 1]
+        lower = np.zeros((len(x), q + 1))
+        upper = np.zeros((len(x), q + 1))
+        lower[:, 1:] = values
+        upper[:, :-1] = values
+        if q > p - derivative:
+            # differentiate: d/dx N_{i,q} = q / (t_{i+q} - t_i) N_{i,q-1} - q / (t_{i+q+1} - t_{i+1}) N_{i+1,q-1}
+            values = q / (t_i_q - t_i) * lower - q / (t_i_q_1 - t_i_1) * upper
+        else:
+            values = (x[:, None] - t_i) / (t_i_q - t_i) * lower + (t_i_q_1 - x[:, None]) / (t_i_q_1 - t_i_1) * upper
+    if derivative > p:
+        values = np.zeros((len(x), p + 1))
+    values[~inside] = 0.0
+    first_index = interval - p
+    # remove the contributions of the auxiliary splines that are not part of the original knot vector
+    spline_indices = first_index[:, None] + np.arange(p + 1)[None, :]
+    values[(spline_indices < 0) | (spline_indices >= num_splines)] = 0.0
+    return first_index, values
+
+
+def get_bspline_matrix(p: int, knots: np.array, x: np.array, derivative: int=0) -> sparse.csr_matrix:
+    # returns the sparse band matrix with the values (or derivatives) of all B-splines of degree p on the knot vector
+    # at the points x; entry [j, i] contains the value of spline i at point x[j]
+    x = np.asarray(x, dtype=float)
+    num_splines = len(knots) - p - 1
+    first_index, values = evaluate_bspline_table(p, knots, x, derivative)
+    columns = first_index[:, None] + np.arange(p + 1)[None, :]
+    rows = np.repeat(np.arange(len(x)), p + 1).reshape(len(x), p + 1)
+    valid = (columns >= 0) & (columns < num_splines) & (values != 0.0)
+    return sparse.csr_matrix((values[valid], (rows[valid], columns[valid])), shape=(len(x), num_splines))
+
 
 class BSpline(BasisFunction):
     def __init__(self, p: int, index: int, knots: np.array):
         self.p = p
-        self.knots = knots
+        self.knots = np.asarray(knots, dtype=float)
         self.index = index
         self.startIndex = index
         self.endIndex = index + p + 1
         assert(index <= len(knots) - p - 2)
 
+    # scalar points are evaluated with the recursion (less overhead), arrays with the table of evaluate_bspline_table
     def __call__(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_points(np.ravel(x)).reshape(np.shape(x))
         return self.recursive_eval(x, self.p, self.index)
 
     def recursive_eval(self, x: float, p: int, k: int) -> float:
@@ -52,12 +145,6 @@ class BSpline(BasisFunction):
         else:
             return 0.0
 
-    def get_first_derivative(self, x: float) -> float:
-        return self.get_first_derivative_recursive(x, self.p, self.index)
-
-    def get_second_derivative(self, x: float) -> float:
-        return self.get_second_derivative_recursive(x, self.p, self.index)
-
     def get_first_derivative_recursive(self, x: float, p: int, k: int) -> float:
         if p == 0:
             return 0.0
@@ -78,21 +165,38 @@ class BSpline(BasisFunction):
         result += (self.knots[k + p + 1] - x) / (self.knots[k + p + 1] - self.knots[k + 1]) * self.get_second_derivative_recursive(x, p-1, k+1)
         return result
 
-    def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
-        result = 0.0
-        for i in range(self.startIndex, self.endIndex):
-            if self.knots[i+1] >= a and self.knots[i] <= b:
-                left_border = max(self.knots[i], a)
-                right_border = min(self.knots[i+1], b)
-                coords = np.array(coordsD)
-                coords += 1
-                coords *= (right_border - left_border) / 2.0
-                coords += left_border
-                weights = np.array(weightsD) * (right_border - left_border) / 2
-                f_evals = np.array([self(coord) for coord in coords])
-                result += np.inner(f_evals, weights)
+    def evaluate_points(self, x: np.array) -> np.array:
+        return self.evaluate_derivative_points(x, 0)
+
+    def evaluate_first_derivative_points(self, x: np.array) -> np.array:
+        return self.evaluate_derivative_points(x, 1)
+
+    def evaluate_second_derivative_points(self, x: np.array) -> np.array:
+        return self.evaluate_derivative_points(x, 2)
+
+    def evaluate_derivative_points(self, x: np.array, derivative: int) -> np.array:
+        x = np.asarray(x, dtype=float)
+        result = np.zeros(len(x))
+        # only the points in the support [knots[index], knots[index+p+1]) are evaluated
+        in_support = (self.knots[self.startIndex] <= x) & (x < self.knots[self.endIndex])
+        if np.any(in_support):
+            first_index, values = evaluate_bspline_table(self.p, self.knots, x[in_support], derivative)
+            result[in_support] = values[np.arange(len(first_index)), self.index - first_index]
         return result
 
+    def get_first_derivative(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_first_derivative_points(np.ravel(x)).reshape(np.shape(x))
+        return self.get_first_derivative_recursive(x, self.p, self.index)
+
+    def get_second_derivative(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_second_derivative_points(np.ravel(x)).reshape(np.shape(x))
+        return self.get_second_derivative_recursive(x, self.p, self.index)
+
+    def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
+        return integrate_piecewise(self, self.knots[self.startIndex:self.endIndex + 1], a, b, coordsD, weightsD)
+
 
 class LagrangeBasis(BasisFunction):
     def __init__(self, p: int, index: int, knots: np.array):
@@ -114,6 +218,14 @@ class LagrangeBasis(BasisFunction):
                 result *= (x - self.knots[i])
         return result * self.factor
 
+    def evaluate_points(self, x: np.array) -> np.array:
+        x = np.asarray(x, dtype=float)
+        result = np.ones(len(x))
+        for i, knot in enumerate(self.knots):
+            if self.index != i:
+                result *= (x - knot)
+        return result * self.factor
+
     def get_first_derivative(self, x: float) -> float:
         return self.derivative_for_index(x, [self.index])
 
@@ -185,6 +297,11 @@ class LagrangeBasisRestricted(LagrangeBasis):
         result += np.inner(f_evals, weights)
         return result
 
+    def evaluate_points(self, x: np.array) -> np.array:
+        x = np.asarray(x, dtype=float)
+        start, end = self.get_boundaries()
+        return np.where((start <= x) & (x <= end), super().evaluate_points(x), 0.0)
+
     def point_in_support(self, x):
         start, end = self.get_boundaries()
         return start <= x <= end
@@ -212,6 +329,10 @@ class LagrangeBasisRestrictedModified(LagrangeBasisRestricted):
         if self.is_right_border:
             self.basis3 = LagrangeBasis(self.p, len(self.knots) - 1, self.knots)
 
+    def evaluate_points(self, x: np.array) -> np.array:
+        # the modifications at the boundary are only implemented for scalar evaluations
+        return BasisFunction.evaluate_points(self, x)
+
     def __call__(self, x: float) -> float:
         if self.point_in_support(x):
             if self.level == 1:
@@ -256,30 +377,17 @@ class HierarchicalNotAKnotBSpline(BasisFunction):
     def __call__(self, x: float) -> float:
         return self.spline(x)
 
-    def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
-        result = 0.0
-        for i in range(self.startIndex, self.endIndex):
-            if self.knots[i+1] >= a and self.knots[i] <= b:
-                left_border = max(self.knots[i], a)
-                right_border = min(self.knots[i+1], b)
-                coords = np.array(coordsD)
-                coords += 1
-                coords *= (right_border - left_border) / 2.0
-                coords += left_border
-                weights = np.array(weightsD) * (right_border - left_border) / 2
-                f_evals = np.array([self(coord) for coord in coords])
-                #print(coordsD, a, b, weights)
-                result += np.inner(f_evals, weights)
-
-        #if self.level < log2(self.p + 1):
-        #    #print(integrate.quad(self, a, b, epsabs=1.49e-20, epsrel=1.49e-14))
-        #    result2 = integrate.quad(self, a, b, epsabs=1.49e-20, epsrel=1.49e-14)[0]
-        #else:
-        #    #print(integrate.quad(self, max(a,self.knots[self.index]), min(b, self.knots[self.index + (self.p+1)]), epsabs=1.49e-20, epsrel=1.49e-14))
-        #    result2 = integrate.quad(self, max(a,self.knots[self.index]), min(b, self.knots[self.index + (self.p+1)]), epsabs=1.49e-20, epsrel=1.49e-14)[0]
-        #print(result, result2)
+    def evaluate_points(self, x: np.array) -> np.array:
+        return self.spline.evaluate_points(x)
 
-        return result
+    def evaluate_first_derivative_points(self, x: np.array) -> np.array:
+        return self.spline.evaluate_first_derivative_points(x)
+
+    def evaluate_second_derivative_points(self, x: np.array) -> np.array:
+        return self.spline.evaluate_second_derivative_points(x)
+
+    def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
+        return integrate_piecewise(self, self.knots[self.startIndex:self.endIndex + 1], a, b, coordsD, weightsD)
 
     def get_first_derivative(self, x: float) -> float:
         return self.spline.get_first_derivative(x)
@@ -332,21 +440,54 @@ class HierarchicalNotAKnotBSplineModified(BasisFunction):
         else:
             return self.spline(x)
 
-    def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
-        result = 0.0
-        for i in range(self.startIndex, self.endIndex):
-            if self.knots[i+1] >= a and self.knots[i] <= b:
-                left_border = max(self.knots[i], a)
-                right_border = min(self.knots[i+1], b)
-                coords = np.array(coordsD)
-                coords += 1
-                coords *= (right_border - left_border) / 2.0
-                coords += left_border
-                weights = np.array(weightsD) * (right_border - left_border) / 2
-                f_evals = np.array([self(coord) for coord in coords])
-                result += np.inner(f_evals, weights)
+    # returns the factor and the boundary spline that is added to the spline at the boundary (None otherwise)
+    def get_boundary_correction(self) -> Tuple[float, BasisFunction]:
+        if self.level >= 2 and self.index == 1:
+            if self.p > 1:
+                return -self.spline.get_second_derivative(self.a) / self.spline2.get_second_derivative(self.a), self.spline2
+            return 2.0, self.spline2
+        elif self.level >= 2 and self.index == 2**self.level - 1:
+            if self.p > 1:
+                return -self.spline.get_second_derivative(self.b) / self.spline3.get_second_derivative(self.b), self.spline3
+            return 2.0, self.spline3
+        return None
+
+    def evaluate_points(self, x: np.array) -> np.array:
+        if self.level == 1:
+            assert(self.index == 1)
+            return np.ones(len(x))
+        result = self.spline.evaluate_points(x)
+        correction = self.get_boundary_correction()
+        if correction is not None:
+            factor, boundary_spline = correction
+            result += factor * boundary_spline.evaluate_points(x)
+        return result
+
+    def evaluate_first_derivative_points(self, x: np.array) -> np.array:
+        if self.level == 1:
+            assert(self.index == 1)
+            return np.zeros(len(x))
+        result = self.spline.evaluate_first_derivative_points(x)
+        correction = self.get_boundary_correction()
+        if correction is not None:
+            factor, boundary_spline = correction
+            result += factor * boundary_spline.evaluate_first_derivative_points(x)
         return result
 
+    def evaluate_second_derivative_points(self, x: np.array) -> np.array:
+        if self.level == 1:
+            assert(self.index == 1)
+            return np.zeros(len(x))
+        result = self.spline.evaluate_second_derivative_points(x)
+        correction = self.get_boundary_correction()
+        if correction is not None:
+            factor, boundary_spline = correction
+            result += factor * boundary_spline.evaluate_second_derivative_points(x)
+        return result
+
+    def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
+        return integrate_piecewise(self, self.knots[self.startIndex:self.endIndex + 1], a, b, coordsD, weightsD)
+
     def get_first_derivative(self, x: float) -> float:
         if self.level == 1:
             assert(self.index == 1)
@@ -0,0 +1,109 @@
+import abc
+import threading
+import multiprocessing as mp
+from concurrent import futures
+from typing import Any, Callable, List, Sequence
+from sparseSpACE.ComponentGridInfo import ComponentGridInfo
+
+
+# This class defines the interface of an executor that applies a task to all component grids of a combination scheme.
+# The component grids are independent of each other so the executor is free to distribute them over several workers.
+# The results are always returned in the order of the component grids so that the combination of the partial
+# results is reproducible independent of the number of workers.
+class ComponentGridExecutor(object):
+    def __init__(self, num_workers: int = None):
+        self.num_workers = num_workers if num_workers is not None else mp.cpu_count()
+
+    @abc.abstractmethod
+    def map(self, context, task: Callable[[Any, ComponentGridInfo], Any],
+            component_grids: Sequence[ComponentGridInfo]) -> List[Any]:
+        """This method applies the task to every component grid and returns the results in the same order.
+
+        :param context: Object that is passed to the task (e.g. GridOperation or StandardCombi). It has to provide
+        get_worker_copy() if the executor uses multiple threads.
+        :param task: Callable task(context, component_grid) that computes the result for one component grid. It
+        must not change the state of the context (except for caches).
+        :param component_grids: Component grids for which the task should be executed.
+        :return: List of results (one for each component grid).
+        """
+        pass
+
+
+# This executor evaluates the component grids one after another in the current process.
+class SerialComponentGridExecutor(ComponentGridExecutor):
+    def __init__(self):
+        super().__init__(num_workers=1)
+
+    def map(self, context, task, component_grids):
+        return [task(context, component_grid) for component_grid in component_grids]
+
+
+# This executor distributes the component grids over a pool of threads. Each thread works on its own copy of the
+# context (with a private grid) as the grids store the state of the current component grid. The function and its
+# cached values are shared between the threads. This executor is beneficial if the function evaluations release the
+# GIL (e.g. numpy or external simulation codes).
+class ThreadComponentGridExecutor(ComponentGridExecutor):
+    def map(self, context, task, component_grids):
+        local_storage = threading.local()
+
+        def evaluate(component_grid):
+            worker_context = getattr(local_storage, 'context', None)
+            if worker_context is None:
+                worker_context = local_storage.context = context.get_worker_copy()
+            return task(worker_context, component_grid)
+
+        with futures.ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            return list(pool.map(evaluate, component_grids))
+
+
+# Context and task of the current worker process; set once per process by the pool initializer
+_worker_context = None
+_worker_task = None
+
+
+def _initialize_worker(context, task):
+    global _worker_context, _worker_task
+    _worker_context = context
+    _worker_task = task
+
+
+def _evaluate_in_worker(component_grid):
+    return _worker_task(_worker_context, component_grid)
+
+
+# This executor distributes the component grids over a pool of processes. The context is transferred once to every
+# worker process. Caches that are filled in the worker processes (e.g. the function values of a Function) are not
+# transferred back to the main process, so the number of distinct points reported afterwards only contains the
+# evaluations of the main process. Task and context have to be picklable if the start method is not fork.
+class ProcessComponentGridExecutor(ComponentGridExecutor):
+    def __init__(self, num_workers: int = None, chunksize: int = 1):
+        super().__init__(num_workers=num_workers)
+        self.chunksize = chunksize
+
+    def map(self, context, task, component_grids):
+        with mp.Pool(self.num_workers, initializer=_initialize_worker, initargs=(context, task)) as pool:
+            results = pool.map(_evaluate_in_worker, component_grids, chunksize=self.chunksize)
+        return results
+
+
+def partial_result_task(operation, component_grid: ComponentGridInfo):
+    """Task that computes the partial result of the operation on the component grid.
+
+    :param operation: GridOperation which is applied.
+    :param component_grid: ComponentGridInfo of the component grid.
+    :return: Partial result of the component grid.
+    """
+    return operation.compute_partial_result(component_grid)
+
+
+def multiplied_interpolation_task(combi_instance, component_grid: ComponentGridInfo,
+                                  interpolation_points: Sequence[Sequence[float]]):
+    """Task that interpolates the component grid at the interpolation points and multiplies the result with the
+    combination coefficient.
+
+    :param combi_instance: StandardCombi (or derived) instance which is used for the interpolation.
+    :param component_grid: ComponentGridInfo of the component grid.
+    :param interpolation_points: List of points at which we want to evaluate/interpolate.
+    :return: Interpolated values multiplied by the coefficient.
+    """
+    return combi_instance.interpolate_points(interpolation_points, component_grid) * component_grid.coefficient
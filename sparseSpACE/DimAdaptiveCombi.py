@@ -1,6 +1,7 @@
 from sparseSpACE.StandardCombi import *
 from sparseSpACE.combiScheme import *
 from sparseSpACE.Grid import *
+import heapq
 
 
 # T his class implements the standard combination technique
@@ -8,26 +9,35 @@ class DimAdaptiveCombi(StandardCombi):
     # initialization
     # a = lower bound of integral; b = upper bound of integral
     # grid = specified grid (e.g. Trapezoidal);
-    def __init__(self, a, b, operation, norm=2, compute_no_cost: bool=False):
+    def __init__(self, a, b, operation, norm=2, compute_no_cost: bool=False, print_output: bool=False,
+                 log_level: int=log_levels.INFO, print_level: int=print_levels.INFO):
         self.log = logging.getLogger(__name__)
         self.dim = len(a)
         self.a = a
         self.b = b
         self.operation = operation
+        self.executor = SerialComponentGridExecutor()
         self.combischeme = CombiScheme(self.dim)
         self.grid = self.operation.get_grid()
         self.norm = norm
         self.compute_no_cost = compute_no_cost
+        self.print_output = print_output
+        self.log_util = LogUtility(log_level=log_level, print_level=print_level)
+        self.log_util.set_print_prefix('DimAdaptiveCombi')
+        self.log_util.set_log_prefix('DimAdaptiveCombi')
         assert (len(a) == len(b))
 
-    # standard dimension-adaptive combination scheme for quadrature
+    # standard dimension-adaptive combination scheme for quadrature (Gerstner and Griebel)
     # lmin = minimum level; lmax = target level
-    # f = function to integrate; dim=dimension of problem
-    def perform_combi(self, minv, maxv, tolerance, max_number_of_points: int=None):
-        start = self.a
-        end = self.b
+    # tolerance = relative error w.r.t. the reference solution at which the refinement stops
+    # refinements_per_iteration = number of active indices that are refined before the error is checked again
+    # The active indices are kept in a priority queue ordered by their error indicator. The error indicator of an index
+    # does not change after it was computed so only the newly activated indices have to be evaluated. In the same way
+    # the combined integral is updated only with the component grids whose coefficients changed.
+    def perform_combi(self, minv, maxv, tolerance, max_number_of_points: int=None, refinements_per_iteration: int=1):
         self.operation.initialize()
         assert maxv == 2
+        assert refinements_per_iteration >= 1
         # compute minimum and target level vector
         self.lmin = [minv for i in range(self.dim)]
         self.lmax = [maxv for i in range(self.dim)]
@@ -35,56 +45,66 @@ class DimAdaptiveCombi(StandardCombi):
         assert(real_integral is not None)
         self.combischeme.init_adaptive_combi_scheme(maxv, minv)
         combiintegral = 0
-        self.scheme = self.combischeme.getCombiScheme(self.lmin[0], self.lmax[0])
         integral_dict = {}
+        # coefficients of the component grids that are contained in combiintegral
+        coefficients = {}
+        # max-heap of active indices with entries (-error indicator, counter, levelvector)
+        active_queue = []
+        queued_indices = set()
+        counter = 0
         errors = []  # tracks the error evolution during the refinement procedure
         num_points = []  # tracks the number of points during the refinement procedure
         while True:
-            combiintegral = 0
-            self.scheme = self.combischeme.getCombiScheme(self.lmin[0], self.lmax[0], do_print=False)
-            error_array = np.zeros(len(self.scheme))
-            # calculate integral for function self.operation.f
-            for i, component_grid in enumerate(self.scheme):
-                if tuple(component_grid.levelvector) not in integral_dict:
-                    integral = self.operation.grid.integrate(self.operation.f, component_grid.levelvector, start, end)
-                    integral_dict[tuple(component_grid.levelvector)] = integral
+            # update the combined integral and the queue with the component grids that changed in the last refinement
+            for levelvector, coefficient in self.combischeme.get_coefficient_changes().items():
+                coefficient_change = coefficient - coefficients.get(levelvector, 0)
+                if coefficient_change != 0:
+                    combiintegral = combiintegral + self.get_integral(levelvector, integral_dict) * coefficient_change
+                if coefficient == 0:
+                    coefficients.pop(levelvector, None)
                 else:
-                    integral = integral_dict[tuple(component_grid.levelvector)]
-                combiintegral += integral * component_grid.coefficient
-            # calculate errors
-            for i, component_grid in enumerate(self.scheme):
-                if self.combischeme.is_refinable(component_grid.levelvector):
+                    coefficients[levelvector] = coefficient
+                for d in range(self.dim):
+                    self.lmax[d] = max(self.lmax[d], levelvector[d])
+                if self.combischeme.is_refinable(levelvector) and levelvector not in queued_indices:
                     # as error estimator we use the error calculation from Hemcker and Griebel
-                    error_array[i] = self.calculate_surplus(component_grid, integral_dict) if self.combischeme.is_refinable(component_grid.levelvector) else 0
-                    #error_array[i] = abs(integral - real_integral) / abs(real_integral) / np.prod(
-                    #   self.operation.grid.levelToNumPoints(component_grid.levelvector)) if self.combischeme.is_refinable(component_grid.levelvector) else 0
-            do_refine = True
+                    error = self.calculate_surplus(ComponentGridInfo(levelvector, coefficient), integral_dict)
+                    heapq.heappush(active_queue, (-error, counter, levelvector))
+                    queued_indices.add(levelvector)
+                    counter += 1
+            self.scheme = self.combischeme.getCombiScheme(self.lmin[0], self.lmax[0], do_print=False)
+            relative_error = max(abs(combiintegral - real_integral) / abs(real_integral))
             max_points_reached = False if max_number_of_points is None else self.get_total_num_points() > max_number_of_points
-            if max(abs(combiintegral - real_integral) / abs(real_integral)) < tolerance or max_points_reached:
+            if relative_error < tolerance or max_points_reached or len(active_queue) == 0:
                 break
-            print("Current combi integral:", combiintegral)
-            print("Current relative error:", max(abs(combiintegral - real_integral) / abs(real_integral)))
-            errors.append(max(abs(combiintegral - real_integral) / abs(real_integral)))
+            self.log_util.log_info("Current combi integral: {0}".format(combiintegral))
+            self.log_util.log_info("Current relative error: {0}".format(relative_error))
+            errors.append(relative_error)
             num_points.append(self.get_total_num_points(distinct_function_evals=True))
-            while do_refine:
-                grid_id = np.argmax(error_array)
-                # print(error_array)
-                print("Current error:", abs(combiintegral - real_integral) / abs(real_integral))
-                print("Refining", self.scheme[grid_id].levelvector)
-                refined_dims = self.combischeme.update_adaptive_combi(self.scheme[grid_id].levelvector)
-                do_refine = refined_dims == []
-                error_array[grid_id] = 0.0
-            self.scheme = self.combischeme.getCombiScheme(self.lmin[0], self.lmax[0], do_print=True)
-            for component_grid in self.scheme:
-                for d in range(self.dim):
-                    self.lmax[d] = max(self.lmax[d], component_grid.levelvector[d])
-        print("Final scheme:")
-        self.scheme = self.combischeme.getCombiScheme(self.lmin[0], self.lmax[0], do_print=True)
-        print("CombiSolution", combiintegral)
-        print("Analytic Solution", real_integral)
-        print("Difference", abs(combiintegral - real_integral))
+            num_refinements = 0
+            while num_refinements < refinements_per_iteration and len(active_queue) > 0:
+                _, _, levelvector = heapq.heappop(active_queue)
+                queued_indices.remove(levelvector)
+                self.log_util.log_debug("Refining {0}".format(levelvector))
+                refined_dims = self.combischeme.update_adaptive_combi(levelvector)
+                # only refinements that added new component grids are counted
+                if refined_dims:
+                    num_refinements += 1
+        if self.print_output:
+            print("Final scheme:")
+            self.combischeme.getCombiScheme(self.lmin[0], self.lmax[0], do_print=True)
+        self.log_util.log_info("CombiSolution {0}".format(combiintegral))
+        self.log_util.log_info("Analytic Solution {0}".format(real_integral))
+        self.log_util.log_info("Difference {0}".format(abs(combiintegral - real_integral)))
         return self.scheme, abs(combiintegral - real_integral), combiintegral, errors, num_points
 
+    # returns the integral of the component grid with the specified levelvector; each grid is only integrated once
+    def get_integral(self, levelvector, integral_dict):
+        levelvector = tuple(levelvector)
+        if levelvector not in integral_dict:
+            integral_dict[levelvector] = self.operation.grid.integrate(self.operation.f, levelvector, self.a, self.b)
+        return integral_dict[levelvector]
+
     def calculate_surplus(self, component_grid, integral_dict):
         assert self.combischeme.is_refinable(component_grid.levelvector)
         stencils = []
@@ -100,10 +120,8 @@ class DimAdaptiveCombi(StandardCombi):
         stencil_cross_product = get_cross_product(stencils)
         surplus = 0.0
         for stencil in stencil_cross_product:
-            levelvector = np.array(component_grid.levelvector) + np.array(stencil)
-            print(levelvector)
-            integral = integral_dict[tuple(levelvector)]
-            surplus += (-1)**sum(abs(np.array(stencil))) * integral
+            levelvector = tuple(map(lambda x, y: x + y, component_grid.levelvector, stencil))
+            integral = self.get_integral(levelvector, integral_dict)
+            surplus += (-1)**sum(abs(s) for s in stencil) * integral
         error = LA.norm(surplus/cost,self.norm)
-        print(error)
         return error
@@ -7,6 +7,12 @@ from matplotlib.colors import LogNorm
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from typing import Mapping, MutableMapping, Sequence, Iterable, List, Set, Tuple, Union
+from sparseSpACE.FunctionCache import *
+import threading
+
+# indicates per thread whether call_vectorized forwards to call_read_only, i.e. whether a wrapper function is evaluated
+# within call_read_only
+_read_only_mode = threading.local()
 
 # The function class is used to define several functions for testing the algorithm
 # it defines the basic interface that is used by the algorithm
@@ -17,41 +23,167 @@ class Function(object):
         self.f_dict = {}
         self.old_f_dict = {}
         self.do_cache = True  # indicates whether function values should be cached
+        self.persistent_cache = None  # optional cache that survives reset_dictionary() and the end of the process
+        self.compact_cache = False  # indicates whether the array-backed CompactFunctionCache is used as f_dict
+        self.read_only_points = PointKeySet()  # points used by call_read_only that are not stored in f_dict
         self.debug = False
 
     def reset_dictionary(self) -> None:
         # self.old_f_dict = {**self.old_f_dict, **self.f_dict}
-        self.old_f_dict = {}
-        self.f_dict = {}
+        # the persistent cache is not reset; its entries are loaded again on demand
+        self.old_f_dict = CompactFunctionCache() if self.compact_cache else {}
+        self.f_dict = CompactFunctionCache() if self.compact_cache else {}
+        self.read_only_points = PointKeySet()
+
+    def activate_compact_cache(self) -> None:
+        """This method replaces the tuple-keyed dictionaries of the cached function values by CompactFunctionCache
+        instances which store the points and values in contiguous arrays. This reduces the memory consumption for
+        large numbers of points and allows vectorized lookups of batched evaluations. Already cached values are kept.
+
+        :return: None
+        """
+        if self.compact_cache:
+            return
+        self.compact_cache = True
+        f_dict, old_f_dict = self.f_dict, self.old_f_dict
+        self.reset_dictionary()
+        self.f_dict.update(f_dict)
+        self.old_f_dict.update(old_f_dict)
+
+    def set_persistent_cache(self, persistent_cache: 'PersistentFunctionCache') -> None:
+        """This method sets a persistent cache (e.g. SQLiteFunctionCache) that is consulted if a point is not in the
+        in-memory cache. New evaluations are stored in both caches.
+
+        :param persistent_cache: Persistent cache or None to deactivate it.
+        :return: None
+        """
+        self.persistent_cache = persistent_cache
 
     def __call__(self, coordinates: Union[Tuple[float, ...], Sequence[Tuple[float]]]) -> Sequence[float]:
         f_value = None
         if np.isscalar(coordinates[0]):
             # single evaluation point
+            coords = tuple(coordinates)
             if self.do_cache:
-                coords = tuple(coordinates)
                 f_value = self.f_dict.get(coords, None)
                 if f_value is None:
                     f_value = self.old_f_dict.get(coords, None)
+                    if f_value is None and self.persistent_cache is not None:
+                        f_value = self.persistent_cache.get(coords)
                     if f_value is not None:
                         self.f_dict[coords] = f_value
             if f_value is None:
                 f_value = self.eval(coords)
                 if self.do_cache:
                     self.f_dict[coords] = f_value
+                    if self.persistent_cache is not None:
+                        self.persistent_cache.put(coords, f_value)
             if np.isscalar(f_value):
                 f_value = [f_value]
             assert len(f_value) == self.output_length(), "Wrong output_length()! Adjust the output length in your function!"
             return np.array(f_value)
         else:
-            if not isinstance(coordinates[0], tuple):
+            if not self.do_cache:
+                f_values = np.asarray(self.eval_vectorized(np.asarray(coordinates)))
+                return f_values.reshape((len(coordinates), self.output_length()))
+            if self.compact_cache:
+                return self.evaluate_with_compact_cache(np.asarray(coordinates, dtype=float))
+            points = None
+            if isinstance(coordinates, np.ndarray):
+                # arrays of points (e.g. from IntegratorTensorProduct) are converted to tuples for the dictionary;
+                # the array itself is used for the evaluation
+                points = coordinates
+                coordinates = list(map(tuple, coordinates.tolist()))
+            elif not isinstance(coordinates[0], tuple):
                 print("Warning: not passing tuples to Function -> less efficient!")
                 coordinates = [tuple(c) for c in coordinates]
-            f_values = np.asarray(self.eval_vectorized(np.asarray(coordinates)))
-            f_values = f_values.reshape((len(coordinates), self.output_length()))
-            self.f_dict.update(zip(coordinates, f_values))
+            f_values = np.empty((len(coordinates), self.output_length()))
+            # split the points into cached and uncached points in one pass; duplicate points are evaluated only once
+            missing_points = {}
+            cached_indices = []
+            cached_values = []
+            for i, coords in enumerate(coordinates):
+                f_value = self.f_dict.get(coords, None)
+                if f_value is None:
+                    f_value = self.old_f_dict.get(coords, None)
+                    if f_value is not None:
+                        self.f_dict[coords] = f_value
+                if f_value is None:
+                    missing_points.setdefault(coords, []).append(i)
+                else:
+                    cached_indices.append(i)
+                    cached_values.append(f_value)
+            if cached_indices:
+                try:
+                    cached_values = np.asarray(cached_values, dtype=float)
+                except ValueError:
+                    # the single point evaluations might have cached scalars instead of arrays
+                    cached_values = np.asarray([np.ravel(f_value) for f_value in cached_values], dtype=float)
+                f_values[cached_indices] = cached_values.reshape((len(cached_indices), self.output_length()))
+            if missing_points:
+                missing_coordinates = list(missing_points.keys())
+                if self.persistent_cache is not None:
+                    persistent_values = self.persistent_cache.get_many(missing_coordinates)
+                    for coords, f_value in zip(missing_coordinates, persistent_values):
+                        if f_value is not None:
+                            self.f_dict[coords] = f_value
+                            f_values[missing_points.pop(coords)] = f_value
+                    missing_coordinates = list(missing_points.keys())
+                if missing_coordinates:
+                    # only the misses are evaluated; the results are scattered back in the order of the request
+                    if points is not None:
+                        missing_array = points[[missing_points[coords][0] for coords in missing_coordinates]]
+                    else:
+                        missing_array = np.asarray(missing_coordinates)
+                    new_values = np.asarray(self.eval_vectorized(missing_array))
+                    new_values = new_values.reshape((len(missing_coordinates), self.output_length()))
+                    self.f_dict.update(zip(missing_coordinates, new_values))
+                    if self.persistent_cache is not None:
+                        self.persistent_cache.put_many(missing_coordinates, new_values)
+                    if len(missing_coordinates) == len(coordinates):
+                        f_values = new_values
+                    else:
+                        for coords, f_value in zip(missing_coordinates, new_values):
+                            f_values[missing_points[coords]] = f_value
             return f_values
 
+    def evaluate_with_compact_cache(self, coordinates: np.ndarray) -> np.ndarray:
+        """This method evaluates a batch of points using vectorized lookups in the CompactFunctionCache. Only the
+        distinct points which are in none of the caches are evaluated.
+
+        :param coordinates: Array of points (number of points x dimension).
+        :return: Array of function values (number of points x output length).
+        """
+        f_values = np.empty((len(coordinates), self.output_length()))
+        rows = self.f_dict.lookup(coordinates)
+        found = rows != -1
+        if np.any(found):
+            f_values[found] = self.f_dict.f_values[rows[found]]
+        missing = np.flatnonzero(~found)
+        if len(missing) > 0 and len(self.old_f_dict) > 0:
+            found_old, old_values = self.old_f_dict.get_many(coordinates[missing])
+            f_values[missing[found_old]] = old_values
+            self.f_dict.update_many(coordinates[missing[found_old]], old_values)
+            missing = missing[~found_old]
+        if len(missing) > 0:
+            missing_coordinates, inverse = np.unique(coordinates[missing] + 0.0, axis=0, return_inverse=True)
+            missing_values = np.empty((len(missing_coordinates), self.output_length()))
+            evaluate = np.ones(len(missing_coordinates), dtype=bool)
+            if self.persistent_cache is not None:
+                persistent_values = self.persistent_cache.get_many(missing_coordinates)
+                for i, f_value in enumerate(persistent_values):
+                    if f_value is not None:
+                        missing_values[i] = f_value
+                        evaluate[i] = False
+            if np.any(evaluate):
+                new_values = np.asarray(self.eval_vectorized(missing_coordinates[evaluate]))
+                new_values = new_values.reshape((np.count_nonzero(evaluate), self.output_length()))
+                missing_values[evaluate] = new_values
+                if self.persistent_cache is not None:
+                    self.persistent_cache.put_many(missing_coordinates[evaluate], new_values)
+            self.f_dict.update_many(missing_coordinates, missing_values)
+            f_values[missing] = missing_values[np.ravel(inverse)]
+        return f_values
 
     def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
         f_values = np.empty((*np.shape(coordinates)[:-1], self.output_length()))
@@ -62,6 +194,87 @@ class Function(object):
                 f_values[i, :] = self.eval_vectorized(coordinate)
         return f_values
 
+    # evaluates eval_vectorized for an array of points with shape (..., dim) and returns the values with an explicit
+    # output axis, i.e. with shape (..., output_length)
+    def eval_vectorized_output(self, coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+        coordinates = np.asarray(coordinates, dtype=float)
+        return np.reshape(self.eval_vectorized(coordinates), (*np.shape(coordinates)[:-1], self.output_length()))
+
+    def call_read_only(self, coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+        """This method evaluates the function for an array of points with shape (..., dim) and returns the values with
+        shape (..., output_length). Like __call__ it takes the values from f_dict, old_f_dict and the persistent cache
+        and only evaluates the missing points, but the new values are not stored in f_dict (only in the persistent
+        cache). Chunked evaluations use this so that the memory does not grow with the number of points. The points are
+        recorded in a compact key set so that they are still counted by get_num_distinct_points. Wrapper functions that
+        are evaluated here forward their batches (call_vectorized) with call_read_only as well.
+
+        :param coordinates: Array of points with shape (..., dim).
+        :return: Array of function values with shape (..., output_length).
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        points = np.reshape(coordinates, (-1, np.shape(coordinates)[-1]))
+        f_values = np.empty((len(points), self.output_length()))
+        missing = np.arange(len(points))
+        if self.do_cache and len(points) > 0:
+            found, values = self._get_cached_values(self.f_dict, points)
+            f_values[found] = values
+            missing = np.flatnonzero(~found)
+            self.read_only_points.add_many(points[missing])
+            if len(missing) > 0 and len(self.old_f_dict) > 0:
+                found, values = self._get_cached_values(self.old_f_dict, points[missing])
+                f_values[missing[found]] = values
+                missing = missing[~found]
+        if len(missing) > 0:
+            missing_points, inverse = np.unique(points[missing] + 0.0, axis=0, return_inverse=True)
+            missing_values = np.empty((len(missing_points), self.output_length()))
+            evaluate = np.ones(len(missing_points), dtype=bool)
+            if self.do_cache and self.persistent_cache is not None:
+                for i, f_value in enumerate(self.persistent_cache.get_many(missing_points)):
+                    if f_value is not None:
+                        missing_values[i] = f_value
+                        evaluate[i] = False
+            if np.any(evaluate):
+                read_only = getattr(_read_only_mode, 'enabled', False)
+                _read_only_mode.enabled = True
+                try:
+                    new_values = self.eval_vectorized_output(missing_points[evaluate])
+                finally:
+                    _read_only_mode.enabled = read_only
+                missing_values[evaluate] = new_values
+                if self.do_cache and self.persistent_cache is not None:
+                    self.persistent_cache.put_many(missing_points[evaluate], new_values)
+            f_values[missing] = missing_values[np.ravel(inverse)]
+        return np.reshape(f_values, (*np.shape(coordinates)[:-1], self.output_length()))
+
+    # returns the mask of the points that are in the cache (f_dict or old_f_dict) and their values without changing
+    # the cache
+    def _get_cached_values(self, cache, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(cache, CompactFunctionCache):
+            found, values = cache.get_many(points)
+            return found, np.reshape(values, (np.count_nonzero(found), self.output_length()))
+        found = np.zeros(len(points), dtype=bool)
+        values = []
+        for i, coords in enumerate(map(tuple, points.tolist())):
+            f_value = cache.get(coords, None)
+            if f_value is not None:
+                found[i] = True
+                # the single point evaluations might have cached scalars instead of arrays
+                values.append(np.ravel(f_value))
+        return found, np.reshape(np.asarray(values, dtype=float), (len(values), self.output_length()))
+
+    # evaluates the function with the cached values (see __call__) for an array of points with shape (..., dim) and
+    # returns the values with shape (..., output_length); wrapper functions use this to forward batches
+    def call_vectorized(self, coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+        if getattr(_read_only_mode, 'enabled', False):
+            return self.call_read_only(coordinates)
+        coordinates = np.asarray(coordinates, dtype=float)
+        points = np.reshape(coordinates, (-1, np.shape(coordinates)[-1]))
+        if len(points) == 0:
+            values = np.empty((0, self.output_length()))
+        else:
+            values = self(points)
+        return np.reshape(values, (*np.shape(coordinates)[:-1], self.output_length()))
+
     def check_vectorization(self, coordinates, result):
         if self.debug:
             for i in range(len(coordinates)):
@@ -75,11 +288,23 @@ class Function(object):
     def get_f_dict_size(self) -> int:
         return len(self.f_dict)
 
+    # returns the number of distinct points that were used, i.e. the points in f_dict and the points that were used by
+    # call_read_only without being stored in f_dict
+    def get_num_distinct_points(self) -> int:
+        if len(self.read_only_points) == 0:
+            return len(self.f_dict)
+        points = self.f_dict.keys() if self.compact_cache else list(self.f_dict.keys())
+        if len(points) == 0:
+            return len(self.read_only_points)
+        num_shared_points = np.count_nonzero(self.read_only_points.contains_many(np.asarray(points, dtype=float)))
+        return len(self.f_dict) + len(self.read_only_points) - num_shared_points
+
     def get_f_dict_points(self):
-        return list(self.f_dict.keys())
+        # the compact cache returns an array view of the points instead of a list
+        return self.f_dict.keys() if self.compact_cache else list(self.f_dict.keys())
 
     def get_f_dict_values(self):
-        return list(self.f_dict.values())
+        return self.f_dict.values() if self.compact_cache else list(self.f_dict.values())
 
     # evaluates the function at the specified coordinate
     @abc.abstractmethod
@@ -201,6 +426,17 @@ class FunctionShift(Function):
         shifted_coordinates = self.shift(coordinates)
         return self.function.eval(shifted_coordinates)
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        coordinates = np.asarray(coordinates, dtype=float)
+        # the shift is defined for single points; the shifted points are evaluated as one batch
+        points = np.reshape(coordinates, (-1, np.shape(coordinates)[-1]))
+        shifted_coordinates = np.array([self.shift(point) for point in points], dtype=float)
+        shifted_coordinates = np.reshape(shifted_coordinates, (*np.shape(coordinates)[:-1], -1))
+        return self.function.eval_vectorized_output(shifted_coordinates)
+
+    def output_length(self) -> int:
+        return self.function.output_length()
+
     def getAnalyticSolutionIntegral(self, start, end):
         start_shifted = self.shift(start)
         end_shifted = self.shift(end)
@@ -220,6 +456,9 @@ class FunctionUQNormal(Function):
     def eval(self, coordinates):
         return self.function(np.asarray(coordinates) * np.asarray(self.std_dev) + np.asarray(self.mean))
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        return self.function.call_vectorized(np.asarray(coordinates) * np.asarray(self.std_dev) + np.asarray(self.mean))
+
     def eval_with_normal(self, coordinates):
         value = self.eval(coordinates)
         dim = len(coordinates)
@@ -295,6 +534,11 @@ class FunctionUQWeighted(Function):
         weight_output = self.weight_function(coordinates)[0]
         return func_output * weight_output
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        func_output = self.function.call_vectorized(coordinates)[..., 0]
+        weight_output = self.weight_function.call_vectorized(coordinates)[..., 0]
+        return func_output * weight_output
+
 
 # An UQ test function: https://www.sfu.ca/~ssurjano/canti.html
 class FunctionCantileverBeamD(Function):
@@ -312,6 +556,19 @@ class FunctionCantileverBeamD(Function):
         D = 4.0 * L ** 3 / (E * w * t) * math.sqrt((Y / t ** 2) ** 2 + (X / w ** 2) ** 2)
         return [D, 1.0]
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        coordinates = np.asarray(coordinates, dtype=float)
+        assert np.shape(coordinates)[-1] == 3
+        w = self.w
+        t = self.t
+        L = 100.0
+        E, Y, X = coordinates[..., 0], coordinates[..., 1], coordinates[..., 2]
+        D = 4.0 * L ** 3 / (E * w * t) * np.sqrt((Y / t ** 2) ** 2 + (X / w ** 2) ** 2)
+        return np.stack([D, np.ones_like(D)], axis=-1)
+
+    def output_length(self) -> int:
+        return 2
+
     def getAnalyticSolutionIntegral(self, start, end): assert "not implemented"
 
 class CustomFunction(Function):
@@ -338,6 +595,18 @@ class FunctionG(Function):
         a = self.a
         return np.prod([(abs(4.0 * coordinates[d] - 2.0) + a[d]) / (1.0 + a[d]) for d in range(self.dim)])
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        coordinates = np.asarray(coordinates, dtype=float)
+        result = self._eval_vectorized_unchecked(coordinates)
+        self.check_vectorization(coordinates, result)
+        return result
+
+    # evaluates the function without comparing the results to eval so that subclasses can transform the coordinates
+    def _eval_vectorized_unchecked(self, coordinates: np.ndarray) -> np.ndarray:
+        assert np.shape(coordinates)[-1] == self.dim
+        a = self.a
+        return np.prod((np.abs(4.0 * coordinates - 2.0) + a) / (1.0 + a), axis=-1)
+
     # Uniform distributions in [0, 1] are required for this Function.
     def get_expectation(self): return 1.0
 
@@ -368,6 +637,15 @@ class FunctionGShifted(FunctionG):
         coords = [v if v <= 1.0 else v - 1.0 for v in coords]
         return super().eval(coords)
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        coordinates = np.asarray(coordinates, dtype=float)
+        assert np.all((0.0 <= coordinates) & (coordinates <= 1.0))
+        coords = coordinates + 0.2
+        coords = np.where(coords <= 1.0, coords, coords - 1.0)
+        result = self._eval_vectorized_unchecked(coords)
+        self.check_vectorization(coordinates, result)
+        return result
+
 
 class FunctionUQ(Function):
     def eval(self, coordinates):
@@ -382,6 +660,17 @@ class FunctionUQ(Function):
         value_of_interest = math.exp(-parameter1 ** 2 + 2 * np.sign(parameter2)) + parameter3
         return value_of_interest
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        coordinates = np.asarray(coordinates, dtype=float)
+        result = self._eval_vectorized_unchecked(coordinates)
+        self.check_vectorization(coordinates, result)
+        return result
+
+    # evaluates the function without comparing the results to eval so that subclasses can transform the coordinates
+    def _eval_vectorized_unchecked(self, coordinates: np.ndarray) -> np.ndarray:
+        assert np.shape(coordinates)[-1] == 3, np.shape(coordinates)
+        return np.exp(-coordinates[..., 0] ** 2 + 2 * np.sign(coordinates[..., 1])) + coordinates[..., 2]
+
     def getAnalyticSolutionIntegral(self, start, end):
         f = lambda x, y, z: self.eval([x, y, z])
         return integrate.tplquad(f, start[2], end[2], lambda x: start[1], lambda x: end[1], lambda x, y: start[0],
@@ -394,6 +683,14 @@ class FunctionUQShifted(FunctionUQ):
         coords = np.array([coordinates[0], coordinates[1] + 0.221413, coordinates[2]])
         return super().eval(coords)
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        coordinates = np.asarray(coordinates, dtype=float)
+        coords = np.array(coordinates)
+        coords[..., 1] += 0.221413
+        result = self._eval_vectorized_unchecked(coords)
+        self.check_vectorization(coordinates, result)
+        return result
+
 
 from scipy.stats import truncnorm
 
@@ -430,6 +727,12 @@ class FunctionCompose(Function):
             result += f.eval(coordinates) * factor
         return result
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        result = 0.0
+        for (f, factor) in self.functions:
+            result = result + f.eval_vectorized_output(coordinates) * factor
+        return result
+
     def getAnalyticSolutionIntegral(self, start, end):
         result = 0.0
         for (f, factor) in self.functions:
@@ -493,14 +796,19 @@ class FunctionPower(Function):
         val_f = self.function(coordinates)
         return [v ** self.exponent for v in val_f]
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        return self.function.call_vectorized(coordinates) ** self.exponent
+
     def getAnalyticSolutionIntegral(self, start, end): assert "Not implemented"
 
     def output_length(self): return self.function.output_length()
 
 
 # This can be used when calculating the PCE
+# polys is either an orthonormal polynomial basis with an evaluate method (see PolynomialChaos)
+# or a list of chaospy polynomials together with their norms
 class FunctionPolysPCE(Function):
-    def __init__(self, function, polys, norms):
+    def __init__(self, function, polys, norms=None):
         super().__init__()
         self.function = function
         self.polys = polys
@@ -508,6 +816,8 @@ class FunctionPolysPCE(Function):
         self.output_dimension = function.output_length() * len(polys)
 
     def eval(self, coordinates):
+        if self.norms is None:
+            return self.eval_vectorized(np.reshape(coordinates, (1, -1)))[0]
         values = []
         val_f = self.function(coordinates)
         for i in range(len(self.polys)):
@@ -516,11 +826,35 @@ class FunctionPolysPCE(Function):
             values += [v * val_poly for v in val_f]
         return values
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        if self.norms is not None:
+            return super().eval_vectorized(coordinates)
+        coordinates = np.asarray(coordinates, dtype=float)
+        points = np.reshape(coordinates, (-1, np.shape(coordinates)[-1]))
+        f_values = self.function.call_vectorized(points)
+        poly_values = self.polys.evaluate(points)
+        # Concatenation required for functions with multidimensional output
+        values = poly_values[:, :, np.newaxis] * f_values[:, np.newaxis, :]
+        return np.reshape(values, (*np.shape(coordinates)[:-1], self.output_dimension))
+
     def getAnalyticSolutionIntegral(self, start, end): assert "Not implemented"
 
     def output_length(self): return self.output_dimension
 
 
+# evaluates the ppf (inverse cdf) for an array of values; falls back to single evaluations if the ppf is not vectorized
+# (e.g. for a UQDistribution created with a scalar ppf)
+def evaluate_ppf(ppf, values: Sequence[float]) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    try:
+        points = np.asarray(ppf(values), dtype=float)
+        if np.shape(points) == np.shape(values):
+            return points
+    except (TypeError, ValueError):
+        pass
+    return np.reshape([ppf(value) for value in np.ravel(values)], np.shape(values)).astype(float)
+
+
 class FunctionInverseTransform(Function):
     def __init__(self, function, distributions):
         super().__init__()
@@ -533,6 +867,13 @@ class FunctionInverseTransform(Function):
         assert not any([math.isinf(v) for v in coordinates]), "infinite coordinates, maybe boundary needs to be set to true in a Grid"
         return self.function(coordinates)
 
+    def eval_vectorized(self, coords_transformed: Sequence[Sequence[float]]):
+        coords_transformed = np.asarray(coords_transformed, dtype=float)
+        assert np.all((0 <= coords_transformed) & (coords_transformed <= 1)), "PPF functions require the points to be in [0,1]"
+        coordinates = np.stack([evaluate_ppf(ppf, coords_transformed[..., d]) for d, ppf in enumerate(self.ppfs)], axis=-1)
+        assert not np.any(np.isinf(coordinates)), "infinite coordinates, maybe boundary needs to be set to true in a Grid"
+        return self.function.call_vectorized(coordinates)
+
     def getAnalyticSolutionIntegral(self, start, end): assert "Not implemented"
 
     def output_length(self): return self.function.output_length()
@@ -566,6 +907,9 @@ class FunctionConcatenate(Function):
     def eval(self, coordinates):
         return np.concatenate([f(coordinates) for f in self.funcs])
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        return np.concatenate([f.call_vectorized(coordinates) for f in self.funcs], axis=-1)
+
     def getAnalyticSolutionIntegral(self, start, end): assert "Not available"
 
     def output_length(self): return self.output_dimension
@@ -584,6 +928,11 @@ class FunctionPolynomial(Function):
             result *= self.coeffs[d] * coordinates[d] ** self.degree
         return result
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        result = np.prod(self.coeffs * np.asarray(coordinates, dtype=float) ** self.degree, axis=-1)
+        self.check_vectorization(coordinates, result)
+        return result
+
     def getAnalyticSolutionIntegral(self, start, end):
         result = 1.0
         for d in range(self.dim):
@@ -795,6 +1144,16 @@ class GenzDiscontinious2(Function):
             result -= self.coeffs[d] * coordinates[d]
         return [np.exp(result), np.exp(result)]
 
+    def eval_vectorized(self, coordinates: Sequence[Sequence[float]]):
+        coordinates = np.asarray(coordinates, dtype=float)
+        result = np.zeros(np.shape(coordinates)[:-1])
+        filter = np.all(coordinates < self.border, axis=-1)
+        result[filter] = np.exp(-1 * np.inner(coordinates[filter], self.coeffs))
+        return np.stack([result, result], axis=-1)
+
+    def output_length(self) -> int:
+        return 2
+
     def getAnalyticSolutionIntegral(self, start, end):
         result = 1
         end = list(end)
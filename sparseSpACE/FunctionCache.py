@@ -0,0 +1,456 @@
+import abc
+import os
+import sqlite3
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# This class defines the interface of a persistent cache for function evaluations. In contrast to the in-memory
+# dictionaries of the Function class the persistent cache survives reset_dictionary(), restarts of the refinement and
+# the end of the process. The coordinates are quantized before they are used as key so that points which only differ by
+# floating point noise (e.g. from a different order of operations in the grid generation) share one entry.
+class PersistentFunctionCache(object):
+    def __init__(self, decimals: int = 12):
+        """Constructor of the persistent cache.
+
+        :param decimals: Number of decimal places to which the coordinates are rounded before they are used as key.
+        """
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_key(self, coordinates: Sequence[float]) -> str:
+        """This method maps the coordinates to the quantized key of the cache.
+
+        :param coordinates: Coordinates of the point.
+        :return: Key of the point.
+        """
+        # adding 0.0 maps -0.0 to 0.0 so that both share the same key
+        return ','.join(repr(float(c) + 0.0) for c in np.round(np.asarray(coordinates, dtype=float), self.decimals))
+
+    def get(self, coordinates: Sequence[float]) -> Optional[Sequence[float]]:
+        """This method returns the cached function value of the point.
+
+        :param coordinates: Coordinates of the point.
+        :return: Function value (numpy array) or None if the point is not cached.
+        """
+        return self.get_many([coordinates])[0]
+
+    def put(self, coordinates: Sequence[float], value: Sequence[float]) -> None:
+        """This method stores the function value of the point in the cache.
+
+        :param coordinates: Coordinates of the point.
+        :param value: Function value of the point.
+        :return: None
+        """
+        self.put_many([coordinates], [value])
+
+    @abc.abstractmethod
+    def get_many(self, coordinates: Sequence[Sequence[float]]) -> List[Optional[Sequence[float]]]:
+        """This method returns the cached function values of several points and updates the hit/miss statistics.
+
+        :param coordinates: List of points.
+        :return: List with the function value (numpy array) or None for every point.
+        """
+        pass
+
+    @abc.abstractmethod
+    def put_many(self, coordinates: Sequence[Sequence[float]], values: Sequence[Sequence[float]]) -> None:
+        """This method stores the function values of several points in the cache.
+
+        :param coordinates: List of points.
+        :param values: Function values of the points.
+        :return: None
+        """
+        pass
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """This method deletes all entries of the cache.
+
+        :return: None
+        """
+        pass
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def get_statistics(self) -> Dict[str, float]:
+        """This method returns the hit/miss statistics of the cache since its creation (or the last reset).
+
+        :return: Dictionary with the number of hits, misses, evictions, the hit rate and the number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.0, 'entries': len(self)}
+
+    def reset_statistics(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# This cache stores the function evaluations in a SQLite database. The size of the cache can be bounded; if the
+# maximum number of entries is exceeded the least recently used entries are evicted. Several functions can share one
+# database file if they use different namespaces. The cache can be pickled (e.g. with save_to_file of the combi
+# instance or for worker processes): only the path is stored and the connection is reopened after unpickling.
+class SQLiteFunctionCache(PersistentFunctionCache):
+    def __init__(self, filename: str, namespace: str = 'default', max_entries: int = None, decimals: int = 12):
+        """Constructor of the SQLite cache.
+
+        :param filename: Path of the database file (created if it does not exist).
+        :param namespace: Name that separates the entries of different functions within one database file.
+        :param max_entries: Maximum number of cached points of this namespace (None means unbounded).
+        :param decimals: Number of decimal places to which the coordinates are rounded before they are used as key.
+        """
+        super().__init__(decimals=decimals)
+        self.filename = os.path.abspath(filename)
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._connect()
+
+    def _connect(self) -> None:
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.filename, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS evaluations (namespace TEXT NOT NULL, "
+                                    "key TEXT NOT NULL, value BLOB NOT NULL, last_access INTEGER NOT NULL, "
+                                    "PRIMARY KEY (namespace, key))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS evaluations_lru "
+                                    "ON evaluations (namespace, last_access)")
+        last_access = self.connection.execute("SELECT MAX(last_access) FROM evaluations WHERE namespace = ?",
+                                              (self.namespace,)).fetchone()[0]
+        # monotonic counter that defines the order of the accesses (also across runs)
+        self.access_counter = last_access + 1 if last_access is not None else 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['connection']
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+
+    def get_many(self, coordinates):
+        keys = [self.get_key(c) for c in coordinates]
+        values = []
+        with self.lock, self.connection:
+            for key in keys:
+                row = self.connection.execute("SELECT value FROM evaluations WHERE namespace = ? AND key = ?",
+                                              (self.namespace, key)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    values.append(None)
+                else:
+                    self.hits += 1
+                    self.connection.execute("UPDATE evaluations SET last_access = ? WHERE namespace = ? AND key = ?",
+                                            (self.access_counter, self.namespace, key))
+                    self.access_counter += 1
+                    values.append(np.frombuffer(row[0], dtype=float).copy())
+        return values
+
+    def put_many(self, coordinates, values):
+        with self.lock, self.connection:
+            for c, value in zip(coordinates, values):
+                value = np.atleast_1d(np.asarray(value, dtype=float))
+                self.connection.execute("INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?)",
+                                        (self.namespace, self.get_key(c), value.tobytes(), self.access_counter))
+                self.access_counter += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.max_entries is None:
+            return
+        num_entries = self.connection.execute("SELECT COUNT(*) FROM evaluations WHERE namespace = ?",
+                                              (self.namespace,)).fetchone()[0]
+        if num_entries > self.max_entries:
+            self.connection.execute("DELETE FROM evaluations WHERE namespace = ? AND key IN (SELECT key FROM "
+                                    "evaluations WHERE namespace = ? ORDER BY last_access ASC LIMIT ?)",
+                                    (self.namespace, self.namespace, num_entries - self.max_entries))
+            self.evictions += num_entries - self.max_entries
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM evaluations WHERE namespace = ?", (self.namespace,))
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM evaluations WHERE namespace = ?",
+                                           (self.namespace,)).fetchone()[0]
+
+
+# multiplier of the hash function (64 bit golden ratio)
+_hash_multiplier = np.uint64(0x9E3779B97F4A7C15)
+
+
+def hash_points(coordinates: np.ndarray) -> np.ndarray:
+    """This method computes 64 bit hash values of the bit patterns of the coordinates.
+
+    :param coordinates: Array of points (number of points x dimension).
+    :return: Array with the hash value of every point.
+    """
+    # adding 0.0 maps -0.0 to 0.0 as both compare equal
+    bits = np.ascontiguousarray(coordinates + 0.0, dtype=float).view(np.uint64)
+    hash_values = np.zeros(len(coordinates), dtype=np.uint64)
+    for d in range(coordinates.shape[1]):
+        hash_values = (hash_values ^ bits[:, d]) * _hash_multiplier
+        hash_values ^= hash_values >> np.uint64(29)
+    return hash_values
+
+
+# This class is a compact replacement for the tuple-keyed dictionaries (f_dict) of the Function class. The coordinates
+# and function values are stored in contiguous numpy arrays that grow geometrically; the points are found through an
+# open addressing hash table (linear probing) over the bit patterns of the coordinates. This requires d + k doubles
+# (dimension d, output length k) and a few integers per point instead of a tuple and an array object. The class
+# supports the dictionary operations used by the Function class and the refinement strategies (get, [], in, update,
+# len, keys, values, items) and in addition vectorized lookups and insertions of whole point sets. Lookups and
+# insertions are guarded by a lock since the function (and its cache) is shared by the threads of a
+# ThreadComponentGridExecutor.
+class CompactFunctionCache(object):
+    def __init__(self, initial_capacity: int = 1024):
+        """Constructor of the compact cache.
+
+        :param initial_capacity: Number of points for which memory is reserved initially.
+        """
+        self.size = 0
+        self.capacity = max(int(initial_capacity), 1)
+        self.coordinates = None
+        self.f_values = None
+        # the table has at least twice as many slots as entries; -1 marks an empty slot
+        self.table = np.full(self._get_table_size(self.capacity), -1, dtype=np.int64)
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _get_table_size(capacity: int) -> int:
+        return 1 << int(np.ceil(np.log2(2 * capacity)))
+
+    def _hash(self, coordinates: np.ndarray) -> np.ndarray:
+        return (hash_points(coordinates) & np.uint64(len(self.table) - 1)).astype(np.int64)
+
+    def _allocate(self, dim: int, output_length: int) -> None:
+        self.coordinates = np.empty((self.capacity, dim))
+        self.f_values = np.empty((self.capacity, output_length))
+
+    def _grow(self, required_size: int) -> None:
+        if required_size <= self.capacity:
+            return
+        while self.capacity < required_size:
+            self.capacity *= 2
+        coordinates = np.empty((self.capacity, self.coordinates.shape[1]))
+        coordinates[:self.size] = self.coordinates[:self.size]
+        f_values = np.empty((self.capacity, self.f_values.shape[1]))
+        f_values[:self.size] = self.f_values[:self.size]
+        self.coordinates, self.f_values = coordinates, f_values
+        self.table = np.full(self._get_table_size(self.capacity), -1, dtype=np.int64)
+        self._insert_into_table(np.arange(self.size))
+
+    def _insert_into_table(self, rows: np.ndarray) -> None:
+        # inserts the rows (which are distinct and not yet in the table) in parallel; if several rows claim the same
+        # free slot the first one gets it and the others continue probing
+        slots = self._hash(self.coordinates[rows])
+        pending = np.arange(len(rows))
+        mask = len(self.table) - 1
+        while len(pending) > 0:
+            pending_slots = slots[pending]
+            free = self.table[pending_slots] == -1
+            claimed_slots, first_claimants = np.unique(pending_slots[free], return_index=True)
+            winners = pending[free][first_claimants]
+            self.table[claimed_slots] = rows[winners]
+            placed = np.zeros(len(rows), dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + 1) & mask
+
+    def lookup(self, coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+        """This method finds the rows of several points in the cache.
+
+        :param coordinates: Array of points (number of points x dimension).
+        :return: Array with the row of every point or -1 if the point is not cached.
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        with self.lock:
+            return self._lookup(coordinates)
+
+    def _lookup(self, coordinates: np.ndarray) -> np.ndarray:
+        rows = np.full(len(coordinates), -1, dtype=np.int64)
+        if self.size == 0 or len(coordinates) == 0:
+            return rows
+        slots = self._hash(coordinates)
+        pending = np.arange(len(coordinates))
+        mask = len(self.table) - 1
+        while len(pending) > 0:
+            entries = self.table[slots[pending]]
+            occupied = entries != -1
+            match = np.zeros(len(pending), dtype=bool)
+            match[occupied] = np.all(self.coordinates[entries[occupied]] == coordinates[pending[occupied]], axis=1)
+            rows[pending[match]] = entries[match]
+            # empty slots terminate the probing (miss), occupied slots with other points continue
+            pending = pending[occupied & ~match]
+            slots[pending] = (slots[pending] + 1) & mask
+        return rows
+
+    def get_many(self, coordinates: Sequence[Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """This method returns the cached function values of several points.
+
+        :param coordinates: Array of points (number of points x dimension).
+        :return: Mask of the cached points and the function values of these points.
+        """
+        with self.lock:
+            rows = self.lookup(coordinates)
+            found = rows != -1
+            return found, self.f_values[rows[found]] if self.size > 0 else np.empty((0, 0))
+
+    def update_many(self, coordinates: Sequence[Sequence[float]], f_values: Sequence[Sequence[float]]) -> None:
+        """This method stores the function values of several points (existing entries are overwritten).
+
+        :param coordinates: Array of points (number of points x dimension).
+        :param f_values: Array of function values (number of points x output length).
+        :return: None
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        f_values = np.asarray(f_values, dtype=float).reshape((len(coordinates), -1))
+        if len(coordinates) == 0:
+            return
+        with self.lock:
+            self._update_many(coordinates, f_values)
+
+    def _update_many(self, coordinates: np.ndarray, f_values: np.ndarray) -> None:
+        if self.coordinates is None:
+            self._allocate(coordinates.shape[1], f_values.shape[1])
+        rows = self._lookup(coordinates)
+        existing = rows != -1
+        self.f_values[rows[existing]] = f_values[existing]
+        # points that occur several times in the new points are only stored once (the last value wins as for dicts)
+        new_coordinates = coordinates[~existing][::-1]
+        new_f_values = f_values[~existing][::-1]
+        new_coordinates, unique_indices = np.unique(new_coordinates + 0.0, axis=0, return_index=True)
+        new_f_values = new_f_values[unique_indices]
+        self._grow(self.size + len(new_coordinates))
+        new_rows = np.arange(self.size, self.size + len(new_coordinates))
+        self.coordinates[new_rows] = new_coordinates
+        self.f_values[new_rows] = new_f_values
+        self.size += len(new_coordinates)
+        self._insert_into_table(new_rows)
+
+    def get(self, coordinates: Sequence[float], default=None):
+        with self.lock:
+            row = self.lookup([coordinates])[0]
+            # a copy so that callers cannot modify the cached values
+            return self.f_values[row].copy() if row != -1 else default
+
+    def __getitem__(self, coordinates):
+        f_value = self.get(coordinates)
+        if f_value is None:
+            raise KeyError(coordinates)
+        return f_value
+
+    def __setitem__(self, coordinates, f_value) -> None:
+        self.update_many([coordinates], [np.atleast_1d(f_value)])
+
+    def __contains__(self, coordinates) -> bool:
+        return self.lookup([coordinates])[0] != -1
+
+    def update(self, items) -> None:
+        items = list(items.items() if hasattr(items, 'items') else items)
+        if len(items) > 0:
+            coordinates, f_values = zip(*items)
+            self.update_many(coordinates, [np.atleast_1d(f_value) for f_value in f_values])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def keys(self) -> np.ndarray:
+        """Returns the cached points as array (view, no copy)."""
+        return self.coordinates[:self.size] if self.size > 0 else np.empty((0, 0))
+
+    def values(self) -> np.ndarray:
+        """Returns the cached function values as array (view, no copy)."""
+        return self.f_values[:self.size] if self.size > 0 else np.empty((0, 0))
+
+    def items(self):
+        return zip(map(tuple, self.keys()), self.values())
+
+
+# This class stores a set of points by their 64 bit hash values (see hash_points), i.e. 8 bytes per point. It is used to
+# count the distinct points of evaluations whose values are not kept in memory; two different points are only counted
+# once if their hash values collide, which is negligible for 64 bit hashes. The hash values are stored in sorted runs
+# whose sizes halve from run to run (runs of similar size are merged), so that insertions take O(log n) amortized time
+# per point and lookups are binary searches in O(log n) runs.
+class PointKeySet(object):
+    def __init__(self):
+        self.runs = []  # type: List[np.ndarray]
+        self.size = 0
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def _contains_hashes(self, hash_values: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(hash_values), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, hash_values), len(run) - 1)
+            found |= run[positions] == hash_values
+        return found
+
+    def contains_many(self, coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+        """This method checks which points are in the set.
+
+        :param coordinates: Array of points (number of points x dimension).
+        :return: Mask of the points that are in the set.
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        if len(coordinates) == 0:
+            return np.zeros(0, dtype=bool)
+        with self.lock:
+            return self._contains_hashes(hash_points(coordinates))
+
+    def add_many(self, coordinates: Sequence[Sequence[float]]) -> int:
+        """This method adds several points to the set.
+
+        :param coordinates: Array of points (number of points x dimension).
+        :return: Number of points that were not in the set before.
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        if len(coordinates) == 0:
+            return 0
+        hash_values = np.unique(hash_points(coordinates))
+        with self.lock:
+            new_hash_values = hash_values[~self._contains_hashes(hash_values)]
+            if len(new_hash_values) > 0:
+                self.runs.append(new_hash_values)
+                self.size += len(new_hash_values)
+                while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+                    last = self.runs.pop()
+                    self.runs[-1] = np.sort(np.concatenate((self.runs[-1], last)))
+            return len(new_hash_values)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.runs = []
+            self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
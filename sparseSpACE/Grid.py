@@ -1,5 +1,7 @@
 import numpy as np
 import abc, logging
+import os
+import warnings
 from sparseSpACE.Integrator import *
 import numpy.polynomial.legendre as legendre
 import numpy.polynomial.hermite as hermite
@@ -14,6 +16,8 @@ from sparseSpACE.Extrapolation import ExtrapolationGrid, SliceGrouping, SliceVer
 
 # the grid class provides basic functionalities for an abstract grid
 class Grid(object):
+    # maximum number of points that are evaluated at once by the integrator (None means all points at once)
+    chunk_size = None
 
     def __init__(self, a, b, boundary:bool=True):
         self.boundary = boundary
@@ -22,6 +26,17 @@ class Grid(object):
         assert len(a) == len(b)
         self.dim = len(a)
 
+    # this method sets the maximum number of points that are evaluated at once during the integration; large component
+    # grids are then integrated chunk by chunk so that the peak memory is independent of the grid size; the chunks are
+    # evaluated with Function.call_read_only and are not stored in the function dictionary
+    def set_chunk_size(self, chunk_size: int) -> None:
+        assert chunk_size is None or chunk_size > 0
+        integrator = getattr(self, 'integrator', None)
+        if chunk_size is not None and integrator is not None and not integrator.supports_chunking:
+            warnings.warn(type(integrator).__name__ + " of " + type(self).__name__ +
+                          " evaluates all points at once, the chunk size is ignored", stacklevel=2)
+        self.chunk_size = chunk_size
+
     # integrates the grid on the specified area for function f
     def integrate(self, f: Callable[[Tuple[float, ...]], Sequence[float]], levelvec: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
         if not self.is_global():
@@ -201,10 +216,21 @@ class Grid(object):
 
 from scipy.optimize import fmin
 from scipy.special import eval_hermitenorm, eval_sh_legendre
+from collections import OrderedDict
+import threading
 
 
 # This abstract class defines the common structure and interface of all 1D Grids
 class Grid1d(object):
+    # the 1D quadrature rules are memoized in a LRU cache that is shared by all 1D grids; the cached rules are keyed by
+    # the class, the parameters of the rule, the level, the boundary treatment and the interval
+    quadrature_rule_cache = OrderedDict()
+    quadrature_rule_cache_size = 1024
+    # guards the shared cache since component grids can be evaluated concurrently (see ComponentGridExecutor)
+    quadrature_rule_cache_lock = threading.Lock()
+    # set this to False in grids whose rules depend on state that is not part of the cache key (e.g. weight functions)
+    cache_quadrature_rules = True
+
     def __init__(self, a: float=None, b: float=None, boundary: bool=True):
         self.boundary = boundary
         self.a = a
@@ -236,7 +262,7 @@ class Grid1d(object):
             self.spacing = None
         else:
             self.spacing = (end - start) / (self.num_points_with_boundary - 1)
-        coordsD, weightsD = self.get_1d_points_and_weights()
+        coordsD, weightsD = self.get_1d_points_and_weights_cached()
         self.coords = np.asarray(coordsD)
         self.weights = np.asarray(weightsD)
         if self.boundary == False:
@@ -248,6 +274,74 @@ class Grid1d(object):
     def get_1d_points_and_weights(self) -> Sequence[float]:
         pass
 
+    # returns the points and weights of the current area from the quadrature rule cache and computes them on a miss;
+    # rules that are affine invariant (see is_affine_quadrature_rule) are cached on the reference interval [0,1] and
+    # are therefore reused for all intervals
+    def get_1d_points_and_weights_cached(self) -> Tuple[Sequence[float], Sequence[float]]:
+        if not self.cache_quadrature_rules or Grid1d.quadrature_rule_cache_size == 0:
+            return self.get_1d_points_and_weights()
+        affine = self.is_affine_quadrature_rule()
+        key = (type(self), self.get_quadrature_rule_parameters(), self.a, self.b, self.boundary, self.level,
+               self.num_points, self.lowerBorder, self.upperBorder)
+        if not affine:
+            key += (self.start, self.end)
+        cache = Grid1d.quadrature_rule_cache
+        with Grid1d.quadrature_rule_cache_lock:
+            entry = cache.get(key)
+            if entry is not None:
+                cache.move_to_end(key)
+        if entry is not None:
+            coordsD, weightsD, state = entry
+            self.set_quadrature_rule_state(state)
+        else:
+            # the rule is computed outside of the lock; if another thread computes the same rule concurrently, the
+            # last insertion wins which is harmless since both rules are identical
+            if affine:
+                coordsD, weightsD = self.get_1d_reference_points_and_weights()
+            else:
+                coordsD, weightsD = self.get_1d_points_and_weights()
+            coordsD = np.array(coordsD, dtype=float)
+            weightsD = np.array(weightsD, dtype=float)
+            with Grid1d.quadrature_rule_cache_lock:
+                cache[key] = (coordsD, weightsD, self.get_quadrature_rule_state())
+                while len(cache) > Grid1d.quadrature_rule_cache_size:
+                    cache.popitem(last=False)
+        if affine:
+            return self.start + coordsD * self.length, weightsD * self.length
+        return np.array(coordsD), np.array(weightsD)
+
+    # returns the parameters of the grid that influence the quadrature rule apart from level, boundary and interval
+    def get_quadrature_rule_parameters(self) -> Tuple:
+        return ()
+
+    # returns additional state that is computed together with the quadrature rule (e.g. basis functions) and that has to
+    # be restored when the rule is taken from the cache
+    def get_quadrature_rule_state(self):
+        return None
+
+    def set_quadrature_rule_state(self, state) -> None:
+        pass
+
+    # returns if the rule of an interval [start, end] is the affine transformation start + x * (end - start) and
+    # w * (end - start) of the rule returned by get_1d_reference_points_and_weights for the interval [0, 1]; grids that
+    # return True have to implement get_1d_reference_points_and_weights
+    def is_affine_quadrature_rule(self) -> bool:
+        return False
+
+    # sets the maximum number of cached 1D quadrature rules (0 disables the cache)
+    @staticmethod
+    def set_quadrature_rule_cache_size(cache_size: int) -> None:
+        assert cache_size >= 0
+        with Grid1d.quadrature_rule_cache_lock:
+            Grid1d.quadrature_rule_cache_size = cache_size
+            while len(Grid1d.quadrature_rule_cache) > cache_size:
+                Grid1d.quadrature_rule_cache.popitem(last=False)
+
+    @staticmethod
+    def clear_quadrature_rule_cache() -> None:
+        with Grid1d.quadrature_rule_cache_lock:
+            Grid1d.quadrature_rule_cache.clear()
+
     def get_1D_level_weights(self) -> Sequence[float]:
         return [self.get_1d_weight(i) for i in range(self.num_points)]
 
@@ -274,7 +368,7 @@ class MixedGrid(Grid):
         assert len(a) == len(b)
         self.dim = len(a)
         if integrator is None:
-            self.integrator = IntegratorArbitraryGridScalarProduct(self)
+            self.integrator = IntegratorTensorProduct(self)
         else:
             if integrator == 'old':
                 self.integrator = IntegratorArbitraryGrid(self)
@@ -299,49 +393,14 @@ class BasisGrid(Grid):
 
     def interpolate_grid(self, grid_points_for_dims: Sequence[Sequence[float]], start: Sequence[float], end: Sequence[float], levelvec: Sequence[int]) -> Sequence[Sequence[float]]:
         surplusses = self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))]
-        num_points = np.prod([len(grid_d) for grid_d in grid_points_for_dims])
-        num_points_grid = [len(grid_d) for grid_d in grid_points_for_dims]
-        results = np.zeros((num_points, np.shape(surplusses)[0]))
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = grid_points_for_dims[d]
-            evaluations1D = np.zeros((len(points_d), (len(self.splines[d]))))
-            for i, spline in enumerate(self.grids[d].splines):
-                for j, p in enumerate(points_d):
-                    evaluations1D[j, i] = spline(p)
-            evaluations[d] = evaluations1D
-
-        pointIndexList = get_cross_product_range(num_points_grid)
-        for n, p in enumerate(pointIndexList):
-            indexList = get_cross_product_range(self.numPoints)
-            for i, index in enumerate(indexList):
-                intermediate_result = np.array(surplusses[:,i])
-                for d in range(self.dim):
-                    for j in range(np.shape(surplusses)[0]):
-                        intermediate_result *= evaluations[d][p[d], index[d]]
-                results[n,:] += intermediate_result
-        return results
+        evaluations = [evaluate_basis_1D(self.grids[d].splines, grid_points_for_dims[d]) for d in range(self.dim)]
+        return interpolate_tensor_product_grid(surplusses, evaluations)
 
     def interpolate(self, evaluation_points: Sequence[Tuple[float, ...]], start: Sequence[float], end: Sequence[float], levelvec: Sequence[int]) -> Sequence[Sequence[float]]:
         surplusses = self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))]
-        results = np.zeros((len(evaluation_points), np.shape(surplusses)[0]))
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = np.array([evaluation_point[d] for evaluation_point in evaluation_points])
-            evaluations1D = np.zeros((len(evaluation_points), len(self.grids[d].splines)))
-            for i, basis in enumerate(self.grids[d].splines):
-                for j, p in enumerate(points_d):
-                    evaluations1D[j, i] = basis(p)
-            evaluations[d] = evaluations1D
-        indexList = get_cross_product_range(self.numPoints)
-        for i, index in enumerate(indexList):
-            intermediate_result = np.ones((len(evaluation_points), np.shape(surplusses)[0]))
-            intermediate_result *= np.array(surplusses[:,i])
-            for d in range(self.dim):
-                for j in range(np.shape(surplusses)[0]):
-                    intermediate_result[:, j] *= evaluations[d][:, index[d]]
-            results[:,:] += intermediate_result
-        return results
+        evaluation_points = np.asarray(evaluation_points, dtype=float).reshape(-1, self.dim)
+        evaluations = [evaluate_basis_1D(self.grids[d].splines, evaluation_points[:, d]) for d in range(self.dim)]
+        return interpolate_tensor_product_points(surplusses, evaluations)
 
     def get_basis(self, d: int, index: int):
         return self.grids[d].splines[index]
@@ -383,6 +442,16 @@ class LagrangeGrid1D(Grid1d):
         weightsD = np.array(self.compute_1D_quad_weights(coordsD))
         return coordsD, weightsD
 
+    def get_quadrature_rule_parameters(self) -> Tuple:
+        return self.p, self.modified_basis
+
+    # the basis functions are computed together with the weights
+    def get_quadrature_rule_state(self):
+        return self.splines
+
+    def set_quadrature_rule_state(self, state) -> None:
+        self.splines = state
+
     def get_1D_level_points(self, level: int, a: float, b: float):
         N = 2 ** level + 1  # inner points including boundary points
         # h = (b - a) / (N - 1)
@@ -517,6 +586,16 @@ class BSplineGrid1D(Grid1d):
         weightsD = np.array(self.compute_1D_quad_weights(coordsD))
         return coordsD, weightsD
 
+    def get_quadrature_rule_parameters(self) -> Tuple:
+        return self.p, self.modified_basis
+
+    # the splines are computed together with the weights
+    def get_quadrature_rule_state(self):
+        return self.splines
+
+    def set_quadrature_rule_state(self, state) -> None:
+        self.splines = state
+
     def get_1D_level_points(self, level, a: float, b: float):
         N = 2**level + 1 #inner points including boundary points
         #h = (b - a) / (N - 1)
@@ -627,7 +706,7 @@ class LejaGrid(Grid):
         assert len(a) == len(b)
         self.dim = len(a)
         if integrator is None:
-            self.integrator = IntegratorArbitraryGridScalarProduct(self)
+            self.integrator = IntegratorTensorProduct(self)
         else:
             if integrator == 'old':
                 self.integrator = IntegratorArbitraryGrid(self)
@@ -637,7 +716,30 @@ class LejaGrid(Grid):
         self.grids = [LejaGrid1D(a=a[d], b=b[d], boundary=self.boundary) for d in range(self.dim)]
 
 
+# default weight function of the Leja points (unweighted Leja sequence)
+def uniform_leja_weight(x: float) -> float:
+    return 1.0
+
+
 class LejaGrid1D(Grid1d):
+    # the Leja points depend on the weight function passed to get_1D_level_points
+    cache_quadrature_rules = False
+    # Leja sequences are nested; the sequences computed so far are stored (unsorted, i.e. in the order in which the
+    # points were added) and only extended by the missing points, keyed by the interval and tolerance. Only sequences
+    # of the default weight function are stored since other weight functions (usually a new closure per grid) cannot
+    # be identified reliably.
+    leja_sequences = OrderedDict()
+    # quadrature weights of the point sets that have been computed so far
+    leja_weights = OrderedDict()
+    # maximum number of entries of each of the two caches (least recently used entries are evicted)
+    leja_cache_size = 256
+    # guards both caches since they are shared by all grids, which can be used concurrently (see ComponentGridExecutor)
+    leja_cache_lock = threading.RLock()
+    # precomputed Leja sequence on [0,1] (tolerance 1e-14) and the weights of the nested point sets with boundary
+    # points; the table is only valid for the default weight function uniform_leja_weight and is therefore only used
+    # for the sequences of this weight function
+    leja_table_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'leja_points.npz')
+
     def __init__(self, a, b, boundary):
         super().__init__(a=a, b=b, boundary=boundary)
         self.linear_growth_factor = 2
@@ -661,14 +763,19 @@ class LejaGrid1D(Grid1d):
         return numPoints
 
     def compute_1D_quad_weights(self, grid_1D):
-        N = len(grid_1D)
-        V = np.zeros((N, N))
-
-        for i in range(N):
-            for j in range(N):
-                V[i, j] = eval_sh_legendre(j, grid_1D[i]) * np.sqrt(2 * j + 1)
-
-        weights = np.linalg.inv(V)[0, :]
+        key = tuple(grid_1D)
+        with LejaGrid1D.leja_cache_lock:
+            weights = LejaGrid1D.leja_weights.get(key)
+            if weights is not None:
+                LejaGrid1D.leja_weights.move_to_end(key)
+        if weights is None:
+            N = len(grid_1D)
+            degrees = np.arange(N)
+            V = eval_sh_legendre(degrees[None, :], np.asarray(grid_1D, dtype=float)[:, None]) * np.sqrt(2 * degrees + 1)
+            weights = np.linalg.inv(V)[0, :]
+            with LejaGrid1D.leja_cache_lock:
+                LejaGrid1D.store_in_cache(LejaGrid1D.leja_weights, key, weights)
+        weights = np.array(weights)
         if len(grid_1D) == self.num_points:
             return weights
         return weights[self.lowerBorder:self.upperBorder]
@@ -680,7 +787,7 @@ class LejaGrid1D(Grid1d):
 
         return f_min
 
-    def __get_lleja_poly(self, x, sorted_points, a, b, weightFunction=lambda x: 1.0 / s):
+    def __get_lleja_poly(self, x, sorted_points, a, b, weightFunction=uniform_leja_weight):
 
         if (x < a or x > b):
             return -1
@@ -693,62 +800,85 @@ class LejaGrid1D(Grid1d):
 
         return poly
 
-    def __get_neg_lleja_poly(self, x, sorted_points, a, b, weightFunction=lambda x: 1.0):
+    def __get_neg_lleja_poly(self, x, sorted_points, a, b, weightFunction=uniform_leja_weight):
 
         return (-1.0) * self.__get_lleja_poly(x, sorted_points, a, b, weightFunction)
 
-    def __get_starting_point(self, a, b, weightFunction=lambda x: 1.0):
+    def __get_starting_point(self, a, b, weightFunction=uniform_leja_weight):
 
         neg_weight = lambda x: -weightFunction(x)
         starting_point = self.__minimize_function(neg_weight, a, b)
 
         return starting_point
 
-    def get_1D_level_points(self, curr_level, left_bound, right_bound, weightFunction=lambda x: 1.0, eps=1e-14):
+    # computes the next point of the Leja sequence by maximizing the weighted Leja polynomial between each pair of
+    # neighbouring points
+    def __get_next_leja_point(self, sorted_points, left_bound, right_bound, weightFunction, eps):
+        x_val = []
+        y_val = []
+
+        a = 0.
+        b = left_bound
+        for i in range(len(sorted_points) + 1):
+            a = b
+            if i < len(sorted_points):
+                b = sorted_points[i]
+            else:
+                b = right_bound
+
+            x_min = (a + b) / 2.0
+            y_min = 0.0
+
+            if np.abs(b - a) > eps:
+                wlleja_func = lambda x: self.__get_neg_lleja_poly(x, sorted_points, a, b, weightFunction)
+                x_min = self.__minimize_function(wlleja_func, a, b)
+
+                x_val.append(x_min)
+                y_min = wlleja_func(x_val[-1])
+                y_val.append(y_min)
+            else:
+                x_val.append(x_min)
+                y_val.append(y_min)
+
+        return x_val[y_val.index(np.min(y_val))]
 
-        sorted_points = []
+    # returns the first num_points points of the Leja sequence (in the order of construction); the stored sequence is
+    # only extended by the missing points. The missing points are computed on a local copy which replaces the stored
+    # sequence afterwards so that other threads never see a partially extended sequence.
+    def get_leja_sequence(self, num_points, left_bound, right_bound, weightFunction=uniform_leja_weight, eps=1e-14):
+        store_sequence = weightFunction is uniform_leja_weight
+        key = (left_bound, right_bound, eps)
         unsorted_points = []
+        if store_sequence:
+            with LejaGrid1D.leja_cache_lock:
+                if key in LejaGrid1D.leja_sequences:
+                    LejaGrid1D.leja_sequences.move_to_end(key)
+                else:
+                    LejaGrid1D.store_in_cache(LejaGrid1D.leja_sequences, key, [])
+                    if left_bound == 0 and right_bound == 1 and eps == 1e-14:
+                        LejaGrid1D.load_leja_table()
+                unsorted_points = list(LejaGrid1D.leja_sequences[key])
+        if len(unsorted_points) >= num_points:
+            return unsorted_points[:num_points]
+        if len(unsorted_points) == 0:
+            unsorted_points.append(self.__get_starting_point(left_bound, right_bound, weightFunction))
+        while len(unsorted_points) < num_points:
+            next_point = self.__get_next_leja_point(sorted(unsorted_points), left_bound, right_bound, weightFunction, eps)
+            unsorted_points.append(next_point)
+        if store_sequence:
+            with LejaGrid1D.leja_cache_lock:
+                # another thread might have stored a longer sequence in the meantime
+                if len(LejaGrid1D.leja_sequences.get(key, [])) < len(unsorted_points):
+                    LejaGrid1D.store_in_cache(LejaGrid1D.leja_sequences, key, unsorted_points)
+        return list(unsorted_points[:num_points])
+
+    def get_1D_level_points(self, curr_level, left_bound, right_bound, weightFunction=uniform_leja_weight, eps=1e-14):
         no_points = self.level_to_num_points_1d(curr_level)
         if not self.boundary:
             no_points += 2
         if no_points == 2:
             return np.array([left_bound, right_bound], dtype=np.float64)
-        starting_point = self.__get_starting_point(left_bound, right_bound, weightFunction)
-        sorted_points.append(starting_point)
-        unsorted_points.append(starting_point)
-
-        for point in range(1, no_points):
-            x_val = []
-            y_val = []
-
-            a = 0.
-            b = left_bound
-            for i in range(len(sorted_points) + 1):
-                sorted_points = sorted(sorted_points)
-
-                a = b
-                if i < len(sorted_points):
-                    b = sorted_points[i]
-                else:
-                    b = right_bound
-
-                x_min = (a + b) / 2.0
-                y_min = 0.0
-
-                if np.abs(b - a) > eps:
-                    wlleja_func = lambda x: self.__get_neg_lleja_poly(x, sorted_points, a, b, weightFunction)
-                    x_min = self.__minimize_function(wlleja_func, a, b)
-
-                    x_val.append(x_min)
-                    y_min = wlleja_func(x_val[-1])
-                    y_val.append(y_min)
-                else:
-                    x_val.append(x_min)
-                    y_val.append(y_min)
-
-            wlleja_point = x_val[y_val.index(np.min(y_val))]
-            sorted_points.append(wlleja_point)
-            unsorted_points.append(wlleja_point)
+        unsorted_points = self.get_leja_sequence(no_points, left_bound, right_bound, weightFunction, eps)
 
         sorted_points = np.array(sorted(unsorted_points), dtype=np.float64)
         sorted_points[0] = left_bound
@@ -756,6 +886,51 @@ class LejaGrid1D(Grid1d):
 
         return sorted_points[self.lowerBorder:self.upperBorder]
 
+    # loads the precomputed Leja sequence of the default weight function uniform_leja_weight on [0,1] and the weights
+    # of its point sets from the bundled table
+    @staticmethod
+    def load_leja_table(filename: str=None) -> None:
+        filename = LejaGrid1D.leja_table_file if filename is None else filename
+        if not os.path.isfile(filename):
+            return
+        table = np.load(filename)
+        key = (0, 1, 1e-14)
+        with LejaGrid1D.leja_cache_lock:
+            if len(LejaGrid1D.leja_sequences.get(key, [])) < len(table['points']):
+                LejaGrid1D.store_in_cache(LejaGrid1D.leja_sequences, key, list(table['points']))
+            for name in table.files:
+                if name.startswith('weights_'):
+                    num_points = int(name[len('weights_'):])
+                    points = np.array(sorted(table['points'][:num_points]), dtype=np.float64)
+                    points[0] = 0.0
+                    points[-1] = 1.0
+                    LejaGrid1D.store_in_cache(LejaGrid1D.leja_weights, tuple(points), table[name])
+
+    # stores the value in one of the Leja caches and evicts the least recently used entry if the cache is full; the caller
+    # has to hold leja_cache_lock
+    @staticmethod
+    def store_in_cache(cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > LejaGrid1D.leja_cache_size:
+            cache.popitem(last=False)
+
+    # computes the Leja sequence of uniform_leja_weight on [0,1] with num_points points and the weights of all its nested point
+    # sets with boundary points and stores them in a table that can be loaded with load_leja_table
+    @staticmethod
+    def write_leja_table(num_points: int, filename: str=None) -> None:
+        filename = LejaGrid1D.leja_table_file if filename is None else filename
+        grid = LejaGrid1D(a=0, b=1, boundary=True)
+        grid.set_current_area(0, 1, 0)
+        points = grid.get_leja_sequence(num_points, 0, 1)
+        table = {'points': np.array(points)}
+        level = 1
+        while grid.level_to_num_points_1d(level) <= num_points:
+            grid.set_current_area(0, 1, level)
+            table['weights_' + str(grid.num_points)] = grid.compute_1D_quad_weights(list(grid.coords))
+            level += 1
+        np.savez(filename, **table)
+
 
 # this class provides an equdistant mesh and uses the trapezoidal rule compute the quadrature
 class TrapezoidalGrid(Grid):
@@ -767,7 +942,7 @@ class TrapezoidalGrid(Grid):
         self.boundary = boundary
         self.modified_basis = modified_basis
         if integrator is None:
-            self.integrator = IntegratorArbitraryGridScalarProduct(self)
+            self.integrator = IntegratorTensorProduct(self)
         else:
             if integrator == 'old':
                 self.integrator = IntegratorArbitraryGrid(self)
@@ -793,6 +968,9 @@ class TrapezoidalGrid1D(Grid1d):
         # print(coordsD, weightsD, self.lowerBorder, self.upperBorder, self.a, self.b, self.start, self.end)
         return coordsD, weightsD
 
+    def get_quadrature_rule_parameters(self) -> Tuple:
+        return self.modified_basis,
+
     def get_1D_level_points(self):
         if not self.boundary and self.num_points == 1:
             return np.array([(self.end+self.start)/2.0])
@@ -847,7 +1025,7 @@ class SimpsonGrid(Grid):
         self.dim = len(a)
         self.boundary = boundary
         if integrator is None:
-            self.integrator = IntegratorArbitraryGridScalarProduct(self)
+            self.integrator = IntegratorTensorProduct(self)
         else:
             if integrator == 'old':
                 self.integrator = IntegratorArbitraryGrid(self)
@@ -891,7 +1069,7 @@ class ClenshawCurtisGrid(Grid):
         self.boundary = boundary
         self.dim = len(a)
         if integrator is None:
-            self.integrator = IntegratorArbitraryGridScalarProduct(self)
+            self.integrator = IntegratorTensorProduct(self)
         else:
             if integrator == 'old':
                 self.integrator = IntegratorArbitraryGrid(self)
@@ -911,16 +1089,25 @@ class ClenshawCurtisGrid1D(Grid1d):
         weightsD = self.get_1D_level_weights()
         return coordsD, weightsD
 
-    def get_1D_level_points(self):
+    # the Clenshaw Curtis rule of [start, end] is the affine transformation of the rule of [0, 1]
+    def is_affine_quadrature_rule(self) -> bool:
+        return True
+
+    def get_1d_reference_points_and_weights(self):
         coordinates = np.empty(self.num_points)
         for i in range(self.num_points):
-            coordinates[i] = self.start + (
-                    1 - math.cos(math.pi * (i + self.lowerBorder) / (self.num_points_with_boundary - 1))) * \
-                             self.length / 2
-        return coordinates
+            coordinates[i] = (1 - math.cos(math.pi * (i + self.lowerBorder) / (self.num_points_with_boundary - 1))) / 2
+        weights = np.array([self.get_1d_reference_weight(i) for i in range(self.num_points)])
+        return coordinates, weights
+
+    def get_1D_level_points(self):
+        return self.start + self.get_1d_reference_points_and_weights()[0] * self.length
 
     def get_1d_weight(self, index):
-        weight = self.length / 2.0
+        return self.get_1d_reference_weight(index) * self.length
+
+    def get_1d_reference_weight(self, index):
+        weight = 1 / 2.0
         if self.num_points_with_boundary > 2:
             if index == 0 or index == self.num_points_with_boundary - 1:
                 weight_factor = 1.0 / ((self.num_points_with_boundary - 2) * self.num_points_with_boundary)
@@ -1025,7 +1212,7 @@ class GlobalGrid(Grid):
 class GlobalTrapezoidalGrid(GlobalGrid):
     def __init__(self, a, b, boundary=True, modified_basis=False):
         self.boundary = boundary
-        self.integrator = IntegratorArbitraryGridScalarProduct(self)
+        self.integrator = IntegratorTensorProduct(self)
         self.a = a
         self.b = b
         self.dim = len(a)
@@ -1139,35 +1326,26 @@ class GlobalTrapezoidalGridWeighted(GlobalTrapezoidalGrid):
             weights = GlobalTrapezoidalGrid.compute_weights(grid_1D, a, b, True) / (b - a)
             assert isclose(sum(weights), 1.0), sum(weights)
             return weights
+        # Calculate weights with the method of undetermined coefficients for all intervals at once
+        points = np.asarray(grid_1D, dtype=float)
+        x1 = points[:-1]
+        x2 = points[1:]
+        # w1 + w2 = moment_0 and w1 * x1 + w2 * x2 = moment_1
+        moments_0, moments_1 = distribution.get_interval_moments(grid_1D)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w2 = (moments_1 - moments_0 * x1) / (x2 - x1)
+        # For infinite borders, L'Hospital leads to a simple w2
+        w2 = np.where(np.isinf(x1), moments_0, np.where(np.isinf(x2), 0.0, w2))
+        w1 = moments_0 - w2
+        # Add them to the composite quadrature weights
         weights = np.zeros(num_points)
-        for i in range(num_points-1):
-            x1 = grid_1D[i]
-            x2 = grid_1D[i+1]
-            # Calculate weights with the method of undetermined coefficients
-            moment_0 = distribution.get_zeroth_moment(x1, x2)
-            # w1 + w2 = moment_0
-            moment_1 = distribution.get_first_moment(x1, x2)
-            # w1 * x1 + w2 * x2 = moment_1
-            if isinf(x1):
-                # For infinite borders, L'Hospital leads to a simple w2
-                w2 = moment_0
-            elif isinf(x2):
-                w2 = 0
-            else:
-                w2 = (moment_1 - moment_0 * x1) / (x2 - x1)
-            w1 = moment_0 - w2
-            # ~ print("dd", w1, w2, x1, x2, moment_0, moment_1)
-            # Add them to the composite quadrature weights
-            weights[i] += w1
-            weights[i+1] += w2
+        weights[:-1] += w1
+        weights[1:] += w2
 
         # Sometimes very small weights are negative instead of 0 due to
         # numerical errors
-        for i in range(num_points):
-            if weights[i] >= 0.0:
-                continue
-            assert -weights[i] < 10 ** -5, "calculated negative weight"
-            weights[i] = 0.0
+        assert np.all(weights > -10 ** -5), "calculated negative weight"
+        weights[weights < 0.0] = 0.0
 
         if not boundary:
             # Remove weights from boundary points and normalize
@@ -1193,7 +1371,7 @@ class GlobalRombergGrid(GlobalGrid):
                  slice_version=SliceVersion.ROMBERG_DEFAULT,
                  container_version=SliceContainerVersion.ROMBERG_DEFAULT):
         self.boundary = boundary
-        self.integrator = IntegratorArbitraryGridScalarProduct(self)
+        self.integrator = IntegratorTensorProduct(self)
         self.a = a
         self.b = b
         self.dim = len(a)
@@ -1239,7 +1417,7 @@ class GlobalRombergGrid(GlobalGrid):
 class GlobalBalancedRombergGrid(GlobalGrid):
     def __init__(self, a, b, boundary=False, modified_basis=False):
         self.boundary = boundary
-        self.integrator = IntegratorArbitraryGridScalarProduct(self)
+        self.integrator = IntegratorTensorProduct(self)
         self.a = a
         self.b = b
         self.dim = len(a)
@@ -1278,71 +1456,15 @@ class GlobalBasisGrid(GlobalGrid):
     def interpolate(self, evaluation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo) -> Sequence[Sequence[float]]:
         levelvec = component_grid.levelvector
         surplusses = self.surplus_values[tuple(levelvec)]
-        #print(surplusses)
-        results = np.zeros((len(evaluation_points), np.shape(surplusses)[0]))
-        #print(np.shape(results))
-        #for n, evaluation_point in enumerate(evaluation_points):
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = np.array([evaluation_point[d] for evaluation_point in evaluation_points])
-            evaluations1D = np.zeros((len(evaluation_points), len(self.basis[d])))
-            for i, basis in enumerate(self.basis[d]):
-                for j, p in enumerate(points_d):
-                    evaluations1D[j, i] = basis(p)
-            evaluations[d] = evaluations1D
-        #print(evaluations)
-        indexList = get_cross_product_range(self.numPoints)
-        #print(indexList)
-        for i, index in enumerate(indexList):
-            intermediate_result = np.ones((len(evaluation_points), np.shape(surplusses)[0]))
-            intermediate_result *= np.array(surplusses[:,i])
-            for d in range(self.dim):
-                for j in range(np.shape(surplusses)[0]):
-                    intermediate_result[:, j] *= evaluations[d][:, index[d]]
-            #print(intermediate_result)
-            results[:,:] += intermediate_result
-            #print(results[n,:])
-        #print(results)
-        return results
+        evaluation_points = np.asarray(evaluation_points, dtype=float).reshape(-1, self.dim)
+        evaluations = [evaluate_basis_1D(self.basis[d], evaluation_points[:, d]) for d in range(self.dim)]
+        return interpolate_tensor_product_points(surplusses, evaluations)
 
     def interpolate_grid(self, grid_points_for_dims: Sequence[Sequence[float]], component_grid: ComponentGridInfo) -> Sequence[Sequence[float]]:
         levelvec = component_grid.levelvector
         surplusses = self.surplus_values[tuple(levelvec)]
-        num_points = np.prod([len(grid_d) for grid_d in grid_points_for_dims])
-        num_points_grid = [len(grid_d) for grid_d in grid_points_for_dims]
-        #print(surplusses)
-        results = np.zeros((num_points, np.shape(surplusses)[0]))
-        #print(np.shape(results))
-        #for n, evaluation_point in enumerate(evaluation_points):
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = grid_points_for_dims[d]
-            evaluations1D = np.zeros((len(points_d), (len(self.splines[d]))))
-            for i, spline in enumerate(self.splines[d]):
-                for j, p in enumerate(points_d):
-                    #print(p, spline(p))
-                    evaluations1D[j, i] = spline(p)
-            evaluations[d] = evaluations1D
-        #print(evaluations)
-
-        #print(indexList)
-        pointIndexList = get_cross_product_range(num_points_grid)
-        for n, p in enumerate(pointIndexList):
-            indexList = get_cross_product_range(self.numPoints)
-            for i, index in enumerate(indexList):
-                intermediate_result = np.array(surplusses[:,i])
-                for d in range(self.dim):
-                    for j in range(np.shape(surplusses)[0]):
-                        intermediate_result *= evaluations[d][p[d], index[d]]
-                    #print(intermediate_result, surplusses[:,i], evaluations[d][p[d],:], grid[d], grid[d][p[d]], p[d])
-                #print(intermediate_result)
-                results[n,:] += intermediate_result
-            #print(results[n,:])
-        #print(results)
-        #print(list(pointIndexList))
-
-        #print(results)
-        return results
+        evaluations = [evaluate_basis_1D(self.basis[d], grid_points_for_dims[d]) for d in range(self.dim)]
+        return interpolate_tensor_product_grid(surplusses, evaluations)
 
 
 class GlobalBSplineGrid(GlobalBasisGrid):
@@ -1645,7 +1767,7 @@ from scipy.optimize import nnls
 import matplotlib.pyplot as plt
 
 class GlobalHighOrderGrid(GlobalGrid):
-    def __init__(self, a, b, boundary=True, do_nnls=False, max_degree=5, split_up=True, modified_basis=False):
+    def __init__(self, a, b, boundary=True, do_nnls=False, max_degree=5, split_up=True, modified_basis=False, weight_cache_size=1024):
         self.boundary = boundary
         self.integrator = IntegratorArbitraryGrid(self)
         self.a = a
@@ -1659,8 +1781,33 @@ class GlobalHighOrderGrid(GlobalGrid):
         self.current_dimension = -1
         self.trapezoidal_grid = GlobalTrapezoidalGrid(a,b, boundary, modified_basis)
         assert not(modified_basis) or not(boundary)
+        # the 1D weights are cached since most 1D point sets do not change between the set_grid calls of the
+        # refinement steps; the cache is bounded and evicts the least recently used entries
+        self.weight_cache = OrderedDict()
+        self.weight_cache_size = weight_cache_size
 
     def compute_1D_quad_weights(self, grid_1D: Sequence[float], a: float, b: float, d: int, grid_levels_1D: Sequence[int]=None) -> Sequence[float]:
+        if self.weight_cache_size == 0:
+            return self.compute_1D_quad_weights_uncached(grid_1D, a, b, d, grid_levels_1D)
+        key = self.get_weight_cache_key(grid_1D, a, b, d, grid_levels_1D)
+        if key in self.weight_cache:
+            self.weight_cache.move_to_end(key)
+        else:
+            self.weight_cache[key] = self.compute_1D_quad_weights_uncached(grid_1D, a, b, d, grid_levels_1D)
+            if len(self.weight_cache) > self.weight_cache_size:
+                self.weight_cache.popitem(last=False)
+        return np.array(self.weight_cache[key])
+
+    # returns the key of the weight cache; it contains all quantities that influence the 1D weights
+    def get_weight_cache_key(self, grid_1D: Sequence[float], a: float, b: float, d: int, grid_levels_1D: Sequence[int]=None) -> Tuple:
+        levels = None if grid_levels_1D is None else tuple(grid_levels_1D)
+        return (tuple(grid_1D), levels, a, b, self.boundary, self.modified_basis, self.do_nnls, self.max_degree,
+                self.split_up)
+
+    def clear_weight_cache(self) -> None:
+        self.weight_cache.clear()
+
+    def compute_1D_quad_weights_uncached(self, grid_1D: Sequence[float], a: float, b: float, d: int, grid_levels_1D: Sequence[int]=None) -> Sequence[float]:
         '''
         weights = np.zeros(len(grid_1D))
         for i in range(len(grid_1D)):
@@ -1924,13 +2071,17 @@ class GlobalHighOrderGrid(GlobalGrid):
 
 
 class GlobalHighOrderGridWeighted(GlobalHighOrderGrid):
-    def __init__(self, a, b, uq_operation, boundary=True, do_nnls=False, max_degree=5, split_up=True, modified_basis=False):
+    def __init__(self, a, b, uq_operation, boundary=True, do_nnls=False, max_degree=5, split_up=True, modified_basis=False, weight_cache_size=1024):
         # split_up is not yet supported
         split_up = False
-        super().__init__(a, b, boundary=boundary, do_nnls=do_nnls, max_degree=max_degree, split_up=split_up, modified_basis=modified_basis)
+        super().__init__(a, b, boundary=boundary, do_nnls=do_nnls, max_degree=max_degree, split_up=split_up, modified_basis=modified_basis, weight_cache_size=weight_cache_size)
         self.distributions = uq_operation.get_distributions()
         self.distributions_cp = uq_operation.get_distributions_chaospy()
 
+    # the weights depend on the distribution of dimension d
+    def get_weight_cache_key(self, grid_1D: Sequence[float], a: float, b: float, d: int, grid_levels_1D: Sequence[int]=None) -> Tuple:
+        return super().get_weight_cache_key(grid_1D, a, b, d, grid_levels_1D) + (d,)
+
     def get_composite_quad_weights(self, grid_1D, a, b):
         d = self.get_current_dimension()
         distr = self.distributions[d]
@@ -2192,7 +2343,7 @@ class GaussGrid(Grid):
         self.b = b
         self.boundary = False  # never points on boundary
         if integrator is None:
-            self.integrator = IntegratorArbitraryGridScalarProduct(self)
+            self.integrator = IntegratorTensorProduct(self)
         else:
             if integrator == 'old':
                 self.integrator = IntegratorArbitraryGrid(self)
@@ -2238,16 +2389,24 @@ class GaussLegendreGrid1D(GaussGrid1D):
         super().__init__(a, b, boundary)
 
     def get_1d_points_and_weights(self) -> Tuple[Sequence[float], Sequence[float]]:
-        coordsD, weightsD = legendre.leggauss(int(self.num_points))
-        coordsD = np.array(coordsD)
-        coordsD += np.ones(int(self.num_points))
-        coordsD *= self.length / 2.0
-        coordsD += self.start
-        weightsD = np.array(weightsD) * self.length / 2
+        coordsD, weightsD = self.get_1d_reference_points_and_weights()
+        coordsD = self.start + coordsD * self.length
+        weightsD = weightsD * self.length
         if self.normalize:
             weightsD *= 1/(self.end - self.start)
         return coordsD, weightsD
 
+    def get_quadrature_rule_parameters(self) -> Tuple:
+        return self.normalize,
+
+    # without normalization the Gauss-Legendre rule of [start, end] is the affine transformation of the rule of [0, 1]
+    def is_affine_quadrature_rule(self) -> bool:
+        return not self.normalize
+
+    def get_1d_reference_points_and_weights(self) -> Tuple[Sequence[float], Sequence[float]]:
+        coordsD, weightsD = legendre.leggauss(int(self.num_points))
+        return (np.array(coordsD) + 1) / 2.0, np.array(weightsD) / 2.0
+
 
 # Tailored for a normal distribution
 class GaussHermiteGrid(GaussGrid):
@@ -2270,6 +2429,9 @@ class GaussHermiteGrid1D(GaussGrid1D):
         self.loc = loc
         self.scale = scale
 
+    def get_quadrature_rule_parameters(self) -> Tuple:
+        return self.loc, self.scale
+
     def get_1d_points_and_weights(self) -> Tuple[Sequence[float], Sequence[float]]:
         coordsD, weightsD = hermite.hermgauss(int(self.num_points))
         coordsD = np.array(coordsD)
@@ -2301,7 +2463,7 @@ class TruncatedNormalDistributionGrid(Grid):
         self.a = a
         self.b = b
         if integrator is None:
-            self.integrator = IntegratorArbitraryGridScalarProduct(self)
+            self.integrator = IntegratorTensorProduct(self)
         else:
             if integrator == 'old':
                 self.integrator = IntegratorArbitraryGrid(self)
@@ -2316,6 +2478,9 @@ class TruncatedNormalDistributionGrid(Grid):
         return True
 
 class TruncatedNormalDistributionGrid1D(Grid1d):
+    # the rule depends on the mean and standard deviation of the distribution
+    cache_quadrature_rules = False
+
     def __init__(self, a, b, mean, std_dev, boundary=False):
         self.shift = lambda x: x * std_dev + mean
         self.shift_back = lambda x: (x - mean) / std_dev
@@ -8,13 +8,21 @@ from sparseSpACE.RefinementContainer import RefinementContainer
 from sparseSpACE.RefinementObject import RefinementObject
 import chaospy as cp
 import scipy.stats as sps
+import scipy.special
+import scipy.sparse
+import scipy.sparse.linalg
+import scipy.linalg
 from sparseSpACE.Function import *
+from sparseSpACE.PolynomialChaos import *
 from sparseSpACE.StandardCombi import *  # For reference solution calculation
 from bisect import bisect_left
+from functools import reduce
 
 from sparseSpACE.Utils import *
 import time
 import sys
+import copy
+import inspect
 
 if sys.version_info[0] == 3 and sys.version_info[1] >= 7:
     timing = time.time_ns
@@ -204,6 +212,41 @@ class GridOperation(object):
         """
         pass
 
+    def compute_partial_result(self, component_grid: ComponentGridInfo):
+        """This method computes the result of the operation on the specified component grid without changing the
+        combined result of the operation. It is used to evaluate the component grids in parallel. The partial results
+        are afterwards merged with apply_partial_result in the order of the combination scheme. It is only called if
+        supports_partial_results returns True, i.e. if the operation overrides it.
+
+        :param component_grid: ComponentGridInfo of the specified component grid.
+        :return: Partial result of the component grid.
+        """
+
+    def apply_partial_result(self, component_grid: ComponentGridInfo, partial_result) -> None:
+        """This method adds the partial result of the specified component grid to the combined result.
+
+        :param component_grid: ComponentGridInfo of the specified component grid.
+        :param partial_result: Result of compute_partial_result for this component grid.
+        :return: None
+        """
+
+    def supports_partial_results(self) -> bool:
+        """This method indicates whether the operation implements compute_partial_result and apply_partial_result.
+
+        :return: Bool
+        """
+        return type(self).compute_partial_result is not GridOperation.compute_partial_result
+
+    def get_worker_copy(self) -> "GridOperation":
+        """This method returns a copy of the operation that can be used by a worker thread. The grid stores the state
+        of the current component grid so each worker gets a private grid while all other attributes are shared.
+
+        :return: Shallow copy of the operation with a private copy of the grid.
+        """
+        worker_operation = copy.copy(self)
+        worker_operation.grid = copy.deepcopy(self.grid)
+        return worker_operation
+
     def calculate_operation_dimension_wise(self, gridPointCoordsAsStripes: Sequence[Sequence[float]],
                                            grid_point_levels: Sequence[Sequence[int]],
                                            component_grid: ComponentGridInfo) -> None:
@@ -215,6 +258,43 @@ class GridOperation(object):
         :return: None
         """
 
+    def compute_result_dimension_wise(self, gridPointCoordsAsStripes: Sequence[Sequence[float]],
+                                      grid_point_levels: Sequence[Sequence[int]], component_grid: ComponentGridInfo):
+        """This method computes the result of the operation on the component grid in the dimension-wise refinement
+        strategy without changing the combined result. The result only depends on the 1D point sets so it can be reused
+        in later refinement steps for component grids whose points did not change. It is only called if
+        supports_result_reuse_dimension_wise returns True, i.e. if the operation overrides it.
+
+        :param gridPointCoordsAsStripes: Gridpoints as list of 1D lists
+        :param grid_point_levels: Grid point levels as list of 1D lists
+        :param component_grid: Component grid on which operation should be applied.
+        :return: Result of the component grid.
+        """
+
+    def apply_result_dimension_wise(self, component_grid: ComponentGridInfo, result) -> None:
+        """This method adds the result of compute_result_dimension_wise to the combined result of the operation.
+
+        :param component_grid: Component grid to which the result belongs.
+        :param result: Result of compute_result_dimension_wise for the point sets of the component grid.
+        :return: None
+        """
+
+    def supports_result_reuse_dimension_wise(self) -> bool:
+        """This method indicates whether results of component grids can be reused across refinement steps in the
+        dimension-wise refinement strategy.
+
+        :return: Bool
+        """
+        return type(self).compute_result_dimension_wise is not GridOperation.compute_result_dimension_wise
+
+    def get_result_state_dimension_wise(self):
+        """This method returns the state besides the point sets on which the results of compute_result_dimension_wise
+        depend. Results computed in a different state are not reused.
+
+        :return: State of the operation (compared by identity)
+        """
+        return None
+
     @abc.abstractmethod
     def compute_error_estimates_dimension_wise(self, gridPointCoordsAsStripes: Sequence[Sequence[float]],
                                                grid_point_levels: Sequence[Sequence[int]],
@@ -289,6 +369,14 @@ import matplotlib.colors as colors
 
 
 class MachineLearning(AreaOperation):
+    def supports_result_reuse_dimension_wise(self) -> bool:
+        """Results can not be reused if the validation set is drawn again from the data in every refinement step.
+
+        :return: Bool
+        """
+        resample_validation_set = self.classes is not None and self.validation_set_size
+        return super().supports_result_reuse_dimension_wise() and not resample_validation_set
+
     def min_max_scale_surplusses(self):
         """Scale the surplusses by the maximum and minimum of the surplusses
         """
@@ -450,6 +538,70 @@ class MachineLearning(AreaOperation):
         self.extrema = (min, max)
         return self.extrema
 
+    def get_1D_mass_matrix(self, level: int, num_points: int) -> Tuple[Sequence[float], Sequence[float]]:
+        """This method returns the 1D mass matrix of the hat functions of the specified level. As the hat functions only
+        overlap with their direct neighbours the matrix is tridiagonal.
+
+        :param level: Level of the 1D grid
+        :param num_points: Number of points of the 1D grid
+        :return: Diagonal and off-diagonal of the tridiagonal 1D mass matrix
+        """
+        # basis function overlap fully
+        diagonal = np.full(num_points, 1 / (2 ** (level - 1) * 3))
+        # basis functions of direct neighbours overlap partly
+        off_diagonal = np.full(num_points - 1, 1 / (2 ** (level - 1) * 12))
+        return diagonal, off_diagonal
+
+    def get_1D_stiffness_matrix(self, level: int, num_points: int) -> Tuple[Sequence[float], Sequence[float]]:
+        """This method returns the 1D stiffness matrix (scalar products of the derivatives) of the hat functions of the
+        specified level. As the hat functions only overlap with their direct neighbours the matrix is tridiagonal.
+
+        :param level: Level of the 1D grid
+        :param num_points: Number of points of the 1D grid
+        :return: Diagonal and off-diagonal of the tridiagonal 1D stiffness matrix
+        """
+        # basis function overlap fully
+        diagonal = np.full(num_points, float(2 ** (level + 1)))
+        # basis functions of direct neighbours overlap partly
+        off_diagonal = np.full(num_points - 1, -float(2 ** level))
+        return diagonal, off_diagonal
+
+    @staticmethod
+    def apply_1D_tridiagonal_matrix(values: Sequence[float], diagonal: Sequence[float], off_diagonal: Sequence[float],
+                                    axis: int) -> Sequence[float]:
+        """This method multiplies the symmetric tridiagonal 1D matrix with the tensor of values along the given axis.
+
+        :param values: Tensor of values (one axis per dimension)
+        :param diagonal: Diagonal of the 1D matrix
+        :param off_diagonal: Off-diagonal of the 1D matrix
+        :param axis: Axis (dimension) along which the matrix is applied
+        :return: Tensor of the same shape with the result
+        """
+        values = np.moveaxis(values, axis, 0)
+        broadcast_shape = (-1,) + (1,) * (values.ndim - 1)
+        result = values * diagonal.reshape(broadcast_shape)
+        result[1:] += values[:-1] * off_diagonal.reshape(broadcast_shape)
+        result[:-1] += values[1:] * off_diagonal.reshape(broadcast_shape)
+        return np.moveaxis(result, 0, axis)
+
+    def evaluate_levelvec(self, component_grid: ComponentGridInfo) -> Sequence[float]:
+        """This method calculates the surpluses for the the specified component grid
+
+        :param component_grid: ComponentGridInfo of the specified component grid
+        :return: Surpluses of the component grid
+        """
+        surpluses = self.compute_partial_result(component_grid)
+        self.apply_partial_result(component_grid, surpluses)
+        return surpluses
+
+    def apply_partial_result(self, component_grid: ComponentGridInfo, surpluses: Sequence[float]) -> None:
+        """This method stores the surpluses of the specified component grid
+
+        :param component_grid: ComponentGridInfo of the specified component grid
+        :param surpluses: Surpluses of the component grid
+        """
+        self.surpluses.update({tuple(component_grid.levelvector): surpluses})
+
     def get_result(self) -> Dict[Sequence[int], Sequence[float]]:
         return self.surpluses
 
@@ -870,8 +1022,8 @@ class DensityEstimation(MachineLearning):
     def get_reference_solution(self) -> None:
         return None
 
-    def evaluate_levelvec(self, component_grid: ComponentGridInfo) -> Sequence[float]:
-        """This method calculates the surpluses for the the specified component grid
+    def compute_partial_result(self, component_grid: ComponentGridInfo) -> Sequence[float]:
+        """This method calculates the surpluses for the the specified component grid without storing them
 
         :param component_grid: ComponentGridInfo of the specified component grid
         :return: Surpluses of the component grid
@@ -888,9 +1040,7 @@ class DensityEstimation(MachineLearning):
             self.grid.numPoints = numPoints
         # currently routine only tested without boundaries and without adaptivity!
         assert not self.grid.boundary and not self.dimension_wise
-        surpluses = self.solve_density_estimation(component_grid.levelvector)
-        self.surpluses.update({tuple(component_grid.levelvector): surpluses})
-        return surpluses
+        return self.solve_density_estimation(component_grid.levelvector)
 
     def calculate_operation_dimension_wise(self, gridPointCoordsAsStripes: Sequence[Sequence[float]],
                                            grid_point_levels: Sequence[Sequence[int]],
@@ -902,11 +1052,18 @@ class DensityEstimation(MachineLearning):
         :param component_grid: Component grid on which operation should be applied.
         :return: None
         """
+        surpluses = self.compute_result_dimension_wise(gridPointCoordsAsStripes, grid_point_levels, component_grid)
+        self.apply_result_dimension_wise(component_grid, surpluses)
+
+    def compute_result_dimension_wise(self, gridPointCoordsAsStripes: Sequence[Sequence[float]],
+                                      grid_point_levels: Sequence[Sequence[int]],
+                                      component_grid: ComponentGridInfo) -> Sequence[float]:
         self.grid_surplusses.set_grid(gridPointCoordsAsStripes, grid_point_levels)
         self.grid.set_grid(gridPointCoordsAsStripes, grid_point_levels)
-        surpluses = self.solve_density_estimation_dimension_wise(gridPointCoordsAsStripes, grid_point_levels,
-                                                                 component_grid)
+        return self.solve_density_estimation_dimension_wise(gridPointCoordsAsStripes, grid_point_levels,
+                                                            component_grid)
 
+    def apply_result_dimension_wise(self, component_grid: ComponentGridInfo, surpluses: Sequence[float]) -> None:
         self.refinement_container.value += np.array(abs(surpluses.sum() / surpluses.size)) * component_grid.coefficient
         self.surpluses.update({tuple(component_grid.levelvector): surpluses})
 
@@ -1541,53 +1698,52 @@ class DensityEstimation(MachineLearning):
         if self.masslumping:
             return diag_val
         else:
-            grid_size = self.grid.get_num_points()
-            R = np.zeros((grid_size, grid_size))
-
-            # if not self.grid.is_global():
-            index_list = np.array(get_cross_product_range_list(self.grid.numPoints), dtype=int) + 1
-            # else:
-            #    index_list = self.get_existing_indices(levelvec)
+            return self.build_R_matrix_sparse(levelvec).toarray()
 
-            R[np.diag_indices_from(R)] += (diag_val + self.lambd)
-            if self.debug:
-                self.log_util.log_debug("Indexlist: {0}".format(index_list))
-                self.log_util.log_debug("Levelvector: {0}".format(levelvec))
-                self.log_util.log_debug("Diagonal value: {0}".format(diag_val))
-            if not self.masslumping:
-                for i in range(grid_size - 1):
-                    for j in range(i + 1, grid_size):
-                        res = 1.0
-
-                        for k in range(dim):
-                            index_ik = index_list[i][k]
-                            index_jk = index_list[j][k]
+    def build_R_matrix_sparse(self, levelvec: Sequence[int]) -> scipy.sparse.csr_matrix:
+        """This method constructs the R matrix (including λ*I) for the component grid specified by the levelvector as
+        sparse matrix. The matrix is the Kronecker product of the tridiagonal 1D mass matrices.
 
-                            # basis function overlap fully
-                            if index_ik == index_jk:
-                                res *= 1 / (2 ** (levelvec[k] - 1) * 3)
-                            # basis function do not overlap
-                            elif max((index_ik - 1) * 2 ** (levelvec[k] - 1), (index_jk - 1) * 2 ** (levelvec[k] - 1)) \
-                                    >= min((index_ik + 1) * 2 ** (levelvec[k] - 1),
-                                           (index_jk + 1) * 2 ** (levelvec[k] - 1)):
-                                res = 0
-                                break
-                            # basis functions overlap partly
-                            else:
-                                res *= 1 / (2 ** (levelvec[k] - 1) * 12)
+        :param levelvec: Levelvector of the component grid
+        :return: Sparse R matrix of the component grid specified by the levelvector
+        """
+        R = scipy.sparse.identity(1, format='csr')
+        for k in range(len(levelvec)):
+            diagonal, off_diagonal = self.get_1D_mass_matrix(levelvec[k], self.grid.numPoints[k])
+            mass_matrix_1D = scipy.sparse.diags([off_diagonal, diagonal, off_diagonal], [-1, 0, 1], format='csr')
+            R = scipy.sparse.kron(R, mass_matrix_1D, format='csr')
+        if self.lambd != 0:
+            R = R + self.lambd * scipy.sparse.identity(R.shape[0], format='csr')
+        return R
+
+    def solve_R_matrix_kronecker(self, levelvec: Sequence[int], b: Sequence[float]) -> Sequence[float]:
+        """This method solves (R + λ*I) alpha = b without assembling R. The 1D mass matrices are diagonalized
+        (M_k = Q_k * Λ_k * Q_k^T) so that R + λ*I = (Q_1 ⊗ ... ⊗ Q_d) (Λ_1 ⊗ ... ⊗ Λ_d + λ*I) (Q_1 ⊗ ... ⊗ Q_d)^T which is
+        applied dimension by dimension.
 
-                        if res == 0:
-                            self.log_util.log_debug("-" * 100)
-                            self.log_util.log_debug("Skipping calculation")
-                            self.log_util.log_debug("Gridpoints: {0} {1}".format(index_list[i], index_list[j]))
-                        else:
-                            R[i, j] = res
-                            R[j, i] = res
-                            self.log_util.log_debug("-" * 100)
-                            self.log_util.log_debug("Calculating")
-                            self.log_util.log_debug("Gridpoints: {0} {1}".format(index_list[i], index_list[j]))
-                            self.log_util.log_debug("Result: {0}".format(res))
-            return R
+        :param levelvec: Levelvector of the component grid
+        :param b: Right hand side of the linear system
+        :return: Solution alpha of the linear system
+        """
+        num_points = [int(n) for n in self.grid.numPoints]
+        eigenvalues = []
+        eigenvectors = []
+        for k in range(len(levelvec)):
+            diagonal, off_diagonal = self.get_1D_mass_matrix(levelvec[k], num_points[k])
+            if num_points[k] == 1:
+                eigenvalues_1D, eigenvectors_1D = diagonal, np.ones((1, 1))
+            else:
+                eigenvalues_1D, eigenvectors_1D = scipy.linalg.eigh_tridiagonal(diagonal, off_diagonal)
+            eigenvalues.append(eigenvalues_1D)
+            eigenvectors.append(eigenvectors_1D)
+        alphas = np.asarray(b, dtype=float).reshape(num_points)
+        for k in range(len(num_points)):
+            alphas = np.moveaxis(np.tensordot(eigenvectors[k].T, alphas, axes=(1, k)), 0, k)
+        diagonal_R = reduce(np.multiply.outer, eigenvalues) + self.lambd
+        alphas = alphas / diagonal_R
+        for k in range(len(num_points)):
+            alphas = np.moveaxis(np.tensordot(eigenvectors[k], alphas, axes=(1, k)), 0, k)
+        return alphas.reshape(-1)
 
     def solve_density_estimation(self, levelvec: Sequence[int]) -> Sequence[float]:
         """Calculates the surpluses of the component grid for the specified dataset
@@ -1595,20 +1751,16 @@ class DensityEstimation(MachineLearning):
         :param levelvec: Levelvector of the component grid
         :return: Surpluses of the component grid for the specified dataset
         """
-        R = self.build_R_matrix(levelvec)
-        # scaling ensures that matrix values are not too small for cg tolerance
-        scale_value = 1 / np.amax(R)
-        R = R * scale_value
-        b = self.calculate_B(self.data, levelvec) * scale_value
-        if self.masslumping and not self.grid.boundary and not self.grid.modified_basis:
-            # with mass lumping and without boundary points and without modified basis R is identity
-            alphas = b
+        b = self.calculate_B(self.data, levelvec)
+        if self.masslumping:
+            # with mass lumping R is a multiple of the identity
+            alphas = b / self.build_R_matrix(levelvec)
         else:
-            # alphas, info = cg(R, b)
-            alphas = np.linalg.solve(R, b)
+            # R is not assembled; the Kronecker structure of R is used to solve the system
+            alphas = self.solve_R_matrix_kronecker(levelvec, b)
         if self.debug:
-            self.log_util.log_debug("R and b" + str(R / scale_value) + str(b / scale_value))
-            self.log_util.log_debug("Alphas: " + alphas)
+            self.log_util.log_debug("b" + str(b))
+            self.log_util.log_debug("Alphas: " + str(alphas))
             self.log_util.log_debug("-" * 100)
         # normalize integral of density
         levelvec = np.asarray(levelvec)
@@ -1627,7 +1779,6 @@ class DensityEstimation(MachineLearning):
             self.log_util.log_debug("{0}".format(alphas))
         if integral == 0 and self.debug:
             # integral should not be zero!
-            self.log_util.log_debug("Matrix: {0}".format(R))
             self.log_util.log_debug("b Vector: {0}".format(b))
             self.log_util.log_debug("surplus_values: {0}".format(alphas))
             self.log_util.log_debug("Weights: {0}".format(weights))
@@ -1868,7 +2019,8 @@ class DensityEstimation(MachineLearning):
 class Regression(MachineLearning):
     def __init__(self, data, target_values: Sequence[float], regularization, regularization_matrix='C',
                  rangee=[0.05, 0.95], grid=None, print_output: bool = False,
-                 log_level: int = log_levels.INFO, print_level: int = print_levels.INFO, debug: bool = False):
+                 log_level: int = log_levels.INFO, print_level: int = print_levels.INFO, debug: bool = False,
+                 solver: str = 'lstsq', cg_tolerance: float = 1e-10, cg_max_iterations: int = None):
         """Constructor of the Regression class
 
         :param data: the data set on which desity estimation is to be performed
@@ -1881,9 +2033,15 @@ class Regression(MachineLearning):
         :param print_output: print to console
         :param log_level: Set the log level. Only statements of the given level or higher will be written to the log file
         :param print_level: Set the level for print statements. Only statements of the given level or higher will be written to the console
+        :param solver: solver for the regularized system: lstsq (dense matrices) or cg (matrix-free conjugate gradient
+        with sparse A and Kronecker structured C, suited for large component grids and data sets)
+        :param cg_tolerance: relative residual tolerance of the conjugate gradient method
+        :param cg_max_iterations: maximum number of conjugate gradient iterations (None: scipy default)
         """
         if (len(data) == 0):
             raise Exception("Data must not be empty!")
+        if solver not in ['lstsq', 'cg']:
+            raise Exception("No valid solver specified! Possible options: lstsq or cg")
         if (len(data) != len(target_values)):
             raise Exception("Data and targets must have the same length!")
         self.data = data
@@ -1898,6 +2056,9 @@ class Regression(MachineLearning):
         self.regularization_opticom = regularization
         self.dim = len(self.data[0])
         self.regularization_matrix = regularization_matrix
+        self.solver = solver
+        self.cg_tolerance = cg_tolerance
+        self.cg_max_iterations = cg_max_iterations
         if regularization_matrix == 'C':
             print("Matrix used: C")
         elif regularization_matrix == 'I':
@@ -2605,15 +2766,21 @@ class Regression(MachineLearning):
         :param component_grid: Component grid on which operation should be applied.
         :return: None
         """
+        surpluses = self.compute_result_dimension_wise(gridPointCoordsAsStripes, grid_point_levels, component_grid)
+        self.apply_result_dimension_wise(component_grid, surpluses)
+
+    def compute_result_dimension_wise(self, gridPointCoordsAsStripes: Sequence[Sequence[float]],
+                                      grid_point_levels: Sequence[Sequence[int]],
+                                      component_grid: ComponentGridInfo) -> Sequence[float]:
         self.grid_surplusses.set_grid(gridPointCoordsAsStripes, grid_point_levels)
         self.grid.set_grid(gridPointCoordsAsStripes, grid_point_levels)
         if self.regularization == 0:
-            surpluses = self.solve_regression_dimension_wise(gridPointCoordsAsStripes, grid_point_levels,
-                                                             component_grid)
+            return self.solve_regression_dimension_wise(gridPointCoordsAsStripes, grid_point_levels, component_grid)
         else:
-            surpluses = self.solve_regression_dimension_wise_smooth(gridPointCoordsAsStripes, grid_point_levels,
-                                                                    component_grid)
+            return self.solve_regression_dimension_wise_smooth(gridPointCoordsAsStripes, grid_point_levels,
+                                                               component_grid)
 
+    def apply_result_dimension_wise(self, component_grid: ComponentGridInfo, surpluses: Sequence[float]) -> None:
         self.refinement_container.value += np.array(abs(surpluses.sum() / surpluses.size)) * component_grid.coefficient
         self.surpluses.update({tuple(component_grid.levelvector): surpluses})
 
@@ -2832,8 +2999,8 @@ class Regression(MachineLearning):
 
         return evaluations
 
-    def evaluate_levelvec(self, component_grid: ComponentGridInfo) -> Sequence[float]:
-        """This method calculates the surpluses for the the specified component grid
+    def compute_partial_result(self, component_grid: ComponentGridInfo) -> Sequence[float]:
+        """This method calculates the surpluses for the the specified component grid without storing them
 
         :param component_grid: ComponentGridInfo of the specified component grid
         :return: Surpluses of the component grid
@@ -2854,7 +3021,6 @@ class Regression(MachineLearning):
             surpluses = self.solve_regression(component_grid.levelvector)
         else:
             surpluses = self.solve_regression_smooth(component_grid.levelvector)
-        self.surpluses.update({tuple(component_grid.levelvector): surpluses})
         return surpluses
 
     def build_A_matrix(self, levelvec: Sequence[int]) -> Sequence[Sequence[float]]:
@@ -2890,65 +3056,86 @@ class Regression(MachineLearning):
         :param levelvec: Levelvector of the component grid
         :return: C matrix of the component grid specified by the levelvector
         """
-        dim = len(levelvec)
+        return self.build_C_matrix_sparse(levelvec).toarray()
 
-        grid_size = self.grid.get_num_points()
-        C = np.zeros((grid_size, grid_size))
-
-        index_list = np.array(get_cross_product_range_list(self.grid.numPoints), dtype=int) + 1
-
-        for i in range(grid_size):
-            for j in range(i, grid_size):
-                res = 0.0
+    def get_C_matrix_factors(self, levelvec: Sequence[int]) -> List[List[Tuple[Sequence[float], Sequence[float]]]]:
+        """This method returns the tridiagonal 1D factors of the C matrix. The C matrix is the sum over all dimensions k
+        of the Kronecker products of the 1D stiffness matrix in dimension k and the 1D mass matrices in all other
+        dimensions. (The 1D mass matrices are scaled with the level of dimension k.)
 
-                for k in range(dim):
-
-                    temp_res = 1.
-                    for m in range(dim):
-
-                        index_im = index_list[i][m]
-                        index_jm = index_list[j][m]
-
-                        if m == k:
+        :param levelvec: Levelvector of the component grid
+        :return: For each summand k the list of (diagonal, off-diagonal) of the 1D matrices of all dimensions
+        """
+        dim = len(levelvec)
+        factors = []
+        for k in range(dim):
+            factors.append([self.get_1D_stiffness_matrix(levelvec[k], self.grid.numPoints[m]) if m == k
+                            else self.get_1D_mass_matrix(levelvec[k], self.grid.numPoints[m]) for m in range(dim)])
+        return factors
 
-                            # basis function overlap fully
-                            if index_im == index_jm:
-                                temp_res *= (2 ** (levelvec[k] + 1))
-                            # basis function do not overlap
-                            elif abs(index_jm - index_im) > 1:
-                                temp_res = 0
-                                break
-                            # basis functions overlap partly
-                            else:
-                                temp_res *= -(2 ** (levelvec[k]))
+    def build_C_matrix_sparse(self, levelvec: Sequence[int]) -> scipy.sparse.csr_matrix:
+        """This method constructs the C matrix for the component grid specified by the levelvector as sparse matrix
+        using the Kronecker structure of the matrix.
 
-                        else:
-                            # basis function overlap fully
-                            if index_im == index_jm:
-                                temp_res *= 1 / (2 ** (levelvec[k] - 1) * 3)
-                            # basis function do not overlap
-                            elif abs(index_jm - index_im) > 1:
-                                temp_res = 0
-                                break
-                            # basis functions overlap partly
-                            else:
-                                temp_res *= 1 / (2 ** (levelvec[k] - 1) * 12)
+        :param levelvec: Levelvector of the component grid
+        :return: sparse C matrix of the component grid specified by the levelvector
+        """
+        grid_size = int(np.prod(self.grid.numPoints))
+        C = scipy.sparse.csr_matrix((grid_size, grid_size))
+        for factors_k in self.get_C_matrix_factors(levelvec):
+            matrices_1D = [scipy.sparse.diags([off_diagonal, diagonal, off_diagonal], [-1, 0, 1])
+                           for diagonal, off_diagonal in factors_k]
+            C = C + reduce(lambda x, y: scipy.sparse.kron(x, y, format='csr'), matrices_1D)
+        return C
 
-                    res += temp_res
+    def apply_C_matrix(self, levelvec: Sequence[int], alphas: Sequence[float]) -> Sequence[float]:
+        """This method multiplies the C matrix of the component grid with the vector alphas without assembling the
+        matrix. The Kronecker products of the tridiagonal 1D matrices are applied along the axes of the tensor of
+        alphas which requires O(d^2 * N) operations.
 
-                if res == 0:
-                    self.log_util.log_debug("-" * 100)
-                    self.log_util.log_debug("Skipping calculation")
-                    self.log_util.log_debug("Gridpoints: {0} {1}".format(index_list[i], index_list[j]))
-                else:
-                    C[i, j] = res
-                    C[j, i] = res
-                    self.log_util.log_debug("-" * 100)
-                    self.log_util.log_debug("Calculating")
-                    self.log_util.log_debug("Gridpoints: {0} {1}".format(index_list[i], index_list[j]))
-                    self.log_util.log_debug("Result: {0}".format(res))
+        :param levelvec: Levelvector of the component grid
+        :param alphas: Vector of length N (number of grid points)
+        :return: Result of the multiplication C * alphas
+        """
+        alphas = np.reshape(alphas, self.grid.numPoints)
+        result = np.zeros(alphas.shape)
+        for factors_k in self.get_C_matrix_factors(levelvec):
+            product = alphas
+            for m, (diagonal, off_diagonal) in enumerate(factors_k):
+                product = self.apply_1D_tridiagonal_matrix(product, diagonal, off_diagonal, m)
+            result += product
+        return result.ravel()
+
+    def build_A_matrix_sparse(self, levelvec: Sequence[int]) -> scipy.sparse.csr_matrix:
+        """This method constructs the A matrix for the component grid specified by the levelvector as sparse matrix.
+        Each data point lies in the support of at most 2^d hat functions so only these entries are computed.
 
-        return C
+        :param levelvec: Levelvector of the component grid
+        :return: sparse A matrix (number of data points x number of grid points)
+        """
+        data = np.asarray(self.training_data, dtype=float)
+        num_data, dim = data.shape
+        num_points = np.asarray(self.grid.numPoints, dtype=int)
+        # row-major strides of the grid points (first dimension slowest as in get_cross_product_range_list)
+        strides = np.ones(dim, dtype=int)
+        for d in reversed(range(dim - 1)):
+            strides[d] = strides[d + 1] * num_points[d + 1]
+        scaled_data = data * 2 ** np.asarray(levelvec, dtype=int)
+        left_index = np.floor(scaled_data).astype(int)
+        columns = np.zeros((num_data, 2 ** dim), dtype=int)
+        values = np.ones((num_data, 2 ** dim))
+        for corner in range(2 ** dim):
+            for d in range(dim):
+                # the hat functions are indexed from 1 to numPoints (no boundary points)
+                index = left_index[:, d] + ((corner >> d) & 1)
+                hat_value = np.maximum(1 - np.abs(scaled_data[:, d] - index), 0)
+                hat_value[(index < 1) | (index > num_points[d])] = 0
+                values[:, corner] *= hat_value
+                columns[:, corner] += (np.clip(index, 1, num_points[d]) - 1) * strides[d]
+        rows = np.repeat(np.arange(num_data), 2 ** dim)
+        nonzero = values.ravel() > 0
+        return scipy.sparse.csr_matrix((values.ravel()[nonzero], (rows[nonzero], columns.ravel()[nonzero])),
+                                       shape=(num_data, int(np.prod(num_points))))
 
     def build_left_matrix(self, levelvec: Sequence[int]) -> Sequence[Sequence[float]]:
         """This method constructs the matrix of the left side of the equation (regression with regularization
@@ -2990,6 +3177,9 @@ class Regression(MachineLearning):
         :return: Surpluses of the component grid for the specified dataset
         """
 
+        if self.solver == 'cg':
+            return self.solve_regression_smooth_matrix_free(levelvec)
+
         left = self.build_left_matrix(levelvec)
 
         right = self.build_right_vector(levelvec)
@@ -2998,6 +3188,36 @@ class Regression(MachineLearning):
 
         return alphas
 
+    def solve_regression_smooth_matrix_free(self, levelvec: Sequence[int]) -> Sequence[float]:
+        """Calculates the surpluses of the component grid for the specified dataset with the conjugate gradient method.
+        Neither AT*A nor C are assembled: A is stored as sparse matrix and C is applied via its Kronecker structure.
+
+        :param levelvec: Levelvector of the component grid
+        :return: Surpluses of the component grid for the specified dataset
+        """
+        A = self.build_A_matrix_sparse(levelvec)
+        m = len(self.training_target_values)
+        grid_size = A.shape[1]
+
+        def apply_left_matrix(alphas):
+            alphas = np.ravel(alphas)
+            if self.regularization_matrix == 'C':
+                regularization_term = self.apply_C_matrix(levelvec, alphas)
+            else:
+                regularization_term = alphas
+            return (1 / m) * A.T.dot(A.dot(alphas)) + self.regularization * regularization_term
+
+        left = scipy.sparse.linalg.LinearOperator((grid_size, grid_size), matvec=apply_left_matrix, dtype=float)
+        right = (1 / m) * A.T.dot(np.asarray(self.training_target_values, dtype=float))
+        # the keyword of the relative tolerance was renamed from tol to rtol in newer scipy versions
+        tolerance_keyword = 'rtol' if 'rtol' in inspect.signature(scipy.sparse.linalg.cg).parameters else 'tol'
+        alphas, info = scipy.sparse.linalg.cg(left, right, atol=0.0, maxiter=self.cg_max_iterations,
+                                              **{tolerance_keyword: self.cg_tolerance})
+        if info > 0:
+            self.log_util.log_warning("CG did not converge within {0} iterations for levelvector {1}"
+                                      .format(info, levelvec))
+        return alphas
+
     def plot_dataset(self):
         """
         This method plots the data set specified for this operation
@@ -3011,10 +3231,14 @@ class Regression(MachineLearning):
 
 class Integration(AreaOperation):
     def __init__(self, f: Function, grid: Grid, dim: int, reference_solution: Sequence[float] = None,
-                 print_level: int = print_levels.NONE, log_level: int = log_levels.INFO):
+                 print_level: int = print_levels.NONE, log_level: int = log_levels.INFO, chunk_size: int = None):
         self.f = f
         self.f_actual = None
         self.grid = grid
+        # maximum number of points evaluated at once on a component grid (None: all points at once)
+        self.chunk_size = chunk_size
+        if grid is not None and chunk_size is not None:
+            grid.set_chunk_size(chunk_size)
         self.reference_solution = reference_solution
         self.dim = dim
         self.dict_integral = {}
@@ -3025,8 +3249,9 @@ class Integration(AreaOperation):
         self.log_util.set_log_prefix('Integration')
 
     def get_distinct_points(self, combi_scheme):
-        # Here we return all points used in the whole adaptive process
-        return self.f.get_f_dict_size()
+        # Here we return all points used in the whole adaptive process (including the chunked evaluations whose values
+        # are not stored in the function dictionary)
+        return self.f.get_num_distinct_points()
 
     def get_point_values_component_grid(self, points, component_grid) -> Sequence[Sequence[float]]:
         """This method returns the values in the component grid at the given points.
@@ -3059,6 +3284,8 @@ class Integration(AreaOperation):
             self.integral -= removed_object.value
 
     def get_component_grid_values(self, component_grid, mesh_points_grid):
+        if self.chunk_size is not None:
+            return self.get_component_grid_values_chunked(mesh_points_grid)
         if self.grid.boundary:
             mesh_points = get_cross_product_list(mesh_points_grid)
             values = self.f(mesh_points)
@@ -3070,6 +3297,39 @@ class Integration(AreaOperation):
             values[filter] = self.f(mesh_points[filter])
         return values
 
+    def get_component_grid_values_chunked(self, mesh_points_grid: Sequence[Sequence[float]]) -> Sequence[Sequence[float]]:
+        """This method assembles the values of get_component_grid_value_chunks in one array for the callers that need
+        all values of the grid (e.g. interpolation and hierarchization); the array of the values is the only storage
+        that grows with the number of points.
+
+        :param mesh_points_grid: Grid definition of the points at which we want the values.
+        :return: Array of the values at the mesh points (ordered as in get_cross_product(mesh_points_grid)).
+        """
+        values = np.empty((int(np.prod([len(mesh_points_1D) for mesh_points_1D in mesh_points_grid])),
+                           self.f.output_length()))
+        for start, end, chunk_values in self.get_component_grid_value_chunks(mesh_points_grid):
+            values[start:end] = chunk_values
+        return values
+
+    def get_component_grid_value_chunks(self, mesh_points_grid: Sequence[Sequence[float]]) \
+            -> Generator[Tuple[int, int, np.ndarray], None, None]:
+        """This method evaluates the function on the mesh in chunks of at most chunk_size points and yields the values
+        chunk by chunk, so only one chunk of points and values is stored at once. The chunks are evaluated with
+        call_read_only, i.e. cached values are used but the new values are not stored in the function dictionary.
+
+        :param mesh_points_grid: Grid definition of the points at which we want the values.
+        :return: Iterator over the start and end index of the chunk (in the order of get_cross_product) and its values.
+        """
+        for start, end, mesh_points in get_cross_product_chunks(mesh_points_grid, self.chunk_size):
+            if self.grid.boundary:
+                chunk_values = self.f.call_read_only(mesh_points)
+            else:
+                chunk_values = np.zeros((end - start, self.f.output_length()))
+                filter = self.grid.points_not_zero(mesh_points).astype(bool)
+                if np.any(filter):
+                    chunk_values[filter] = self.f.call_read_only(mesh_points[filter])
+            yield start, end, chunk_values
+
     def get_mesh_values(self, mesh_points_grid):
         mesh_points = get_cross_product(mesh_points_grid)
         function_value_dim = self.f.output_length()
@@ -3110,8 +3370,12 @@ class Integration(AreaOperation):
         return evaluations
 
     def evaluate_levelvec(self, component_grid: ComponentGridInfo):
-        levelvector = component_grid.levelvector
-        partial_integral = self.grid.integrate(self.f, levelvector, self.grid.a, self.grid.b)
+        self.apply_partial_result(component_grid, self.compute_partial_result(component_grid))
+
+    def compute_partial_result(self, component_grid: ComponentGridInfo):
+        return self.grid.integrate(self.f, component_grid.levelvector, self.grid.a, self.grid.b)
+
+    def apply_partial_result(self, component_grid: ComponentGridInfo, partial_integral):
         self.integral += partial_integral * component_grid.coefficient
 
     def evaluate_area_for_error_estimates(self, area, levelvector, componentgrid_info, refinement_container,
@@ -3285,15 +3549,24 @@ class Integration(AreaOperation):
                 integral -= v
                 integral += self.get_new_contributions(modification_points, gridPointCoordsAsStripes)
         else:
-            self.grid_surplusses.set_grid(gridPointCoordsAsStripes, grid_point_levels)
-            self.grid.set_grid(gridPointCoordsAsStripes, grid_point_levels)
-            integral = self.grid.integrate(self.f, component_grid.levelvector, self.a, self.b)
-        self.refinement_container.value += integral * component_grid.coefficient
-        self.integral += integral * component_grid.coefficient
+            integral = self.compute_result_dimension_wise(gridPointCoordsAsStripes, grid_point_levels, component_grid)
+        self.apply_result_dimension_wise(component_grid, integral)
         if reuse_old_values:
             self.dict_integral[tuple(component_grid.levelvector)] = np.array(integral)
             self.dict_points[tuple(component_grid.levelvector)] = np.array(gridPointCoordsAsStripes)
 
+    def compute_result_dimension_wise(self, gridPointCoordsAsStripes, grid_point_levels, component_grid):
+        self.grid_surplusses.set_grid(gridPointCoordsAsStripes, grid_point_levels)
+        self.grid.set_grid(gridPointCoordsAsStripes, grid_point_levels)
+        return self.grid.integrate(self.f, component_grid.levelvector, self.a, self.b)
+
+    def apply_result_dimension_wise(self, component_grid, integral):
+        self.refinement_container.value += integral * component_grid.coefficient
+        self.integral += integral * component_grid.coefficient
+
+    def get_result_state_dimension_wise(self):
+        return self.f
+
     def set_function(self, f=None):
         assert f is None or f == self.f, "Integration and the refinement should use the same function"
 
@@ -3475,7 +3748,9 @@ class Interpolation(Integration):
     @staticmethod
     def interpolate_points(values: Sequence[Sequence[float]], dim: int, grid: Grid,
                            mesh_points_grid: Sequence[Sequence[float]],
-                           evaluation_points: Sequence[Tuple[float, ...]]):
+                           evaluation_points: Sequence[Tuple[float, ...]], use_interpn: bool = False):
+        if not use_interpn:
+            return Interpolation.interpolate_points_multilinear(values, mesh_points_grid, evaluation_points)
         # constructing all points from mesh definition
         function_value_dim = len(values[0])
         interpolated_values_array = []
@@ -3491,6 +3766,62 @@ class Interpolation(Integration):
             interpolated_values_array.append(interpolated_values.reshape((len(interpolated_values), 1)))
         return np.hstack(interpolated_values_array)
 
+    @staticmethod
+    def interpolate_points_multilinear(values: Sequence[Sequence[float]], mesh_points_grid: Sequence[Sequence[float]],
+                                       evaluation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[float]]:
+        """This method interpolates the values given on the tensor grid mesh_points_grid at the evaluation points using
+        d-linear interpolation. The enclosing cell and the interpolation weights are computed only once per
+        evaluation point and are applied to all output components at once.
+
+        :param values: Values at the mesh points with shape (number of mesh points, output length). The mesh points
+        are ordered as in get_cross_product(mesh_points_grid).
+        :param mesh_points_grid: Grid definition as list of sorted 1D coordinate arrays.
+        :param evaluation_points: Points at which we want to evaluate. List of points.
+        :return: Interpolated values with shape (number of evaluation points, output length).
+        """
+        dim = len(mesh_points_grid)
+        values = np.asarray(values)
+        values = values.reshape((len(values), -1))
+        evaluation_points = np.asarray(evaluation_points, dtype=float).reshape((-1, dim))
+        num_points = len(evaluation_points)
+        lower_indices = np.empty((num_points, dim), dtype=int)
+        upper_weights = np.empty((num_points, dim))
+        strides = np.empty(dim, dtype=int)
+        stride = 1
+        refined_dims = []
+        for d in reversed(range(dim)):
+            coordinates = np.asarray(mesh_points_grid[d], dtype=float)
+            points_d = evaluation_points[:, d]
+            if np.any(points_d < coordinates[0]) or np.any(points_d > coordinates[-1]):
+                raise ValueError("One of the requested xi is out of bounds in dimension %d" % d)
+            strides[d] = stride
+            stride *= len(coordinates)
+            if len(coordinates) == 1:
+                lower_indices[:, d] = 0
+                upper_weights[:, d] = 0.0
+                continue
+            refined_dims.append(d)
+            # index of the left point of the enclosing cell; the last cell is closed on the right side
+            indices = np.searchsorted(coordinates, points_d, side='right') - 1
+            indices = np.clip(indices, 0, len(coordinates) - 2)
+            lower_indices[:, d] = indices
+            upper_weights[:, d] = (points_d - coordinates[indices]) / (coordinates[indices + 1] - coordinates[indices])
+        lower_weights = 1.0 - upper_weights
+        base_index = np.inner(lower_indices, strides)
+        interpolated_values = np.zeros((num_points, values.shape[1]))
+        # accumulate the contributions of the 2^d corners of the enclosing cells
+        for corner in get_cross_product([(0, 1)] * len(refined_dims)):
+            index = np.array(base_index)
+            weight = np.ones(num_points)
+            for d, upper in zip(refined_dims, corner):
+                if upper:
+                    index += strides[d]
+                    weight *= upper_weights[:, d]
+                else:
+                    weight *= lower_weights[:, d]
+            interpolated_values += weight[:, None] * values[index]
+        return interpolated_values
+
 
 class UncertaintyQuantification(Integration):
     # The constructor resembles Integration's constructor;
@@ -3498,9 +3829,9 @@ class UncertaintyQuantification(Integration):
     # distributions can be a list, tuple or string
     def __init__(self, f, distributions, a: Sequence[float], b: Sequence[float],
                  dim: int = None, grid=None, reference_solution=None,
-                 print_level: int = print_levels.NONE, log_level: int = log_levels.INFO):
+                 print_level: int = print_levels.NONE, log_level: int = log_levels.INFO, chunk_size: int = None):
         dim = dim or len(a)
-        super().__init__(f, grid, dim, reference_solution)
+        super().__init__(f, grid, dim, reference_solution, chunk_size=chunk_size)
         self.f_model = f
         # If distributions is not a list, it specifies the same distribution
         # for every dimension
@@ -3516,13 +3847,15 @@ class UncertaintyQuantification(Integration):
         self._prepare_distributions(distributions, a, b)
         self.f_evals = None
         self.gPCE = None
-        self.pce_polys = None
+        self.pce_basis = None
         self.log_util = LogUtility(log_level=log_level, print_level=print_level)
         self.log_util.set_print_prefix('UncertaintyQuantification')
         self.log_util.set_log_prefix('UncertaintyQuantification')
 
     def set_grid(self, grid):
         self.grid = grid
+        if self.chunk_size is not None:
+            grid.set_chunk_size(self.chunk_size)
 
     def set_reference_solution(self, reference_solution):
         self.reference_solution = reference_solution
@@ -3533,6 +3866,8 @@ class UncertaintyQuantification(Integration):
                                b: Sequence[float]):
         self.distributions = []
         self.distribution_infos = distris
+        # orthonormal polynomials of each dimension for the PCE
+        self.pce_polynomials = []
         chaospy_distributions = []
         known_distributions = dict()
         for d in range(self.dim):
@@ -3542,6 +3877,7 @@ class UncertaintyQuantification(Integration):
                 # Reuse the same distribution objects for multiple dimensions
                 d_prev = known_distributions[distr_info]
                 self.distributions.append(self.distributions[d_prev])
+                self.pce_polynomials.append(self.pce_polynomials[d_prev])
             else:
                 known_distributions[distr_info] = d
 
@@ -3550,47 +3886,46 @@ class UncertaintyQuantification(Integration):
                 distr = cp.Uniform(a[d], b[d])
                 chaospy_distributions.append(distr)
                 if not distr_known:
-                    self.distributions.append(UQDistribution.from_chaospy(distr))
+                    self.distributions.append(UQDistribution.uniform(a[d], b[d]))
+                    self.pce_polynomials.append(OrthonormalPolynomials1D.legendre(a[d], b[d]))
             elif distr_type == "Triangle":
                 midpoint = distr_info[1]
                 assert isinstance(midpoint, float), "invalid midpoint"
                 distr = cp.Triangle(a[d], midpoint, b[d])
                 chaospy_distributions.append(distr)
                 if not distr_known:
-                    self.distributions.append(UQDistribution.from_chaospy(distr))
+                    self.distributions.append(UQDistribution.triangle(a[d], midpoint, b[d]))
+                    self.pce_polynomials.append(OrthonormalPolynomials1D.stieltjes(self.distributions[d].ppf))
+            elif distr_type == "Beta":
+                alpha = distr_info[1]
+                beta = distr_info[2]
+                chaospy_distributions.append(cp.Beta(alpha, beta, lower=a[d], upper=b[d]))
+                if not distr_known:
+                    self.distributions.append(UQDistribution.beta(alpha, beta, a[d], b[d]))
+                    self.pce_polynomials.append(OrthonormalPolynomials1D.jacobi(alpha, beta, a[d], b[d]))
             elif distr_type == "Normal":
                 mu = distr_info[1]
                 sigma = distr_info[2]
-                cp_distr = cp.Normal(mu=mu, sigma=sigma)
-                chaospy_distributions.append(cp_distr)
+                chaospy_distributions.append(cp.Normal(mu=mu, sigma=sigma))
                 if not distr_known:
                     # The chaospy normal distribution does not work with big values
-                    def pdf(x, _mu=mu, _sigma=sigma):
-                        return sps.norm.pdf(x, loc=_mu, scale=_sigma)
-
-                    def cdf(x, _mu=mu, _sigma=sigma):
-                        return sps.norm.cdf(x, loc=_mu, scale=_sigma)
-
-                    def ppf(x, _mu=mu, _sigma=sigma):
-                        return sps.norm.ppf(x, loc=_mu, scale=_sigma)
-
-                    self.distributions.append(UQDistribution(pdf, cdf, ppf))
+                    self.distributions.append(UQDistribution.normal(mu, sigma))
+                    self.pce_polynomials.append(OrthonormalPolynomials1D.hermite(mu, sigma))
+            elif distr_type == "TruncatedNormal":
+                # The normal distribution truncated to [a[d], b[d]]
+                mu = distr_info[1]
+                sigma = distr_info[2]
+                chaospy_distributions.append(cp.TruncNormal(lower=a[d], upper=b[d], mu=mu, sigma=sigma))
+                if not distr_known:
+                    self.distributions.append(UQDistribution.truncated_normal(mu, sigma, a[d], b[d]))
+                    self.pce_polynomials.append(OrthonormalPolynomials1D.stieltjes(self.distributions[d].ppf))
             elif distr_type == "Laplace":
                 mu = distr_info[1]
                 scale = distr_info[2]
-                cp_distr = cp.Laplace(mu=mu, scale=scale)
-                chaospy_distributions.append(cp_distr)
+                chaospy_distributions.append(cp.Laplace(mu=mu, scale=scale))
                 if not distr_known:
-                    def pdf(x, _mu=mu, _scale=scale):
-                        return sps.laplace.pdf(x, loc=_mu, scale=_scale)
-
-                    def cdf(x, _mu=mu, _scale=scale):
-                        return sps.laplace.cdf(x, loc=_mu, scale=_scale)
-
-                    def ppf(x, _mu=mu, _scale=scale):
-                        return sps.laplace.ppf(x, loc=_mu, scale=_scale)
-
-                    self.distributions.append(UQDistribution(pdf, cdf, ppf))
+                    self.distributions.append(UQDistribution.laplace(mu, scale))
+                    self.pce_polynomials.append(OrthonormalPolynomials1D.stieltjes(self.distributions[d].ppf))
             else:
                 assert False, "Distribution not implemented: " + distr_type
         self.distributions_chaospy = chaospy_distributions
@@ -3636,44 +3971,42 @@ class UncertaintyQuantification(Integration):
             b.append(dist.ppf(1.0 - tol))
         return a, b
 
+    # Sets the orthonormal polynomial basis for the PCE. polynomial_degrees is either the maximum total degree or a
+    # list of maximum degrees for each dimension (the total degree is then bounded by the maximum of them).
     def _set_pce_polys(self, polynomial_degrees):
-        if self.pce_polys is not None and self.polynomial_degrees == polynomial_degrees:
+        if self.pce_basis is not None and self.polynomial_degrees == polynomial_degrees:
             return
         self.polynomial_degrees = polynomial_degrees
-        if not hasattr(polynomial_degrees, "__iter__"):
-            self.pce_polys, self.pce_polys_norms = cp.orth_ttr(polynomial_degrees, self.distributions_joint,
-                                                               retall=True)
-            return
-
-        # Chaospy does not support different degrees for each dimension, so
-        # the higher degree polynomials are removed afterwards
-        polys, norms = cp.orth_ttr(max(polynomial_degrees), self.distributions_joint, retall=True)
-        polys_filtered, norms_filtered = [], []
-        for i, poly in enumerate(polys):
-            max_exponents = [max(exps) for exps in poly.exponents.T]
-            if any([max_exponents[d] > deg_max for d, deg_max in enumerate(polynomial_degrees)]):
-                continue
-            polys_filtered.append(poly)
-            norms_filtered.append(norms[i])
-        self.pce_polys = cp.Poly(polys_filtered)
-        self.pce_polys_norms = norms_filtered
+        multi_indices = OrthonormalPolynomialBasis.get_multi_indices(self.dim, polynomial_degrees)
+        self.pce_basis = OrthonormalPolynomialBasis(self.pce_polynomials, multi_indices)
 
     def _scale_values(self, values):
         assert self.all_uniform, "Division by the domain volume should be used for uniform distributions only"
         div = 1.0 / np.prod([self.b[i] - v_a for i, v_a in enumerate(self.a)])
         return values * div
 
+    # Sets the nodes and weights of the combination and the function values at the nodes.
+    # Nodes which appear in multiple component grids are evaluated only once with the sum of their weights.
+    # The function values are stored in an array with shape (number of nodes, output length).
     def _set_nodes_weights_evals(self, combiinstance, scale_weights=False):
-        self.nodes, self.weights = combiinstance.get_points_and_weights()
-        assert len(self.nodes) == len(self.weights)
+        nodes, weights = combiinstance.get_points_and_weights()
+        assert len(nodes) == len(weights)
+        nodes = np.reshape(np.asarray(nodes, dtype=float), (len(weights), self.dim))
+        self.nodes, node_indices = np.unique(nodes, axis=0, return_inverse=True)
+        self.weights = np.bincount(np.ravel(node_indices), weights=np.asarray(weights, dtype=float),
+                                   minlength=len(self.nodes))
         if scale_weights:
             assert combiinstance.has_basis_grid(), "scale_weights should only be needed for basis grids"
             self.weights = self._scale_values(self.weights)
             # ~ self.f_evals = combiinstance.get_surplusses()
             # Surpluses are required here..
-            self.f_evals = [self.f_model(coord) for coord in self.nodes]
-        else:
-            self.f_evals = [self.f_model(coord) for coord in self.nodes]
+        self.f_evals = self.f_model.call_vectorized(self.nodes)
+
+    # Returns the moments E(f^k) for all k in ks with shape (len(ks), output length)
+    # using the nodes, weights and function values set by _set_nodes_weights_evals
+    def _get_moments_from_evals(self, ks: Sequence[int]) -> Sequence[Sequence[float]]:
+        powers = self.f_evals[:, np.newaxis, :] ** np.reshape(ks, (1, -1, 1))
+        return np.tensordot(self.weights, powers, axes=1)
 
     def _get_combiintegral(self, combiinstance, scale_weights=False):
         integral = self.get_result()
@@ -3688,9 +4021,12 @@ class UncertaintyQuantification(Integration):
             mom = self._get_combiintegral(combiinstance, scale_weights=scale_weights)
             assert len(mom) == self.f_model.output_length()
             return mom
+        return self.calculate_moments(combiinstance, [k])[0]
+
+    # Calculates multiple moments E(f^k) with one evaluation of the function at the nodes of the combination
+    def calculate_moments(self, combiinstance, ks: Sequence[int]) -> Sequence[Sequence[float]]:
         self._set_nodes_weights_evals(combiinstance)
-        vals = [self.f_evals[i] ** k * self.weights[i] for i in range(len(self.f_evals))]
-        return sum(vals)
+        return self._get_moments_from_evals(ks)
 
     def calculate_expectation(self, combiinstance, use_combiinstance_solution=True):
         return self.calculate_moment(combiinstance, k=1, use_combiinstance_solution=use_combiinstance_solution)
@@ -3714,20 +4050,19 @@ class UncertaintyQuantification(Integration):
             expectation = integral[:output_dim]
             expectation_of_squared = integral[output_dim:]
         else:
-            expectation = self.calculate_moment(combiinstance, k=1, use_combiinstance_solution=False)
-            expectation_of_squared = self.calculate_moment(combiinstance, k=2, use_combiinstance_solution=False)
+            expectation, expectation_of_squared = self.calculate_moments(combiinstance, [1, 2])
         return self.moments_to_expectation_variance(expectation, expectation_of_squared)
 
     def calculate_PCE(self, polynomial_degrees, combiinstance, restrict_degrees=False, use_combiinstance_solution=True,
                       scale_weights=False):
         if use_combiinstance_solution:
-            assert self.pce_polys is not None
+            assert self.pce_basis is not None
             assert not restrict_degrees
             integral = self._get_combiintegral(combiinstance, scale_weights=scale_weights)
-            num_polys = len(self.pce_polys)
+            num_polys = len(self.pce_basis)
             output_dim = len(integral) // num_polys
             coefficients = integral.reshape((num_polys, output_dim))
-            self.gPCE = np.transpose(np.sum(self.pce_polys * coefficients.T, -1))
+            self.gPCE = PolynomialChaosExpansion(self.pce_basis, coefficients)
             return
 
         self._set_nodes_weights_evals(combiinstance)
@@ -3740,20 +4075,27 @@ class UncertaintyQuantification(Integration):
             polynomial_degrees = [min(polynomial_degrees, num_points[d] // 2) for d in range(self.dim)]
 
         self._set_pce_polys(polynomial_degrees)
-        self.gPCE = cp.fit_quadrature(self.pce_polys, list(zip(*self.nodes)),
-                                      self.weights, np.asarray(self.f_evals), norms=self.pce_polys_norms)
+        # Spectral projection of the function values onto the polynomials as matrix product over the nodes
+        self.gPCE = PolynomialChaosExpansion.from_quadrature(self.pce_basis, self.nodes, self.weights, self.f_evals)
 
+    # returns the PolynomialChaosExpansion; use its to_chaospy method to obtain a chaospy polynomial
     def get_gPCE(self):
         return self.gPCE
 
+    # The statistics are calculated directly from the coefficients of the orthonormal basis;
+    # a chaospy polynomial assigned to gPCE is still supported
     def get_expectation_PCE(self):
         if self.gPCE is None:
             assert False, "calculatePCE must be invoked before this method"
+        if isinstance(self.gPCE, PolynomialChaosExpansion):
+            return self.gPCE.get_expectation()
         return cp.E(self.gPCE, self.distributions_joint)
 
     def get_variance_PCE(self):
         if self.gPCE is None:
             assert False, "calculatePCE must be invoked before this method"
+        if isinstance(self.gPCE, PolynomialChaosExpansion):
+            return self.gPCE.get_variance()
         return cp.Var(self.gPCE, self.distributions_joint)
 
     def get_expectation_and_variance_PCE(self):
@@ -3762,16 +4104,25 @@ class UncertaintyQuantification(Integration):
     def get_Percentile_PCE(self, q: float, sample: int = 10000):
         if self.gPCE is None:
             assert False, "calculatePCE must be invoked before this method"
+        if isinstance(self.gPCE, PolynomialChaosExpansion):
+            # Sample the distributions by inverse transform sampling and evaluate the expansion on all samples at once
+            samples = np.random.random((sample, self.dim))
+            points = np.array([evaluate_ppf(self.distributions[d].ppf, samples[:, d]) for d in range(self.dim)]).T
+            return np.percentile(self.gPCE(points), q, axis=0)
         return cp.Perc(self.gPCE, q, self.distributions_joint, sample)
 
     def get_first_order_sobol_indices(self):
         if self.gPCE is None:
             assert False, "calculatePCE must be invoked before this method"
+        if isinstance(self.gPCE, PolynomialChaosExpansion):
+            return self.gPCE.get_first_order_sobol_indices()
         return cp.Sens_m(self.gPCE, self.distributions_joint)
 
     def get_total_order_sobol_indices(self):
         if self.gPCE is None:
             assert False, "calculatePCE must be invoked before this method"
+        if isinstance(self.gPCE, PolynomialChaosExpansion):
+            return self.gPCE.get_total_order_sobol_indices()
         return cp.Sens_t(self.gPCE, self.distributions_joint)
 
     # Returns a Function which can be passed to performSpatiallyAdaptiv
@@ -3806,7 +4157,7 @@ class UncertaintyQuantification(Integration):
         # ~ polys = self.pce_polys
         # ~ funcs = [(lambda coords: f(coords) * polys[i](coords)) for i in range(len(polys))]
         # ~ return FunctionCustom(funcs)
-        return FunctionPolysPCE(self.f, self.pce_polys, self.pce_polys_norms)
+        return FunctionPolysPCE(self.f, self.pce_basis)
 
     def set_PCE_Function(self, polynomial_degrees):
         self.update_function(self.get_PCE_Function(polynomial_degrees))
@@ -3834,8 +4185,8 @@ class UncertaintyQuantificationTesting(UncertaintyQuantification):
         self._set_pce_polys(polynomial_degrees)
         nodes, weights = cp.generate_quadrature(num_quad_points,
                                                 self.distributions_joint, rule="G")
-        f_evals = [self.f(c) for c in zip(*nodes)]
-        self.gPCE = cp.fit_quadrature(self.pce_polys, nodes, weights, np.asarray(f_evals), norms=self.pce_polys_norms)
+        f_evals = self.f.call_vectorized(np.transpose(nodes))
+        self.gPCE = PolynomialChaosExpansion.from_quadrature(self.pce_basis, np.transpose(nodes), weights, f_evals)
 
     def calculate_expectation_and_variance_for_weights(self, nodes, weights):
         f_evals = np.array([self.f(c) for c in zip(*nodes)])
@@ -3914,39 +4265,155 @@ from scipy import integrate
 
 
 class UQDistribution:
-    def __init__(self, pdf, cdf, ppf, log_level: int = log_levels.WARNING, print_level: int = print_levels.NONE):
+    # first_moment_cdf is the vectorized partial first moment x -> integral of t * pdf(t) from -inf to x; if it is
+    # given, the moments of intervals are calculated in closed form, otherwise numerically. breakpoints are the points
+    # where the pdf is not smooth (e.g. the peak of a triangle distribution); if they are known, integrals are
+    # calculated with a composite Gauss-Legendre rule instead of adaptive quadrature. Distributions with unbounded
+    # support leave them unset because a fixed rule cannot resolve the pdf on wide intervals.
+    def __init__(self, pdf, cdf, ppf, log_level: int = log_levels.WARNING, print_level: int = print_levels.NONE,
+                 first_moment_cdf=None, breakpoints: Sequence[float]=None, cache_size: int=1024,
+                 interval_cache_size: int=65536):
         self.pdf = pdf
         self.cdf = cdf
         self.ppf = ppf
-        self.cached_moments = [dict() for _ in range(2)]
+        self.first_moment_cdf = first_moment_cdf
+        self.breakpoints = breakpoints
+        # The distribution objects are shared by all dimensions with the same distribution, so this cache is shared
+        # by them as well; it is bounded since the grids change in every refinement step
+        self.cached_moments = OrderedDict()
+        self.cache_size = cache_size
+        # first moments of single intervals if they are calculated numerically; this cache is bounded in the same way
+        # but holds more entries since a single grid has many intervals
+        self.cached_interval_moments = OrderedDict()
+        self.interval_cache_size = interval_cache_size
         self.cache_gauss_quad = dict()
         self.log_util = LogUtility(log_level=log_level, print_level=print_level)
         self.log_util.set_print_prefix('UQDistribution')
         self.log_util.set_log_prefix('UQDistribution')
-        # ~ self.cache_integrals = dict()
 
     @staticmethod
     def from_chaospy(cp_distr):
         # The inverse Rosenblatt transformation is the inverse cdf here
-        return UQDistribution(cp_distr.pdf, cp_distr.cdf,
-                              lambda x: float(cp_distr.inv(x)))
+        def ppf(x):
+            points = cp_distr.inv(np.asarray(x, dtype=float))
+            return float(points) if np.ndim(x) == 0 else np.reshape(points, np.shape(x))
+        return UQDistribution(cp_distr.pdf, cp_distr.cdf, ppf)
+
+    @staticmethod
+    def uniform(lower: float, upper: float):
+        distr = sps.uniform(loc=lower, scale=upper - lower)
+
+        def first_moment_cdf(x):
+            x = np.clip(x, lower, upper)
+            return (x ** 2 - lower ** 2) / (2 * (upper - lower))
+        return UQDistribution(distr.pdf, distr.cdf, distr.ppf, first_moment_cdf=first_moment_cdf,
+                              breakpoints=[lower, upper])
+
+    @staticmethod
+    def triangle(lower: float, midpoint: float, upper: float):
+        distr = sps.triang((midpoint - lower) / (upper - lower), loc=lower, scale=upper - lower)
+        mean = (lower + midpoint + upper) / 3
+
+        def first_moment_cdf(x):
+            x = np.clip(np.asarray(x, dtype=float), lower, upper)
+            # the integrals from lower to x on the increasing part and from x to upper on the decreasing part
+            left = (x - lower) ** 2 * (2 * x + lower) / (3 * (upper - lower) * (midpoint - lower)) \
+                if midpoint > lower else 0.0
+            right = (upper - x) ** 2 * (upper + 2 * x) / (3 * (upper - lower) * (upper - midpoint)) \
+                if upper > midpoint else 0.0
+            return np.where(x < midpoint, left, mean - right)
+        return UQDistribution(distr.pdf, distr.cdf, distr.ppf, first_moment_cdf=first_moment_cdf,
+                              breakpoints=[lower, midpoint, upper])
+
+    @staticmethod
+    def normal(mu: float, sigma: float):
+        distr = sps.norm(loc=mu, scale=sigma)
+
+        def first_moment_cdf(x):
+            z = (np.asarray(x, dtype=float) - mu) / sigma
+            return mu * sps.norm.cdf(z) - sigma * sps.norm.pdf(z)
+        return UQDistribution(distr.pdf, distr.cdf, distr.ppf, first_moment_cdf=first_moment_cdf)
+
+    # The normal distribution truncated to [lower, upper]
+    @staticmethod
+    def truncated_normal(mu: float, sigma: float, lower: float, upper: float):
+        z_lower = (lower - mu) / sigma
+        z_upper = (upper - mu) / sigma
+        distr = sps.truncnorm(z_lower, z_upper, loc=mu, scale=sigma)
+        normalization = sps.norm.cdf(z_upper) - sps.norm.cdf(z_lower)
+
+        def first_moment_cdf(x):
+            z = (np.clip(x, lower, upper) - mu) / sigma
+            return (mu * (sps.norm.cdf(z) - sps.norm.cdf(z_lower)) -
+                    sigma * (sps.norm.pdf(z) - sps.norm.pdf(z_lower))) / normalization
+        return UQDistribution(distr.pdf, distr.cdf, distr.ppf, first_moment_cdf=first_moment_cdf,
+                              breakpoints=[lower, upper])
+
+    @staticmethod
+    def laplace(mu: float, scale: float):
+        distr = sps.laplace(loc=mu, scale=scale)
+
+        def first_moment_cdf(x):
+            # Clipping avoids inf * 0 for infinite x; exp(-800) is zero in double precision
+            t = np.clip((np.asarray(x, dtype=float) - mu) / scale, -800, 800)
+            return np.where(t < 0, 0.5 * (mu + scale * (t - 1)) * np.exp(np.minimum(t, 0)),
+                            mu - 0.5 * (mu + scale * (t + 1)) * np.exp(-np.maximum(t, 0)))
+        return UQDistribution(distr.pdf, distr.cdf, distr.ppf, first_moment_cdf=first_moment_cdf)
+
+    # The Beta distribution scaled to [lower, upper]; the pdf may have singularities at the boundaries, so integrals
+    # are still calculated with adaptive quadrature
+    @staticmethod
+    def beta(alpha: float, beta: float, lower: float, upper: float):
+        distr = sps.beta(alpha, beta, loc=lower, scale=upper - lower)
+
+        def first_moment_cdf(x):
+            t = (np.clip(x, lower, upper) - lower) / (upper - lower)
+            return lower * scipy.special.betainc(alpha, beta, t) + \
+                (upper - lower) * alpha / (alpha + beta) * scipy.special.betainc(alpha + 1, beta, t)
+        return UQDistribution(distr.pdf, distr.cdf, distr.ppf, first_moment_cdf=first_moment_cdf)
+
+    # Returns the zeroth and first moments of the intervals between consecutive points. The closed-form results are
+    # cached for the whole array of points; the numerically integrated first moments are cached for each interval, so
+    # that only the new intervals of a refined grid are integrated.
+    def get_interval_moments(self, points: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        if self.first_moment_cdf is None:
+            return self._get_interval_moments_quad(points)
+        cache = self.cached_moments
+        key = tuple(points)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        points = np.asarray(points, dtype=float)
+        moments_0 = np.diff(np.asarray(self.cdf(points), dtype=float))
+        moments_1 = np.diff(self.first_moment_cdf(points))
+        cache[key] = (moments_0, moments_1)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return moments_0, moments_1
+
+    def _get_interval_moments_quad(self, points: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        cache = self.cached_interval_moments
+        points = np.asarray(points, dtype=float)
+        moments_0 = np.diff(np.asarray(self.cdf(points), dtype=float))
+        moments_1 = np.empty(len(moments_0))
+        for i, (x1, x2) in enumerate(zip(points[:-1], points[1:])):
+            key = (x1, x2)
+            if key in cache:
+                cache.move_to_end(key)
+                moment_1 = cache[key]
+            else:
+                moment_1 = integrate.quad(lambda x: x * self.pdf(x), x1, x2, epsrel=10 ** -2, epsabs=np.inf)[0]
+                cache[key] = moment_1
+                if len(cache) > self.interval_cache_size:
+                    cache.popitem(last=False)
+            moments_1[i] = moment_1
+        return moments_0, moments_1
 
     def get_zeroth_moment(self, x1: float, x2: float):
-        cache = self.cached_moments[0]
-        if (x1, x2) in cache:
-            return cache[(x1, x2)]
-        moment_0 = self.cdf(x2) - self.cdf(x1)
-        cache[(x1, x2)] = moment_0
-        return moment_0
+        return self.get_interval_moments((x1, x2))[0][0]
 
     def get_first_moment(self, x1: float, x2: float):
-        cache = self.cached_moments[1]
-        if (x1, x2) in cache:
-            return cache[(x1, x2)]
-        moment_1 = integrate.quad(lambda x: x * self.pdf(x), x1, x2,
-                                  epsrel=10 ** -2, epsabs=np.inf)[0]
-        cache[(x1, x2)] = moment_1
-        return moment_1
+        return self.get_interval_moments((x1, x2))[1][0]
 
     # Returns single-dimensional quadrature points and weights
     # for the high order grid
@@ -3960,12 +4427,26 @@ class UQDistribution:
 
     # Calculates the weighted integral of an arbitrary function
     # between x1 and x2
-    def calculate_integral(self, func, x1: float, x2: float):
-        # ~ k = (func, x1, x2)
-        # ~ cache = self.cache_integrals
-        # ~ if k in cache:
-        # ~ print("Cache match")
-        # ~ return cache[k]
-        integral = integrate.quad(lambda x: func(x) * self.pdf(x), x1, x2)[0]
-        # ~ cache[k] = integral
-        return integral
+    def calculate_integral(self, func, x1: float, x2: float, num_quad_points: int=20, tol: float=10 ** -12):
+        if self.breakpoints is None or isinf(x1) or isinf(x2):
+            return integrate.quad(lambda x: func(x) * self.pdf(x), x1, x2)[0]
+        # Apply Gauss-Legendre rules with num_quad_points and twice as many points to each interval where the pdf is
+        # smooth; if they do not agree, the pdf is not resolved well enough and adaptive quadrature is used instead
+        borders = np.unique([x1, x2] + [x for x in self.breakpoints if x1 < x < x2])
+        integrals = [self._calculate_integral_gauss(func, borders, n) for n in (num_quad_points, 2 * num_quad_points)]
+        if abs(integrals[1] - integrals[0]) > tol * max(1.0, abs(integrals[1])):
+            return integrate.quad(lambda x: func(x) * self.pdf(x), x1, x2)[0]
+        return integrals[1]
+
+    # Applies a composite Gauss-Legendre rule with num_quad_points per interval between the borders and evaluates all
+    # points at once
+    def _calculate_integral_gauss(self, func, borders: np.ndarray, num_quad_points: int) -> float:
+        coords_gauss, weights_gauss = np.polynomial.legendre.leggauss(num_quad_points)
+        half_width = 0.5 * np.diff(borders)
+        coords = ((coords_gauss[None, :] + 1) * half_width[:, None] + borders[:-1, None]).ravel()
+        weights = (weights_gauss[None, :] * half_width[:, None]).ravel()
+        if hasattr(func, "evaluate_points"):
+            func_evals = func.evaluate_points(coords)
+        else:
+            func_evals = np.array([func(x) for x in coords], dtype=float)
+        return float(np.inner(func_evals * self.pdf(coords), weights))
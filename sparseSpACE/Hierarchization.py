@@ -3,11 +3,15 @@ from sparseSpACE.Utils import *
 from sparseSpACE import Grid
 from typing import Tuple, Sequence, Callable
 from sparseSpACE.Function import *
-from scipy.linalg import solve_triangular
+from scipy.linalg import solve_triangular, lu_factor, lu_solve
+from collections import OrderedDict
 
 class HierarchizationLSG(object):
-    def __init__(self, grid):
+    def __init__(self, grid, factorization_cache_size: int = 64):
         self.grid = grid
+        # LRU cache of the factorized 1D basis matrices
+        self.factorization_cache = OrderedDict()
+        self.factorization_cache_size = factorization_cache_size
 
     def __call__(self, grid_values: Sequence[Sequence[float]], numPoints: Sequence[int], grid: Grid) -> Sequence[Sequence[float]]:
         self.grid = grid
@@ -19,67 +23,70 @@ class HierarchizationLSG(object):
         return grid_values
 
     # this function applies a one dimensional hierarchization (in dimension d) to the array grid_values with
-    # numPoints (array) many points for each dimension
+    # numPoints (array) many points for each dimension. All poles in dimension d and all output components are
+    # collected as columns of one right-hand side matrix and solved at once with the factorized 1D basis matrix.
     def hierarchize_poles_for_dim(self, grid_values: Sequence[Sequence[float]], numPoints: Sequence[int], d: int) -> Sequence[Sequence[float]]:
         if numPoints[d] == 1:
             assert math.isclose(self.grid.get_basis(d, 0)(self.grid.get_coordinates_dim(d)[0]), 1.0)
             return grid_values
         self.dim = len(numPoints)
-        offsets = np.array([int(np.prod(numPoints[d+1:])) for d in range(self.dim)])
-        numPoints_slice = np.array(numPoints)
-        numPoints_slice[d] = 1
         value_length = np.shape(grid_values)[0]
-        # create all indeces in d-1 dimensional slice
-        point_indeces = get_cross_product_range(numPoints_slice)
-        # in the first dimension we need to fill it with the actual function values
-
-        # create and fill matrix for linear system of equations
-        # evaluate all basis functions at all grid points
-        matrix = np.empty((numPoints[d], numPoints[d]))
-        for i in range(numPoints[d]):
-            for j in range(numPoints[d]):
-                matrix[i, j] = self.grid.get_basis(d, j)(self.grid.get_coordinates_dim(d)[i])
-        if numPoints[d] >= 15:
-            Q, R = np.linalg.qr(matrix)
-        #M_inv = np.linalg.inv(matrix)
+        # move the axis of dimension d to the front so that every column contains the values of one pole
+        poles = np.moveaxis(np.reshape(grid_values, (value_length, *numPoints)), d + 1, 0)
+        poles_shape = poles.shape
+        right_hand_side = poles.reshape((numPoints[d], -1))
+        hierarchized_values = self.solve_basis_system(d, right_hand_side)
+        # use previous surplusses for every consecutive dimension (unidirectional principle)
+        grid_values[:] = np.moveaxis(hierarchized_values.reshape(poles_shape), 0, d + 1).reshape((value_length, -1))
+        return grid_values
 
-        pole_coordinates_base = np.empty(numPoints[d], dtype=int)
-        for i in range(numPoints[d]):
-            pole_index = np.zeros(self.dim, dtype=int)
-            pole_index[d] = i
-            pole_coordinates_base[i] = self.get_1D_coordinate(pole_index, offsets)
+    # this function solves the linear system of the 1D basis matrix in dimension d for all columns of right_hand_side
+    def solve_basis_system(self, d: int, right_hand_side: Sequence[Sequence[float]]) -> Sequence[Sequence[float]]:
+        method, factorization = self.get_factorized_basis_matrix(d)
+        if method == 'qr':
+            Q, R = factorization
+            return solve_triangular(R, np.dot(Q.T, right_hand_side), check_finite=False)
+        else:
+            return lu_solve(factorization, right_hand_side, check_finite=False)
 
-        # iterate over all indeces in slice (0 at dimension d)
-        for point_index in point_indeces:
-            # create array of function values through pole
-            pole_values = np.zeros((value_length, numPoints[d]))
-            #print(pole_coordinates_base)
-            pole_coordinates = pole_coordinates_base + int(self.get_1D_coordinate(np.asarray(point_index), offsets))
-            #print(pole_coordinates)
-            # fill pole_values with function or surplus values of pole through current index
-            for i in range(numPoints[d]):
-                # use previous surplusses for every consecutive dimension (unidirectional principle)
-                pole_values[:, i] = grid_values[:, pole_coordinates[i]]
+    # this function returns the factorization of the matrix that contains the values of all 1D basis functions in
+    # dimension d (columns) at all 1D grid points (rows). The factorizations are cached; the entries are identified by
+    # the parameters that determine the basis functions (see get_basis_key).
+    def get_factorized_basis_matrix(self, d: int) -> Tuple[str, Tuple]:
+        coordinates = np.asarray(self.grid.get_coordinates_dim(d), dtype=float)
+        key = self.get_basis_key(d, coordinates)
+        if key in self.factorization_cache:
+            self.factorization_cache.move_to_end(key)
+            return self.factorization_cache[key]
+        basis = [self.grid.get_basis(d, j) for j in range(len(coordinates))]
+        # evaluate all basis functions at all grid points
+        matrix = np.column_stack([basis_function.evaluate_points(coordinates) for basis_function in basis])
+        # QR is used for larger matrices as it is more stable for the possibly ill-conditioned basis matrices
+        if len(coordinates) >= 15:
+            factorization = ('qr', np.linalg.qr(matrix))
+        else:
+            factorization = ('lu', lu_factor(matrix, check_finite=False))
+        self.factorization_cache[key] = factorization
+        if len(self.factorization_cache) > self.factorization_cache_size:
+            self.factorization_cache.popitem(last=False)
+        return factorization
 
-            # solve system of linear equations for all components of our function values (typically scalar -> output.length = 1)
-            # if the function outputs vectors then we have to iterate over all components individually
-            # toDo replace by LU factorization to save time
-            #(matrix, self.grid.get_coordinates_dim(d), d)
-            for n in range(value_length):
-                #hierarchized_values = np.linalg.solve(matrix, pole_values[n,:])
-                #print(hierarchized_values)
-                if numPoints[d] >= 15:
-                    hierarchized_values = solve_triangular(R, np.inner(Q.T, pole_values[n, :]), check_finite=False)
-                else:
-                    hierarchized_values = np.linalg.solve(matrix, pole_values[n, :])
-                #hierarchized_values = (np.inner(M_inv, pole_values[n,:]))
-                #print(hierarchized_values - hierarchized_values2)
-                #if (np.sum(hierarchized_values - hierarchized_values2) > 10**-7):
-                #    print(hierarchized_values, hierarchized_values2)
-                for i in range(numPoints[d]):
-                    #pole_index = point_index[:d] + (i,) + point_index[d+1:]
-                    grid_values[n,pole_coordinates[i]] = hierarchized_values[i]
-        return grid_values
+    # this function returns the cache key of the 1D basis in dimension d: the grid type, the spline degree, the
+    # boundary treatment and the coordinates together with the levels of the points of global grids or the level and
+    # the area of local grids. Weighted grids add the distribution since it determines the midpoints of the knots.
+    def get_basis_key(self, d: int, coordinates: Sequence[float]) -> Tuple:
+        grid = self.grid
+        key = (type(grid), getattr(grid, 'p', None), getattr(grid, 'modified_basis', False), grid.boundary,
+               getattr(grid, 'chebyshev', False), coordinates.tobytes())
+        if grid.is_global():
+            key += (grid.a[d], grid.b[d], np.asarray(grid.coordinate_array_with_boundary[d], dtype=float).tobytes(),
+                    np.asarray(grid.levels[d], dtype=int).tobytes())
+        else:
+            grid_1d = grid.grids[d]
+            key += (grid_1d.a, grid_1d.b, grid_1d.level, grid_1d.start, grid_1d.end)
+        if hasattr(grid, 'distributions'):
+            key += (grid.distributions[d],)
+        return key
 
     # this function maps the d-dimensional index to a one-dimensional array index
     def get_1D_coordinate(self, index_vector: Sequence[int], offsets: Sequence[int]) -> int:
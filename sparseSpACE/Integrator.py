@@ -1,11 +1,18 @@
 import abc
+import math
+import warnings
 from scipy.interpolate import interpn
+from scipy.stats import qmc
 from sparseSpACE.Hierarchization import *
-from typing import Callable, Tuple, Sequence
+from typing import Callable, Tuple, Sequence, List
 
 # This is the abstract interface of an integrator that integrates a given area specified by start for function f
 # using numPoints many points per dimension
 class IntegratorBase(object):
+    # indicates whether the integrator honours the chunk_size of the grid, i.e. whether its peak memory is independent
+    # of the number of grid points
+    supports_chunking = False
+
     @abc.abstractmethod
     def __call__(self, f: Callable[[Tuple[int, ...]], float], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
         pass
@@ -85,12 +92,18 @@ class IntegratorGenerateGridTrapezoidal(IntegratorBase):
 
 
 # This integrator computes the integral of an arbitrary grid from the Grid class
-# using the predefined interfaces and weights. The grid is not explicitly constructed.
+# using the predefined interfaces and weights. The grid is not explicitly constructed. If the grid has a chunk_size, the
+# points are evaluated in batches of at most chunk_size points instead of one by one.
 class IntegratorArbitraryGrid(IntegratorBase):
+    supports_chunking = True
+
     def __init__(self, grid):
         self.grid = grid
 
     def __call__(self, f: Callable[[Tuple[float, ...]], float], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        chunk_size = self.grid.chunk_size
+        if chunk_size is not None and isinstance(f, Function):
+            return self.integrate_chunked(f, numPoints, chunk_size)
         dim = len(start)
         offsets = np.ones(dim, dtype=np.int64)
         gridsize = np.int64(1)
@@ -116,6 +129,27 @@ class IntegratorArbitraryGrid(IntegratorBase):
         position = self.grid.getCoordinate(indexvector)
         return f(position) * weight
 
+    def integrate_chunked(self, f: Function, numPoints: Sequence[int], chunk_size: int) -> Sequence[float]:
+        """This method evaluates the points with non-zero weight in batches of at most chunk_size points and
+        accumulates the weighted sum. The chunks are evaluated with call_read_only, so the function values are not
+        stored in the function dictionary.
+
+        :param f: Function that is integrated.
+        :param numPoints: Number of points per dimension.
+        :param chunk_size: Maximum number of points per chunk.
+        :return: Weighted sum for each output component.
+        """
+        result = 0.0
+        for _, _, indices in get_cross_product_index_chunks([int(n) for n in numPoints], chunk_size):
+            indexvectors = np.column_stack(indices)
+            weights = np.array([self.grid.getWeight(indexvector) for indexvector in indexvectors])
+            nonzero = weights != 0
+            if not np.any(nonzero):
+                continue
+            points = np.array([self.grid.getCoordinate(indexvector) for indexvector in indexvectors[nonzero]])
+            result = result + np.dot(weights[nonzero], f.call_read_only(points))
+        return result
+
 
 # This integrator computes the integral of an arbitrary grid from the Grid class
 # using the predefined interfaces and weights. The grid is explicitly constructed and efficiently evaluated using numpy.
@@ -136,6 +170,200 @@ class IntegratorArbitraryGridScalarProduct(IntegratorBase):
         else:
             return np.inner(f_values.T, weights)
 
+
+# This integrator computes the integral of a tensor product grid (Grid or GlobalGrid) without creating lists of points
+# and weights. The points are constructed as a (N, d) numpy array from the 1D coordinates by broadcasting and the
+# function values are contracted with the 1D weight vectors dimension by dimension instead of forming the product
+# weights of all N points.
+class IntegratorTensorProduct(IntegratorBase):
+    supports_chunking = True
+
+    def __init__(self, grid):
+        self.grid = grid #type: Grid
+
+    def __call__(self, f: Function, numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        coordinates = [np.asarray(coordinates_1D, dtype=float) for coordinates_1D in self.grid.coordinate_array]
+        weights = [np.asarray(weights_1D, dtype=float) for weights_1D in self.grid.weights]
+        if any(len(coordinates_1D) == 0 for coordinates_1D in coordinates):
+            return 0.0
+        chunk_size = self.grid.chunk_size
+        if chunk_size is not None and np.prod([len(coordinates_1D) for coordinates_1D in coordinates]) > chunk_size:
+            return self.integrate_chunked(f, coordinates, weights, chunk_size)
+        f_values = np.asarray(f(get_cross_product_numpy_array(coordinates)))
+        return self.contract_weights(f_values, weights)
+
+    @staticmethod
+    def integrate_chunked(f: Function, coordinates: Sequence[Sequence[float]], weights: Sequence[Sequence[float]],
+                          chunk_size: int) -> Sequence[float]:
+        """This method walks through the tensor product grid in chunks of at most chunk_size points, evaluates f for
+        each chunk and accumulates the weighted sum. Only one chunk of points, weights and values is stored at once;
+        the chunks are evaluated with call_read_only, so the function values are not stored in the function dictionary.
+
+        :param f: Function that is integrated.
+        :param coordinates: 1D coordinates for each dimension.
+        :param weights: 1D quadrature weights for each dimension.
+        :param chunk_size: Maximum number of points per chunk.
+        :return: Weighted sum for each output component.
+        """
+        result = 0.0
+        for _, _, indices in get_cross_product_index_chunks([len(coordinates_1D) for coordinates_1D in coordinates],
+                                                             chunk_size):
+            points = np.column_stack([coordinates[d][indices[d]] for d in range(len(coordinates))])
+            chunk_weights = np.prod([weights[d][indices[d]] for d in range(len(weights))], axis=0)
+            result = result + np.dot(chunk_weights, f.call_read_only(points))
+        return result
+
+    @staticmethod
+    def contract_weights(f_values: Sequence[Sequence[float]], weights: Sequence[Sequence[float]]) -> Sequence[float]:
+        """This method computes the weighted sum of the function values of a tensor product grid.
+
+        :param f_values: Function values (number of points x output length) in the order of get_cross_product.
+        :param weights: 1D quadrature weights for each dimension.
+        :return: Weighted sum for each output component.
+        """
+        tensor = np.reshape(f_values, [len(weights_1D) for weights_1D in weights] + [-1])
+        # the first remaining axis always belongs to the next dimension
+        for weights_1D in weights:
+            tensor = np.tensordot(weights_1D, tensor, axes=(0, 0))
+        return tensor
+
+# This integrator computes the integral with (quasi) Monte Carlo sampling. The samples are drawn in batches from a numpy
+# Generator ('random') or from scrambled Sobol or Halton sequences ('sobol', 'halton') and are evaluated in chunks with
+# Function.eval_vectorized, so the function values are not stored in the function dictionary. The number of samples is
+# the product of numPoints. If distributions (objects with a cdf and ppf, e.g. UQDistribution) are given, the uniform
+# samples are mapped through the ppfs of the distributions truncated to [start, end] and the integrator computes the
+# integral of f weighted with the pdfs; otherwise the samples are uniformly distributed in [start, end].
+# The estimate is the mean of num_randomizations independent sample streams (independent scramblings for QMC). After
+# each chunk the variance and the error estimate are updated and the sampling stops early if the error estimate of all
+# output components is below tolerance.
+class IntegratorMonteCarlo(IntegratorBase):
+    def __init__(self, sampling: str='random', seed: int=None, chunk_size: int=2**12, tolerance: float=None,
+                 distributions: Sequence=None, num_randomizations: int=None):
+        assert sampling in ['random', 'sobol', 'halton']
+        self.sampling = sampling
+        self.rng = np.random.default_rng(seed)
+        self.chunk_size = chunk_size
+        self.tolerance = tolerance
+        self.distributions = distributions
+        # for QMC the sample variance overestimates the error, so the error is estimated from independent scramblings
+        if num_randomizations is None:
+            num_randomizations = 1 if sampling == 'random' else 8
+        assert num_randomizations >= 1
+        self.num_randomizations = num_randomizations
+        # statistics of the last integration
+        self.num_samples = 0
+        self.mean = None
+        self.variance = None
+        self.error_estimate = None
+
+    def __call__(self, f: Function, numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        dim = len(start)
+        num_samples_total = max(int(np.prod(numPoints)), 1)
+        num_streams = min(self.num_randomizations, num_samples_total)
+        # the samples are split across the streams like np.array_split so that their total is the product of numPoints
+        num_samples_streams = np.full(num_streams, num_samples_total // num_streams)
+        num_samples_streams[:num_samples_total % num_streams] += 1
+        samplers = self.get_samplers(dim, num_streams)
+        means = np.zeros((num_streams, 0))
+        m2 = np.zeros((num_streams, 0))
+        num_samples = np.zeros(num_streams, dtype=int)
+        while np.any(num_samples < num_samples_streams):
+            chunk_sizes = np.minimum(self.chunk_size, num_samples_streams - num_samples)
+            samples = np.concatenate([self.draw_samples(sampler, chunk_size, dim)
+                                      for sampler, chunk_size in zip(samplers, chunk_sizes) if chunk_size > 0])
+            points, factor = self.transform_samples(samples, start, end)
+            values = self.evaluate(f, points)
+            if means.shape[1] == 0:
+                means = np.zeros((num_streams, values.shape[1]))
+                m2 = np.zeros((num_streams, values.shape[1]))
+            offset = 0
+            for i, chunk_size in enumerate(chunk_sizes):
+                if chunk_size == 0:
+                    continue
+                values_stream = values[offset:offset + chunk_size]
+                offset += chunk_size
+                chunk_mean = np.mean(values_stream, axis=0)
+                chunk_m2 = np.sum((values_stream - chunk_mean) ** 2, axis=0)
+                # combine the running mean and sum of squared deviations with the ones of the chunk (Chan et al.)
+                delta = chunk_mean - means[i]
+                total = num_samples[i] + chunk_size
+                means[i] = means[i] + delta * chunk_size / total
+                m2[i] = m2[i] + chunk_m2 + delta ** 2 * num_samples[i] * chunk_size / total
+            num_samples += chunk_sizes
+            self.update_statistics(means, m2, num_samples, factor)
+            if self.tolerance is not None and np.min(num_samples) > 1 and np.all(self.error_estimate <= self.tolerance):
+                break
+        # mean of the integrand values without the volume factor (the streams are weighted with their sample numbers)
+        self.mean = np.dot(num_samples, means) / np.sum(num_samples)
+        return factor * self.mean
+
+    def update_statistics(self, means: np.ndarray, m2: np.ndarray, num_samples: np.ndarray, factor: float) -> None:
+        """This method updates the number of samples, the variance of the integrand and the error estimate.
+
+        :param means: Running means of each sample stream (num_randomizations x output length).
+        :param m2: Running sums of squared deviations of each sample stream.
+        :param num_samples: Number of samples of each stream.
+        :param factor: Volume of the domain (or probability mass of the truncated distributions).
+        :return: None
+        """
+        num_streams = len(means)
+        self.num_samples = int(np.sum(num_samples))
+        if np.min(num_samples) > 1:
+            # pooled variance of the streams
+            self.variance = factor ** 2 * np.sum(m2, axis=0) / (self.num_samples - num_streams)
+        else:
+            self.variance = np.full(np.shape(means)[1], np.inf)
+        if num_streams > 1:
+            self.error_estimate = abs(factor) * np.std(means, axis=0, ddof=1) / math.sqrt(num_streams)
+        else:
+            self.error_estimate = np.sqrt(self.variance / self.num_samples)
+
+    def get_samplers(self, dim: int, num_streams: int) -> List:
+        if self.sampling == 'random':
+            return [self.rng for _ in range(num_streams)]
+        engine = qmc.Sobol if self.sampling == 'sobol' else qmc.Halton
+        # every stream gets its own scrambling
+        return [engine(d=dim, scramble=True, seed=self.rng) for _ in range(num_streams)]
+
+    @staticmethod
+    def draw_samples(sampler, num_samples: int, dim: int) -> np.ndarray:
+        if isinstance(sampler, np.random.Generator):
+            return sampler.random((num_samples, dim))
+        with warnings.catch_warnings():
+            # chunks of Sobol points are consecutive parts of one sequence so the balance warning does not apply
+            warnings.simplefilter("ignore", UserWarning)
+            return sampler.random(num_samples)
+
+    def transform_samples(self, samples: np.ndarray, start: Sequence[float], end: Sequence[float]) -> Tuple[np.ndarray, float]:
+        """This method maps uniform samples in [0,1]^d to the integration domain.
+
+        :param samples: Uniform samples (number of samples x dim).
+        :param start: Lower bounds of the domain.
+        :param end: Upper bounds of the domain.
+        :return: Transformed samples and factor with which the sample mean has to be scaled.
+        """
+        start = np.asarray(start, dtype=float)
+        end = np.asarray(end, dtype=float)
+        if self.distributions is None:
+            return start + samples * (end - start), float(np.prod(end - start))
+        points = np.empty_like(samples)
+        factor = 1.0
+        for d, distribution in enumerate(self.distributions):
+            # samples are restricted to [start, end] by mapping them to the corresponding range of the cdf
+            lower = float(distribution.cdf(start[d]))
+            upper = float(distribution.cdf(end[d]))
+            points[:, d] = evaluate_ppf(distribution.ppf, lower + samples[:, d] * (upper - lower))
+            factor *= upper - lower
+        return points, factor
+
+    @staticmethod
+    def evaluate(f, points: np.ndarray) -> np.ndarray:
+        if isinstance(f, Function):
+            values = f.eval_vectorized(points)
+        else:
+            values = [f(point) for point in points]
+        return np.reshape(values, (len(points), -1))
+
 '''
 #This integrator computes the integral of an arbitrary grid from the Grid class
 #using the predefined interfaces and weights. The grid is not explicitly constructed.
@@ -258,10 +486,11 @@ class IntegratorHierarchicalBasisFunctions(IntegratorBase):
         output_dim = f.output_length()
         grid_values = np.empty((output_dim, np.prod(numPoints)))
         points = self.grid.getPoints()
-        for i, point in enumerate(points):
-            v = f(point)
-            assert len(v) == output_dim, "The Function returned a wrong output length"
-            grid_values[:, i] = v
+        if len(points) > 0:
+            # evaluate all points in one batch
+            f_values = np.asarray(f(points))
+            assert np.shape(f_values) == (len(points), output_dim), "The Function returned a wrong output length"
+            grid_values[:, :] = f_values.T
         self.surplus_values = self.hierarchization(grid_values, numPoints, self.grid)
         weights = self.grid.get_weights()
         #print(sum(weights), np.prod(np.array(end) - np.array(start)), start,end, weights, self.grid.weights)
@@ -1,12 +1,10 @@
 import numpy as np
-import random
+from sparseSpACE.Integrator import IntegratorMonteCarlo
 
 #this method defines a basic monte carlo integration by evaluation random points
+#it returns the mean of the function values (use IntegratorMonteCarlo for QMC sampling, error estimates and ppf mappings)
 def montecarlo(f,N,dim, a, b):
-    position = np.zeros(dim)
-    result = 0
-    for n in range(N):
-        for d in range(dim):
-            position[d] = random.random()*(b[d] - a[d]) + a[d]
-        result +=f.eval(position)
-    return result/N
+    integrator = IntegratorMonteCarlo(sampling='random')
+    integrator(f, [N], a[:dim], b[:dim])
+    mean = integrator.mean
+    return mean[0] if len(mean) == 1 else mean
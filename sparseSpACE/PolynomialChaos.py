@@ -0,0 +1,325 @@
+import numpy as np
+from typing import Callable, Sequence, Tuple, Union
+from sparseSpACE.Function import evaluate_ppf
+
+
+# This class represents the orthonormal polynomials of one random variable. They are defined by the recurrence
+# coefficients alpha_n, beta_n of the monic orthogonal polynomials and evaluated with the three-term recurrence
+#   sqrt(beta_{n+1}) p_{n+1}(x) = (x - alpha_n) p_n(x) - sqrt(beta_n) p_{n-1}(x),  p_{-1} = 0,  p_0 = 1
+# which holds for probability measures (beta_0 = 1). The recurrence coefficients are computed on demand.
+class OrthonormalPolynomials1D(object):
+    def __init__(self, recurrence: Callable[[int], Tuple[Sequence[float], Sequence[float]]]):
+        """
+        :param recurrence: Function that returns the first n recurrence coefficients (alphas, betas) for given n
+        """
+        self.recurrence = recurrence
+        self.alphas = np.zeros(0)
+        self.betas = np.zeros(0)
+
+    def get_recurrence_coefficients(self, num_coefficients: int) -> Tuple[Sequence[float], Sequence[float]]:
+        """This method returns the first num_coefficients recurrence coefficients.
+
+        :param num_coefficients: Number of coefficients
+        :return: alphas and betas
+        """
+        if len(self.alphas) < num_coefficients:
+            alphas, betas = self.recurrence(num_coefficients)
+            self.alphas = np.asarray(alphas, dtype=float)
+            self.betas = np.asarray(betas, dtype=float)
+        return self.alphas[:num_coefficients], self.betas[:num_coefficients]
+
+    def evaluate(self, x: Sequence[float], max_degree: int) -> np.ndarray:
+        """This method evaluates the orthonormal polynomials of degree 0 to max_degree at the points x.
+
+        :param x: Array of points
+        :param max_degree: Maximum polynomial degree
+        :return: Array of shape (max_degree + 1, *shape(x)) with the polynomial values
+        """
+        x = np.asarray(x, dtype=float)
+        alphas, betas = self.get_recurrence_coefficients(max_degree + 1)
+        values = np.empty((max_degree + 1, *np.shape(x)))
+        values[0] = 1.0
+        if max_degree > 0:
+            values[1] = (x - alphas[0]) / np.sqrt(betas[1])
+        for n in range(1, max_degree):
+            values[n + 1] = ((x - alphas[n]) * values[n] - np.sqrt(betas[n]) * values[n - 1]) / np.sqrt(betas[n + 1])
+        return values
+
+    @staticmethod
+    def jacobi(alpha: float, beta: float, lower: float = 0.0, upper: float = 1.0) -> "OrthonormalPolynomials1D":
+        """This method returns the orthonormal polynomials for a Beta(alpha, beta) distribution on [lower, upper].
+        They are the Jacobi polynomials P^(beta - 1, alpha - 1) transformed to [lower, upper].
+
+        :param alpha: First shape parameter of the Beta distribution (> 0)
+        :param beta: Second shape parameter of the Beta distribution (> 0)
+        :param lower: Lower bound of the distribution
+        :param upper: Upper bound of the distribution
+        :return: Orthonormal polynomials
+        """
+        assert alpha > 0 and beta > 0 and lower < upper
+        # exponents of the Jacobi weight (1 - t)^a (1 + t)^b on [-1, 1]
+        a = beta - 1.0
+        b = alpha - 1.0
+        center = (lower + upper) / 2.0
+        half_width = (upper - lower) / 2.0
+
+        def recurrence(num_coefficients):
+            n = np.arange(num_coefficients, dtype=float)
+            s = 2 * n + a + b
+            alphas = np.empty(num_coefficients)
+            betas = np.ones(num_coefficients)
+            alphas[0] = (b - a) / (a + b + 2)
+            alphas[1:] = (b ** 2 - a ** 2) / (s[1:] * (s[1:] + 2))
+            if num_coefficients > 1:
+                betas[1] = 4 * (1 + a) * (1 + b) / ((2 + a + b) ** 2 * (3 + a + b))
+            n, s = n[2:], s[2:]
+            betas[2:] = 4 * n * (n + a) * (n + b) * (n + a + b) / (s ** 2 * (s + 1) * (s - 1))
+            # transformation from [-1, 1] to [lower, upper]
+            betas[1:] *= half_width ** 2
+            return center + half_width * alphas, betas
+        return OrthonormalPolynomials1D(recurrence)
+
+    @staticmethod
+    def legendre(lower: float, upper: float) -> "OrthonormalPolynomials1D":
+        """This method returns the orthonormal polynomials for a uniform distribution on [lower, upper].
+
+        :param lower: Lower bound of the distribution
+        :param upper: Upper bound of the distribution
+        :return: Orthonormal polynomials
+        """
+        return OrthonormalPolynomials1D.jacobi(1.0, 1.0, lower, upper)
+
+    @staticmethod
+    def hermite(mu: float, sigma: float) -> "OrthonormalPolynomials1D":
+        """This method returns the orthonormal (probabilists') Hermite polynomials for a normal distribution.
+
+        :param mu: Expectation of the distribution
+        :param sigma: Standard deviation of the distribution
+        :return: Orthonormal polynomials
+        """
+        def recurrence(num_coefficients):
+            betas = np.arange(num_coefficients, dtype=float) * sigma ** 2
+            betas[0] = 1.0
+            return np.full(num_coefficients, float(mu)), betas
+        return OrthonormalPolynomials1D(recurrence)
+
+    @staticmethod
+    def stieltjes(ppf: Callable, num_intervals: int = 100, points_per_interval: int = 12) -> "OrthonormalPolynomials1D":
+        """This method returns the orthonormal polynomials for a general distribution. The recurrence coefficients
+        are calculated with the discretized Stieltjes procedure (see discretize_distribution).
+
+        :param ppf: Inverse of the cumulative distribution function
+        :param num_intervals: Number of intervals of equal probability used for the discretization
+        :param points_per_interval: Number of Gauss-Legendre points in each interval
+        :return: Orthonormal polynomials
+        """
+        def recurrence(num_coefficients):
+            nodes, weights = discretize_distribution(ppf, num_intervals, points_per_interval)
+            return stieltjes_procedure(nodes, weights, num_coefficients)
+        return OrthonormalPolynomials1D(recurrence)
+
+
+def discretize_distribution(ppf: Callable, num_intervals: int, points_per_interval: int,
+                            tail_probability: float = 10 ** -14) -> Tuple[Sequence[float], Sequence[float]]:
+    """This method returns nodes and weights of a discrete measure which approximates the distribution. The
+    expectation is an integral over the probabilities u in (0, 1) of the values at ppf(u), so a composite
+    Gauss-Legendre rule in u is used. The intervals are refined geometrically towards the tails as the ppf is unbounded
+    there for distributions with infinite support.
+
+    :param ppf: Inverse of the cumulative distribution function
+    :param num_intervals: Number of intervals of equal probability
+    :param points_per_interval: Number of Gauss-Legendre points in each interval
+    :param tail_probability: Probability below which the tails are not refined any further
+    :return: nodes and weights (the weights sum up to 1)
+    """
+    num_tail_intervals = int(np.ceil(np.log2(1.0 / (num_intervals * tail_probability))))
+    tail = 1.0 / num_intervals * 0.5 ** np.arange(num_tail_intervals, 0, -1)
+    lower_half = np.concatenate(([0.0], tail, np.linspace(1.0 / num_intervals, 0.5, num_intervals // 2 + 1)))
+    boundaries = np.concatenate((lower_half, 1.0 - lower_half[-2::-1]))
+    reference_points, reference_weights = np.polynomial.legendre.leggauss(points_per_interval)
+    lower, upper = boundaries[:-1, np.newaxis], boundaries[1:, np.newaxis]
+    probabilities = np.ravel((lower + upper) / 2 + (upper - lower) / 2 * reference_points)
+    weights = np.ravel((upper - lower) / 2 * reference_weights)
+    nodes = evaluate_ppf(ppf, probabilities)
+    # probabilities in the outermost intervals can be rounded to 0 or 1
+    finite = np.isfinite(nodes)
+    return nodes[finite], weights[finite] / np.sum(weights[finite])
+
+
+def stieltjes_procedure(nodes: Sequence[float], weights: Sequence[float],
+                        num_coefficients: int) -> Tuple[Sequence[float], Sequence[float]]:
+    """This method calculates the recurrence coefficients of the orthogonal polynomials of a discrete measure.
+
+    :param nodes: Nodes of the discrete measure
+    :param weights: Weights of the discrete measure (summing up to 1)
+    :param num_coefficients: Number of recurrence coefficients
+    :return: alphas and betas
+    """
+    assert num_coefficients <= len(nodes)
+    alphas = np.zeros(num_coefficients)
+    betas = np.ones(num_coefficients)
+    # orthonormal polynomials of the current and previous degree at the nodes
+    values_previous = np.zeros(len(nodes))
+    values = np.ones(len(nodes))
+    for n in range(num_coefficients):
+        alphas[n] = np.sum(weights * nodes * values ** 2)
+        if n + 1 < num_coefficients:
+            values_next = (nodes - alphas[n]) * values - np.sqrt(betas[n]) * values_previous
+            betas[n + 1] = np.sum(weights * values_next ** 2)
+            values_previous, values = values, values_next / np.sqrt(betas[n + 1])
+    betas[0] = 1.0
+    return alphas, betas
+
+
+# This class represents a tensor product basis of orthonormal polynomials; each basis polynomial is defined by a
+# multi-index containing the polynomial degree for every dimension.
+class OrthonormalPolynomialBasis(object):
+    def __init__(self, polynomials: Sequence[OrthonormalPolynomials1D], multi_indices: Sequence[Sequence[int]]):
+        """
+        :param polynomials: Orthonormal polynomials for each dimension
+        :param multi_indices: Multi-indices of the basis polynomials; the first one has to be the constant polynomial
+        """
+        self.polynomials = polynomials
+        self.multi_indices = np.asarray(multi_indices, dtype=int)
+        self.dim = len(polynomials)
+        assert self.multi_indices.shape[1] == self.dim
+        assert not np.any(self.multi_indices[0]), "The first polynomial has to be the constant polynomial"
+
+    def __len__(self):
+        return len(self.multi_indices)
+
+    @staticmethod
+    def get_multi_indices(dim: int, polynomial_degrees: Union[int, Sequence[int]]) -> np.ndarray:
+        """This method returns a total-degree index set. If a degree is specified for each dimension, the
+        polynomials are restricted to these degrees (anisotropic index set).
+
+        :param dim: Dimension
+        :param polynomial_degrees: Maximum total degree or the maximum degree for each dimension
+        :return: Array of multi-indices sorted by total degree
+        """
+        if hasattr(polynomial_degrees, "__iter__"):
+            max_degrees = [int(degree) for degree in polynomial_degrees]
+            assert len(max_degrees) == dim
+        else:
+            max_degrees = [int(polynomial_degrees)] * dim
+        total_degree = max(max_degrees)
+        multi_indices = [()]
+        for d in range(dim):
+            multi_indices = [index + (degree,) for index in multi_indices
+                             for degree in range(min(max_degrees[d], total_degree - sum(index)) + 1)]
+        # graded order with the higher degrees in the first dimensions first
+        multi_indices.sort(key=lambda index: (sum(index), tuple(-degree for degree in index)))
+        return np.array(multi_indices, dtype=int).reshape((len(multi_indices), dim))
+
+    def evaluate(self, points: Sequence[Sequence[float]]) -> np.ndarray:
+        """This method evaluates all basis polynomials at the points.
+
+        :param points: Array of points with shape (number of points, dim)
+        :return: Array of shape (number of points, number of basis polynomials)
+        """
+        points = np.reshape(np.asarray(points, dtype=float), (-1, self.dim))
+        values = np.ones((len(self.multi_indices), len(points)))
+        for d in range(self.dim):
+            degrees = self.multi_indices[:, d]
+            max_degree = int(np.max(degrees))
+            if max_degree > 0:
+                values *= self.polynomials[d].evaluate(points[:, d], max_degree)[degrees]
+        return values.T
+
+
+# This class represents a polynomial chaos expansion with an orthonormal basis. As the basis is orthonormal, the
+# statistics are calculated directly from the coefficients.
+class PolynomialChaosExpansion(object):
+    def __init__(self, basis: OrthonormalPolynomialBasis, coefficients: Sequence[Sequence[float]]):
+        """
+        :param basis: Orthonormal polynomial basis
+        :param coefficients: Coefficients with shape (number of basis polynomials, output length)
+        """
+        self.basis = basis
+        self.coefficients = np.reshape(np.asarray(coefficients, dtype=float), (len(basis), -1))
+
+    @staticmethod
+    def from_quadrature(basis: OrthonormalPolynomialBasis, nodes: Sequence[Sequence[float]],
+                        weights: Sequence[float], values: Sequence[Sequence[float]]) -> "PolynomialChaosExpansion":
+        """This method calculates the coefficients by a spectral projection with a quadrature rule.
+
+        :param basis: Orthonormal polynomial basis
+        :param nodes: Quadrature nodes with shape (number of nodes, dim)
+        :param weights: Quadrature weights
+        :param values: Function values at the nodes with shape (number of nodes, output length)
+        :return: Polynomial chaos expansion
+        """
+        values = np.reshape(np.asarray(values, dtype=float), (len(weights), -1))
+        weighted_values = values * np.reshape(np.asarray(weights, dtype=float), (-1, 1))
+        return PolynomialChaosExpansion(basis, np.dot(basis.evaluate(nodes).T, weighted_values))
+
+    def __call__(self, points: Sequence[Sequence[float]]) -> np.ndarray:
+        """This method evaluates the expansion.
+
+        :param points: Array of points with shape (number of points, dim) or a single point
+        :return: Values with shape (number of points, output length) or (output length,) for a single point
+        """
+        values = np.dot(self.basis.evaluate(points), self.coefficients)
+        if np.ndim(points) == 1:
+            return values[0]
+        return values
+
+    def to_chaospy(self):
+        """This method converts the expansion to a chaospy polynomial, e.g. to print it with chaospy.around or to
+        use it with the chaospy statistics functions. chaospy is only imported here.
+
+        :return: chaospy polynomial with shape (output length,)
+        """
+        import chaospy as cp
+        variables = cp.variable(self.basis.dim)
+        if self.basis.dim == 1:
+            variables = [variables]
+        # the orthonormal polynomials of each dimension as chaospy polynomials (see OrthonormalPolynomials1D.evaluate)
+        polynomials_1d = []
+        for d in range(self.basis.dim):
+            max_degree = int(np.max(self.basis.multi_indices[:, d]))
+            alphas, betas = self.basis.polynomials[d].get_recurrence_coefficients(max_degree + 1)
+            polynomials = [variables[d] ** 0]
+            if max_degree > 0:
+                polynomials.append((variables[d] - alphas[0]) / np.sqrt(betas[1]))
+            for n in range(1, max_degree):
+                polynomials.append(((variables[d] - alphas[n]) * polynomials[n] - np.sqrt(betas[n]) *
+                                    polynomials[n - 1]) / np.sqrt(betas[n + 1]))
+            polynomials_1d.append(polynomials)
+        expansion = 0
+        for multi_index, coefficients in zip(self.basis.multi_indices, self.coefficients):
+            basis_polynomial = 1
+            for d, degree in enumerate(multi_index):
+                basis_polynomial = basis_polynomial * polynomials_1d[d][degree]
+            expansion = expansion + basis_polynomial * coefficients
+        return expansion
+
+    def get_expectation(self) -> Sequence[float]:
+        return self.coefficients[0]
+
+    def get_variance(self) -> Sequence[float]:
+        return np.sum(self.coefficients[1:] ** 2, axis=0)
+
+    def get_first_order_sobol_indices(self) -> np.ndarray:
+        """This method returns the first order Sobol indices, i.e. the variance contributions of the polynomials
+        which only depend on one variable.
+
+        :return: Array of shape (dim, output length)
+        """
+        nonzero = self.basis.multi_indices > 0
+        only_d = nonzero & (np.sum(nonzero, axis=1) == 1)[:, np.newaxis]
+        return self._get_variance_fractions(only_d)
+
+    def get_total_order_sobol_indices(self) -> np.ndarray:
+        """This method returns the total order Sobol indices, i.e. the variance contributions of all polynomials
+        which depend on the variable.
+
+        :return: Array of shape (dim, output length)
+        """
+        return self._get_variance_fractions(self.basis.multi_indices > 0)
+
+    def _get_variance_fractions(self, masks: np.ndarray) -> np.ndarray:
+        variance_contributions = np.dot(masks.T.astype(float), self.coefficients ** 2)
+        variance = self.get_variance()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(variance > 0, variance_contributions / variance, 0.0)
@@ -1,6 +1,7 @@
-
 import math
+import heapq
 import numpy as np
+from bisect import bisect_left
 from sparseSpACE.ErrorCalculator import ErrorCalculator
 import abc,logging
 from operator import itemgetter, attrgetter, methodcaller
@@ -9,7 +10,11 @@ from sparseSpACE.RefinementObject import RefinementObject
 from sparseSpACE.Function import Function
 
 # This class implements a general container that can be filled with refinementObjects (typically specified by the refinement strategy)
-# In addition it stores accumulated values over all refinementObjects (like integral, numberOfEvaluations)
+# In addition it stores accumulated values over all refinementObjects (like integral, numberOfEvaluations, total error)
+# The benefits and errors of the refinementObjects are indexed by max-heaps so that the maximal values and the
+# candidates for refinement can be found without iterating over all objects. Heap entries are invalidated lazily:
+# an entry is only valid if its object is still in the container and still has the stored value.
+# Errors and benefits therefore have to be set via calc_error and set_benefit (or reinit_new_objects has to be called).
 class RefinementContainer(object):
     def __init__(self, initial_objects: List[RefinementObject], dim: int, error_estimator: ErrorCalculator):
         self.refinementObjects = initial_objects
@@ -20,6 +25,120 @@ class RefinementContainer(object):
         self.startNewObjects = 0
         self.errorEstimator = error_estimator
         self.searchPosition = 0
+        self.rebuild_index()
+
+    # converts a (possibly 1-element array) error or benefit to a float that is used as heap key
+    @staticmethod
+    def get_heap_key(value) -> float:
+        if isinstance(value, float):
+            return value
+        return float(np.asarray(value, dtype=float).reshape(-1)[0])
+
+    # rebuilds heaps, positions and running total error from the current refinementObjects
+    def rebuild_index(self) -> None:
+        self.benefit_heap = []
+        self.error_heap = []
+        self.heap_counter = 0
+        # error contribution of each object to the total error (indexed by id of object)
+        self.object_errors = {}
+        self.total_error = 0
+        self.object_positions = None
+        self.refinement_candidates = None
+        self.candidate_tolerance = None
+        self.interval_index = None
+        for obj in self.refinementObjects:
+            self.index_object(obj)
+
+    # adds an object to the error bookkeeping and pushes its current error and benefit to the heaps
+    def index_object(self, refine_object: RefinementObject) -> None:
+        error = getattr(refine_object, 'error', None)
+        self.object_errors[id(refine_object)] = error if error is not None else 0
+        if error is not None:
+            self.total_error += error
+            self.push_heap(self.error_heap, error, refine_object)
+        benefit = getattr(refine_object, 'benefit', None)
+        if benefit is not None:
+            self.push_heap(self.benefit_heap, benefit, refine_object)
+
+    # pushes an entry (-value, counter, object) to the max-heap; counter breaks ties without comparing objects
+    def push_heap(self, heap: list, value, refine_object: RefinementObject) -> None:
+        heapq.heappush(heap, (-self.get_heap_key(value), self.heap_counter, refine_object))
+        self.heap_counter += 1
+        # remove outdated entries if heap grows too large
+        if len(heap) > 4 * len(self.refinementObjects) + 64:
+            self.compact_heap(heap)
+
+    # checks if heap entry is still up to date
+    def is_valid_entry(self, entry, attribute: str) -> bool:
+        refine_object = entry[2]
+        if id(refine_object) not in self.object_errors:
+            return False
+        value = getattr(refine_object, attribute, None)
+        return value is not None and -entry[0] == self.get_heap_key(value)
+
+    def compact_heap(self, heap: list) -> None:
+        attribute = 'benefit' if heap is self.benefit_heap else 'error'
+        heap[:] = [entry for entry in heap if self.is_valid_entry(entry, attribute)]
+        heapq.heapify(heap)
+
+    # returns the largest valid value in the heap (or 0 if there is no value larger than 0)
+    def get_heap_max(self, heap: list, attribute: str) -> float:
+        while heap and not self.is_valid_entry(heap[0], attribute):
+            heapq.heappop(heap)
+        if heap and -heap[0][0] > 0:
+            return -heap[0][0]
+        return 0
+
+    # returns mapping from object ids to current positions in container
+    def get_object_positions(self) -> dict:
+        if self.object_positions is None:
+            self.object_positions = {id(obj): i for i, obj in enumerate(self.refinementObjects)}
+        return self.object_positions
+
+    # returns the sorted positions of all objects with a benefit >= tolerance;
+    # the heap is traversed as a tree and only subtrees with entries above the tolerance are visited
+    def get_refinement_candidates(self, tolerance: float) -> List[int]:
+        if self.refinement_candidates is not None and self.candidate_tolerance == tolerance:
+            return self.refinement_candidates
+        positions = self.get_object_positions()
+        candidates = set()
+        heap = self.benefit_heap
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if i < len(heap) and -heap[i][0] >= tolerance:
+                if self.is_valid_entry(heap[i], 'benefit'):
+                    candidates.add(positions[id(heap[i][2])])
+                stack.append(2 * i + 1)
+                stack.append(2 * i + 2)
+        self.refinement_candidates = sorted(candidates)
+        self.candidate_tolerance = tolerance
+        return self.refinement_candidates
+
+    # invalidates the cached positions, refinement candidates and interval index
+    def invalidate_positions(self) -> None:
+        self.object_positions = None
+        self.refinement_candidates = None
+        self.interval_index = None
+
+    # returns the starts and ends of the RefinementObjects as arrays; this serves as interval index for
+    # one-dimensional RefinementObjects that are sorted by their start (e.g. after apply_remove(sort=True))
+    # the index is only rebuilt after objects were added or removed
+    def get_interval_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self.interval_index is None:
+            starts = np.array([obj.start for obj in self.refinementObjects], dtype=float)
+            ends = np.array([obj.end for obj in self.refinementObjects], dtype=float)
+            assert np.all(starts[1:] >= starts[:-1]), "RefinementObjects have to be sorted by their start"
+            self.interval_index = (starts, ends)
+        return self.interval_index
+
+    # returns for every interval [lower_bounds[i], upper_bounds[i]) the range of positions [first, last) of the
+    # RefinementObjects whose start lies in the interval; all intervals are looked up at once with binary search
+    def get_positions_in_intervals(self, lower_bounds: Sequence[float], upper_bounds: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        starts, _ = self.get_interval_index()
+        first = np.searchsorted(starts, lower_bounds, side='left')
+        last = np.maximum(first, np.searchsorted(starts, upper_bounds, side='left'))
+        return first, last
 
     # returns the error that is associated with the specified refinementObject
     def get_error(self, object_id: int):
@@ -62,30 +181,19 @@ class RefinementContainer(object):
         self.evaluationstotal = 0
         for obj in self.refinementObjects:
             obj.reinit()
-
+        self.rebuild_index()
 
     # return the maximal error among all RefinementObjects
     def get_max_error(self) -> float:
-        max_error = 0
-        for i in self.refinementObjects:
-            if i.error > max_error:
-                max_error = i.error
-        return max_error
+        return self.get_heap_max(self.error_heap, 'error')
 
     # return the maximal benefit among all RefinementObjects
     def get_max_benefit(self) -> float:
-        max_benefit = 0
-        for i in self.refinementObjects:
-            if i.benefit > max_benefit:
-                max_benefit = i.benefit
-        return max_benefit
+        return self.get_heap_max(self.benefit_heap, 'benefit')
 
-    # return the maximal error among all RefinementObjects
+    # return the sum of the errors of all RefinementObjects (updated whenever errors are set or objects are removed)
     def get_total_error(self) -> float:
-        total_error = 0
-        for i in self.refinementObjects:
-            total_error += i.error
-        return total_error
+        return self.total_error
 
     # indicate that all objects have been processed and new RefinementObjects will be added at the end
     def clear_new_objects(self) -> None:
@@ -111,6 +219,7 @@ class RefinementContainer(object):
             self.value -= self.refinementObjects[position].value
             self.evaluationstotal -= self.refinementObjects[position].evaluations
             removed_object = self.refinementObjects.pop(position)
+            self.total_error -= self.object_errors.pop(id(removed_object))
             removed_objects.append(removed_object)
             if self.startNewObjects != 0:
                 self.startNewObjects -= 1
@@ -118,27 +227,61 @@ class RefinementContainer(object):
         if sort:
             # sorted after every remove
             self.refinementObjects = sorted(self.refinementObjects, key=attrgetter('start'))
+        if removed_objects or sort:
+            self.invalidate_positions()
         return removed_objects
 
     # add new RefinementObjects to the container
     def add(self, new_refinement_objects) -> None:
+        start = len(self.refinementObjects)
         self.refinementObjects.extend(new_refinement_objects)
+        self.interval_index = None
+        for i, obj in enumerate(new_refinement_objects, start):
+            self.index_object(obj)
+            if self.object_positions is not None:
+                self.object_positions[id(obj)] = i
+            # new objects are appended at the end so the candidate list stays sorted
+            if self.refinement_candidates is not None and getattr(obj, 'benefit', None) is not None \
+                    and obj.benefit >= self.candidate_tolerance:
+                self.refinement_candidates.append(i)
 
     # calculate the error according to the error estimator for specified RefinementObjects
     def calc_error(self, object_id, norm, volume_weights=None) -> None:
         refine_object = self.refinementObjects[object_id]
         refine_object.set_error(self.errorEstimator.calc_error(refine_object, norm, volume_weights=volume_weights))
+        self.update_error(refine_object)
+
+    # updates total error and error heap after the error of the RefinementObject has changed
+    def update_error(self, refine_object: RefinementObject) -> None:
+        error = refine_object.error if refine_object.error is not None else 0
+        self.total_error += error - self.object_errors[id(refine_object)]
+        self.object_errors[id(refine_object)] = error
+        if refine_object.error is not None:
+            self.push_heap(self.error_heap, refine_object.error, refine_object)
 
     # returns all RefinementObjects in the container
     def get_objects(self) -> List[RefinementObject]:
         return self.refinementObjects
 
+    # returns the next RefinementObject after the last returned one (in order of positions) with benefit >= tolerance
     def get_next_object_for_refinement(self, tolerance: float) -> Tuple[bool, int, RefinementObject]:
         if self.startNewObjects == 0:
             end = self.size()
         else:
             end = self.startNewObjects
-        for i in range(self.searchPosition, end):
+        if tolerance <= 0:
+            # every object is a candidate
+            for i in range(self.searchPosition, end):
+                if self.refinementObjects[i].benefit >= tolerance:
+                    self.searchPosition = i + 1
+                    return True, i, self.refinementObjects[i]
+            return False, None, None
+        candidates = self.get_refinement_candidates(tolerance)
+        for k in range(bisect_left(candidates, self.searchPosition), len(candidates)):
+            i = candidates[k]
+            if i >= end:
+                break
+            # benefit might have been reduced from outside (e.g. after refinement of a cell)
             if self.refinementObjects[i].benefit >= tolerance:
                 self.searchPosition = i + 1
                 return True, i, self.refinementObjects[i]
@@ -185,6 +328,8 @@ class RefinementContainer(object):
             refine_object.benefit = refine_object.error / refine_object.evaluations
         else:
             refine_object.benefit = refine_object.error
+        self.push_heap(self.benefit_heap, refine_object.benefit, refine_object)
+        self.refinement_candidates = None
 
     def get_max_coarsening(self) -> int:
         max_coarsening_level = 0
@@ -203,23 +348,32 @@ class MetaRefinementContainer(object):
         self.curContainer = 0
         self.calculate_volume_weights = calculate_volume_weights
 
-    # return the maximal error among all RefinementContainers
+    # return the maximal benefit among all RefinementContainers
+    # (each container only looks at the top of its heap)
     def get_max_benefit(self) -> float:
         max_benefit = 0.0
         for c in self.refinementContainers:
             benefit = c.get_max_benefit()
-            # print("getMaxERror", error)
             if max_benefit < benefit:
                 max_benefit = benefit
         return max_benefit
 
+    # return the maximal error among all RefinementContainers
+    def get_max_error(self) -> float:
+        max_error = 0.0
+        for c in self.refinementContainers:
+            error = c.get_max_error()
+            if max_error < error:
+                max_error = error
+        return max_error
+
     def get_max_coarsening(self, d: int) -> int:
         return self.refinementContainers[d].get_max_coarsening()
 
     def get_object(self, object_position: Tuple[int, int]) -> RefinementObject:
         return self.refinementContainers[object_position[0]].get_object(object_position[1])
 
-    # return the maximal error among all RefinementContainers
+    # return the sum of the running total errors of all RefinementContainers
     def get_total_error(self) -> float:
         total_error = 0.0
         for c in self.refinementContainers:
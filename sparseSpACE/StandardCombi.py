@@ -1,13 +1,15 @@
 import time
+import copy
 import sparseSpACE
 import matplotlib.pyplot as plt
 from matplotlib import cm
 from sparseSpACE.combiScheme import *
 from sparseSpACE.GridOperation import *
 import importlib
-import multiprocessing as mp
+from functools import partial
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from sparseSpACE import GridOperation
+from sparseSpACE.ComponentGridExecutor import *
 from sparseSpACE.Utils import *
 
 
@@ -17,13 +19,15 @@ class StandardCombi(object):
     """
 
     def __init__(self, a, b, operation: GridOperation, print_output: bool = False, norm: int = 2,
-                 log_level: int = log_levels.INFO, print_level: int = print_levels.INFO):
+                 log_level: int = log_levels.INFO, print_level: int = print_levels.INFO,
+                 executor: ComponentGridExecutor = None):
         """
 
         :param a: Vector of lower boundaries of domain.
         :param b: Vector of upper boundaries of domain.
         :param operation: GridOperation that is used for combination.
         :param print_output: Specifies whether output should be written during combination.
+        :param executor: ComponentGridExecutor that distributes the component grids (serial if None).
         """
         self.log = logging.getLogger(__name__)
         self.dim = len(a)
@@ -35,7 +39,7 @@ class StandardCombi(object):
         self.print_output = print_output
         assert (len(a) == len(b))
         self.operation = operation
-        self.do_parallel = True
+        self.executor = executor if executor is not None else SerialComponentGridExecutor()
         self.norm = norm
         self.log_util = LogUtility(log_level=log_level, print_level=print_level)
         # for compatibility with old code
@@ -53,19 +57,31 @@ class StandardCombi(object):
         :return: List of values (each a numpy array)
         """
         interpolation = np.zeros((len(interpolation_points), self.operation.point_output_length()))
-        self.do_parallel = False
-        if self.do_parallel:
-            pool = mp.Pool(4)
-            interpolation_results = pool.starmap_async(self.get_multiplied_interpolation, [(interpolation_points, component_grid) for component_grid in self.scheme]).get()
-            pool.close()
-            pool.join()
-            for result in interpolation_results:
-                interpolation += result
-        else:
-            for component_grid in self.scheme:
-                interpolation += self.interpolate_points(interpolation_points, component_grid) * component_grid.coefficient
+        task = partial(multiplied_interpolation_task, interpolation_points=interpolation_points)
+        # results are summed up in the order of the scheme to obtain reproducible results
+        for result in self.executor.map(self, task, self.scheme):
+            interpolation += result
         return interpolation
 
+    def set_executor(self, executor: ComponentGridExecutor) -> None:
+        """This method sets the executor that is used to distribute the component grids.
+
+        :param executor: ComponentGridExecutor that is used for operation and interpolation.
+        :return: None
+        """
+        self.executor = executor
+
+    def get_worker_copy(self) -> "StandardCombi":
+        """This method returns a copy of the combi instance that can be used by a worker thread. It uses a private copy
+        of the operation and the grid.
+
+        :return: Shallow copy of the combi instance.
+        """
+        worker_combi = copy.copy(self)
+        worker_combi.operation = self.operation.get_worker_copy()
+        worker_combi.grid = worker_combi.operation.get_grid()
+        return worker_combi
+
     def interpolate_points(self, interpolation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo):
         """This method evaluates the model at the specified interpolation points on the specified component grid.
 
@@ -239,8 +255,14 @@ class StandardCombi(object):
         self.operation.initialize()
 
         # iterate over all component_grids and perform operation
-        for component_grid in self.scheme:  # iterate over component grids
-            self.operation.evaluate_levelvec(component_grid)
+        if self.operation.supports_partial_results():
+            # the executor computes the partial results (possibly in parallel) which are then merged in scheme order
+            partial_results = self.executor.map(self.operation, partial_result_task, self.scheme)
+            for component_grid, partial_result in zip(self.scheme, partial_results):
+                self.operation.apply_partial_result(component_grid, partial_result)
+        else:
+            for component_grid in self.scheme:  # iterate over component grids
+                self.operation.evaluate_levelvec(component_grid)
 
         # potential post processing after processing all component grids
         self.operation.post_processing()
@@ -24,7 +24,27 @@ def get_cross_product_list(one_d_arrays: Sequence[Sequence[Union[float, int]]])
     return list(get_cross_product(one_d_arrays))
 
 def get_cross_product_numpy_array(one_d_arrays: Sequence[Sequence[Union[float, int]]]) -> np.ndarray:
-    return np.array(get_cross_product_list(one_d_arrays))
+    # same order as get_cross_product (first dimension varies slowest) but constructed by broadcasting
+    dim = len(one_d_arrays)
+    return np.stack(np.meshgrid(*[np.asarray(one_d_array) for one_d_array in one_d_arrays], indexing="ij"),
+                    axis=-1).reshape(-1, dim)
+
+def get_cross_product_chunks(one_d_arrays: Sequence[Sequence[Union[float, int]]], chunk_size: int) \
+        -> Generator[Tuple[int, int, np.ndarray], None, None]:
+    # yields the cross product in the order of get_cross_product as consecutive arrays of at most chunk_size points
+    # together with their start and end position so that the whole cross product never has to be stored
+    for start, end, indices in get_cross_product_index_chunks([len(one_d_array) for one_d_array in one_d_arrays],
+                                                              chunk_size):
+        yield start, end, np.column_stack([np.asarray(one_d_arrays[d])[indices[d]] for d in range(len(one_d_arrays))])
+
+def get_cross_product_index_chunks(sizes: Sequence[int], chunk_size: int) \
+        -> Generator[Tuple[int, int, Tuple[np.ndarray, ...]], None, None]:
+    # yields the multi-indices (one index array per dimension) of consecutive chunks of the cross product of
+    # range(sizes[0]) x ... x range(sizes[-1]) together with the start and end position of the chunk
+    total = int(np.prod(sizes))
+    for start in range(0, total, chunk_size):
+        end = min(start + chunk_size, total)
+        yield start, end, np.unravel_index(np.arange(start, end), sizes)
 
 def get_cross_product_range(one_d_arrays: Sequence[Sequence[int]]) -> Generator[Tuple[int, ...], None, None]:
     return get_cross_product([range(one_d_array) for one_d_array in one_d_arrays])
@@ -33,6 +53,53 @@ def get_cross_product_range(one_d_arrays: Sequence[Sequence[int]]) -> Generator[
 def get_cross_product_range_list(one_d_arrays: Sequence[Sequence[int]]) -> List[Tuple[int, ...]]:
     return get_cross_product_list([range(one_d_array) for one_d_array in one_d_arrays])
 
+
+def evaluate_basis_1D(basis_functions: Sequence, points: Sequence[float]) -> np.ndarray:
+    # returns the matrix with the entries basis_functions[i](points[j]) at position [j, i]
+    points = np.asarray(points, dtype=float)
+    evaluations = np.empty((len(points), len(basis_functions)))
+    for i, basis in enumerate(basis_functions):
+        evaluations[:, i] = basis.evaluate_points(points)
+    return evaluations
+
+
+def interpolate_tensor_product_points(surplusses: np.ndarray, evaluations_1D: Sequence[np.ndarray],
+                                      max_intermediate_size: int = 2**22) -> np.ndarray:
+    # evaluates the tensor product interpolant sum_i surplusses[:, i] * prod_d basis_{d,i_d}(x_d) at scattered points
+    # surplusses has the shape (number of outputs, number of grid points) with the grid points in cross product order
+    # evaluations_1D[d] contains the 1D basis evaluations of dimension d with shape (number of points, number of basis)
+    # the sum is factorized dimension by dimension starting with the last one; points are processed in chunks so that
+    # the intermediate tensor does not exceed max_intermediate_size entries
+    surplusses = np.asarray(surplusses)
+    num_outputs = surplusses.shape[0]
+    num_basis = [np.shape(evaluations)[1] for evaluations in evaluations_1D]
+    num_points = np.shape(evaluations_1D[0])[0]
+    coefficients = surplusses.reshape(num_outputs, *num_basis)
+    results = np.empty((num_points, num_outputs))
+    chunk_size = max(1, max_intermediate_size // max(1, coefficients.size // num_basis[-1]))
+    for start in range(0, num_points, chunk_size):
+        end = min(start + chunk_size, num_points)
+        # contract the last dimension: shape (outputs, n_1, ..., n_{d-1}, points)
+        intermediate = np.tensordot(coefficients, evaluations_1D[-1][start:end], axes=([-1], [1]))
+        for d in reversed(range(len(num_basis) - 1)):
+            # contract dimension d while keeping the point index shared with the previous contractions
+            intermediate = np.einsum('...im,mi->...m', intermediate, evaluations_1D[d][start:end])
+        results[start:end] = intermediate.T
+    return results
+
+
+def interpolate_tensor_product_grid(surplusses: np.ndarray, evaluations_1D: Sequence[np.ndarray]) -> np.ndarray:
+    # evaluates the tensor product interpolant on the cross product of the 1D point sets of evaluations_1D
+    # the result has the shape (number of points in cross product order, number of outputs)
+    surplusses = np.asarray(surplusses)
+    num_outputs = surplusses.shape[0]
+    num_basis = [np.shape(evaluations)[1] for evaluations in evaluations_1D]
+    intermediate = surplusses.reshape(num_outputs, *num_basis)
+    for evaluations in evaluations_1D:
+        # contracting the leading basis axis appends the point axis of this dimension at the end
+        intermediate = np.tensordot(intermediate, evaluations, axes=([1], [1]))
+    return intermediate.reshape(num_outputs, -1).T
+
 # Default log config
 log_filename = 'log_sg'
 log_format = '%(asctime)s,%(msecs)d %(name)s %(levelname)s :: %(message)s'
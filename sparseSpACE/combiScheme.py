@@ -1,7 +1,7 @@
 import numpy as np
 import math
 from sparseSpACE.ComponentGridInfo import ComponentGridInfo
-from typing import List, Set, Tuple
+from typing import Dict, List, Set, Tuple
 from sparseSpACE.Utils import *
 
 class CombiScheme:
@@ -10,6 +10,10 @@ class CombiScheme:
         self.active_index_set = set()
         self.old_index_set = set()
         self.dim = dim
+        # coefficients of the adaptive scheme (only non-zero entries); updated locally whenever an index is added
+        self.coefficients = {}  # type: Dict[Tuple[int, ...], int]
+        # coefficients that changed since the last call of get_coefficient_changes (0 means removed from the scheme)
+        self.coefficient_changes = {}  # type: Dict[Tuple[int, ...], int]
 
     # This method initializes the adaptive combination scheme. Here we create the old and the active index set
     # for the standard scheme with specified maximum and minimum level.
@@ -23,6 +27,7 @@ class CombiScheme:
         self.active_index_set = CombiScheme.init_active_index_set(lmax, lmin, self.dim)  # type: Set[Tuple[int, ...]]
         self.old_index_set = CombiScheme.init_old_index_set(lmax, lmin, self.dim)  # type: Set[Tuple[int, ...]]
         self.lmax_adaptive = lmax  # type: int
+        self.__init_coefficients()
 
     # This method initializes the subspaces for a full grid. This method should only be used for plotting as it violates
     # the basic properties of the index sets for adaptation.
@@ -39,6 +44,48 @@ class CombiScheme:
         for i in range(1+lmax-lmin):
             self.old_index_set = self.old_index_set | CombiScheme.init_active_index_set(lmax, lmin+i, self.dim)  # type: Set[Tuple[int, ...]]
         self.lmax_adaptive = lmax  # type: int
+        self.__init_coefficients()
+
+    # This method computes the coefficients of the whole index set from scratch. Afterwards the coefficients are only
+    # updated locally when indices are added.
+    def __init_coefficients(self) -> None:
+        self.coefficients = {}
+        for grid_levelvec in self.get_index_set():
+            self.__add_index_to_coefficients(grid_levelvec, self.coefficients)
+        self.coefficient_changes = dict(self.coefficients)
+
+    # This method adds the contribution of the index grid_levelvec to the coefficients. Only the (at most 2^d)
+    # backward neighbours within the lmin bound are touched. If changes is given, the new coefficients of all touched
+    # component grids are recorded there as well.
+    def __add_index_to_coefficients(self, grid_levelvec: Tuple[int, ...], coefficients: Dict[Tuple[int, ...], int],
+                                    changes: Dict[Tuple[int, ...], int] = None) -> None:
+        stencils = []
+        for d in range(self.dim):
+            if grid_levelvec[d] <= self.lmin:
+                stencils.append([0])
+            else:
+                stencils.append([0, -1])
+        stencil_elements = get_cross_product(stencils)
+        for s in stencil_elements:
+            levelvec = tuple(map(lambda x, y: x + y, grid_levelvec, s))  # adding tuples
+            update_coefficient = -(abs((sum(s))) % 2) + (abs(((sum(s)) - 1)) % 2)
+            coefficient = coefficients.get(levelvec, 0) + update_coefficient
+            # component grids with zero coefficient are removed so that the map only contains the scheme
+            if coefficient == 0:
+                coefficients.pop(levelvec, None)
+            else:
+                coefficients[levelvec] = coefficient
+            if changes is not None:
+                changes[levelvec] = coefficient
+
+    # This method returns the component grids whose coefficients changed since the last call (or since the
+    # initialization) as dictionary levelvector -> new coefficient. A coefficient of 0 indicates that the component grid
+    # was removed from the scheme. The recorded changes are reset afterwards.
+    def get_coefficient_changes(self) -> Dict[Tuple[int, ...], int]:
+        assert self.initialized_adaptive
+        changes = self.coefficient_changes
+        self.coefficient_changes = {}
+        return changes
 
     def extendable_level(self, levelvec: List[int]) -> Tuple[bool, int]:
         assert self.initialized_adaptive
@@ -94,6 +141,7 @@ class CombiScheme:
             if tuple(levelvec_copy) not in self.old_index_set and not levelvec_copy[dim] < self.lmin:
                 return False
         self.active_index_set.add(tuple(levelvec))
+        self.__add_index_to_coefficients(tuple(levelvec), self.coefficients, self.coefficient_changes)
         self.lmax_adaptive = max(self.lmax_adaptive, levelvec[d])
         return True
 
@@ -140,7 +188,9 @@ class CombiScheme:
                     print(i, list(grid_array[i].levelvector), grid_array[i].coefficient)
         else:  # use adaptive schem
             assert self.initialized_adaptive
-            grid_array = self.get_coefficients_to_index_set(self.active_index_set | self.old_index_set)
+            # the coefficients are kept up to date during the refinement so they do not have to be recomputed
+            grid_array = [ComponentGridInfo(levelvector=levelvec, coefficient=coefficient)
+                          for levelvec, coefficient in self.coefficients.items()]
             # print(grid_dict.items())
             for i in range(len(grid_array)):
                 if do_print:
@@ -151,28 +201,11 @@ class CombiScheme:
     # in the specified index set. It returns a list of ComponentGridInfo Structure containing all component grids with
     # non-zero coefficients.
     def get_coefficients_to_index_set(self, index_set: Set[Tuple[int, ...]]) -> List[ComponentGridInfo]:
-        grid_array = []
         grid_dict = {}
         for grid_levelvec in index_set:
-            stencils = []
-            for d in range(self.dim):
-                if grid_levelvec[d] <= self.lmin:
-                    stencils.append([0])
-                else:
-                    stencils.append([0, -1])
-            stencil_elements = get_cross_product(stencils)
-            for s in stencil_elements:
-                levelvec = tuple(map(lambda x, y: x + y, grid_levelvec, s))  # adding tuples
-                update_coefficient = -(abs((sum(s))) % 2) + (abs(((sum(s)) - 1)) % 2)
-                if levelvec in grid_dict:
-                    grid_dict[levelvec] += update_coefficient
-                else:
-                    grid_dict[levelvec] = update_coefficient
-
-        for levelvec, coefficient in grid_dict.items():
-            if coefficient != 0:
-                grid_array.append(ComponentGridInfo(levelvector=levelvec, coefficient=coefficient))
-        return grid_array
+            self.__add_index_to_coefficients(grid_levelvec, grid_dict)
+        return [ComponentGridInfo(levelvector=levelvec, coefficient=coefficient)
+                for levelvec, coefficient in grid_dict.items()]
 
     # This method checks if the specified levelvector is contained in the old index set.
     def is_old_index(self, levelvec: List[int]) -> bool:
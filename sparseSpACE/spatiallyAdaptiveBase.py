@@ -28,6 +28,7 @@ class SpatiallyAdaptivBase(StandardCombi):
         self.grid = operation.get_grid()
         self.refinements_for_recalculate = 100
         self.operation = operation
+        self.executor = SerialComponentGridExecutor()
         self.norm = norm
         self.margin = 0.9
         self.calculated_solution = None
@@ -38,6 +38,8 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
             self.grid_surplusses = GlobalTrapezoidalGrid(a, b, boundary=self.grid.boundary, modified_basis=self.grid.modified_basis)
         else:
             self.grid_surplusses = self.grid
+        # the hierarchization operator keeps the factorized 1D basis matrices of the surplus calculation
+        self.hierarchization_operator = HierarchizationLSG(self.grid)
 
         self.dim_adaptive = dim_adaptive
         #self.evaluationCounts = None
@@ -57,6 +59,10 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
         assert self.rebalancing_safety_factor >= 0
         self.subtraction_value_cache = {}
         self.max_level_dict = {}
+        # results of the component grids keyed by their 1D point sets (current and previous refinement step)
+        self.component_grid_cache = {}
+        self.previous_component_grid_cache = {}
+        self.component_grid_cache_state = None
         self.chebyshev_points = chebyshev_points
         self.use_volume_weighting = use_volume_weighting
         self.timings = timings
@@ -680,12 +686,23 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
 
     def init_evaluation_operation(self, areas):
         self.operation.initialize_evaluation_dimension_wise(areas[0])
+        # only the results of the last refinement step are kept; older point sets do not occur again
+        state = self.operation.get_result_state_dimension_wise()
+        if self.operation.supports_result_reuse_dimension_wise() and state is self.component_grid_cache_state:
+            self.previous_component_grid_cache = self.component_grid_cache
+        else:
+            self.previous_component_grid_cache = {}
+        self.component_grid_cache = {}
+        self.component_grid_cache_state = state
 
     def evaluate_operation_area(self, component_grid: ComponentGridInfo, area, additional_info=None):
         if self.grid.is_global():
             # get 1d coordinates of the grid points that define the grid; they are calculated based on the levelvector
             gridPointCoordsAsStripes, grid_point_levels, children_indices = self.get_point_coord_for_each_dim(component_grid.levelvector)
 
+            if self.operation.supports_result_reuse_dimension_wise():
+                return self.evaluate_operation_area_cached(gridPointCoordsAsStripes, grid_point_levels, children_indices, component_grid)
+
             # calculate the operation on the grid
             self.log_util.time_func("spatAdaptDimWise: calculate_operation_dimension_wise time taken ", self.operation.calculate_operation_dimension_wise, gridPointCoordsAsStripes, grid_point_levels, component_grid)
 
@@ -701,6 +718,41 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
         else:
             pass
 
+    def evaluate_operation_area_cached(self, gridPointCoordsAsStripes: Sequence[Sequence[float]], grid_point_levels: Sequence[Sequence[int]],
+                                       children_indices: Sequence[Sequence[NodeInfo]], component_grid: ComponentGridInfo) -> int:
+        """This method evaluates the operation and the error estimates on a component grid and reuses the results of
+        a previous refinement step if the component grid consists of the same 1D point sets. Only the combination with
+        the current coefficient and the distribution of the surplus volumes to the RefinementObjects is repeated.
+
+        :param gridPointCoordsAsStripes: Gridpoints as list of 1D lists
+        :param grid_point_levels: Grid point levels as list of 1D lists
+        :param children_indices: List of children for each dimension
+        :param component_grid: Component grid on which the operation is applied
+        :return: Number of points of the component grid
+        """
+        # the levels are part of the key as they define the children and parents (they can change by rebalancing)
+        key = tuple((tuple(points_d), tuple(levels_d)) for points_d, levels_d in zip(gridPointCoordsAsStripes, grid_point_levels))
+        cache_entry = self.component_grid_cache.get(key)
+        if cache_entry is None:
+            cache_entry = self.previous_component_grid_cache.get(key)
+        if cache_entry is None:
+            result = self.log_util.time_func("spatAdaptDimWise: compute_result_dimension_wise time taken ", self.operation.compute_result_dimension_wise, gridPointCoordsAsStripes, grid_point_levels, component_grid)
+            number_of_points = np.prod(self.grid.numPoints)
+            # the surplus volumes are computed after the result was applied as some operations evaluate the
+            # component grid using the combined result
+            self.operation.apply_result_dimension_wise(component_grid, result)
+            volumes = None
+            if not self.errorEstimator.is_global:
+                volumes = self.log_util.time_func("spatAdaptDimWise: compute_surplus_volumes time taken ", self.compute_surplus_volumes, gridPointCoordsAsStripes, grid_point_levels, children_indices, component_grid)
+            cache_entry = (result, volumes, number_of_points)
+        else:
+            result, volumes, number_of_points = cache_entry
+            self.operation.apply_result_dimension_wise(component_grid, result)
+        self.component_grid_cache[key] = cache_entry
+        if volumes is not None:
+            self.distribute_surplus_volumes(volumes, children_indices, component_grid)
+        return number_of_points
+
     # This method computes additional values after the compution of the integrals for the current
     # refinement step is finished. This method is executed before the refinement process.
     def finalize_evaluation_operation(self, areas, evaluation_array):
@@ -779,6 +831,8 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
         if self.dim_adaptive:
             self.combischeme.init_adaptive_combi_scheme(self.lmax[0], self.lmin[0])
         #self.evaluationCounts = [np.zeros(self.lmax[d]) for d in range(self.dim)]
+        self.component_grid_cache = {}
+        self.previous_component_grid_cache = {}
         if self.operation is not None:
             self.operation.init_dimension_wise(self.grid, self.grid_surplusses, self.refinement, self.lmin, self.lmax, self.a, self.b, self.version)
 
@@ -1373,7 +1427,25 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
     # through the domain along the child coordinates. We always calculate the 1-dimensional surplus for every point
     # on this slice.
     def calculate_surplusses(self, grid_points: Sequence[Sequence[float]], children_indices: Sequence[Sequence[int]], component_grid: ComponentGridInfo):
-        tol = 10**-84
+        volumes = self.calculate_surplus_volumes(grid_points, children_indices, component_grid)
+        self.distribute_surplus_volumes(volumes, children_indices, component_grid)
+
+    def compute_surplus_volumes(self, gridPointCoordsAsStripes: Sequence[Sequence[float]], grid_point_levels: Sequence[Sequence[int]],
+                                children_indices: Sequence[Sequence[NodeInfo]], component_grid: ComponentGridInfo) -> Sequence[Sequence[Sequence[float]]]:
+        """This method sets the grids to the component grid and computes the surplus volumes of all children.
+
+        :param gridPointCoordsAsStripes: Gridpoints as list of 1D lists
+        :param grid_point_levels: Grid point levels as list of 1D lists
+        :param children_indices: List of children for each dimension
+        :param component_grid: Component grid for which the volumes are computed
+        :return: Volumes of the children for each dimension (same order as children_indices)
+        """
+        self.grid_surplusses.set_grid(gridPointCoordsAsStripes, grid_point_levels)
+        self.grid.set_grid(gridPointCoordsAsStripes, grid_point_levels)
+        return self.calculate_surplus_volumes(gridPointCoordsAsStripes, children_indices, component_grid)
+
+    def calculate_surplus_volumes(self, grid_points: Sequence[Sequence[float]], children_indices: Sequence[Sequence[int]], component_grid: ComponentGridInfo) -> Sequence[Sequence[Sequence[float]]]:
+        volumes = []
         if isinstance(self.grid_surplusses, GlobalBSplineGrid) or isinstance(self.grid_surplusses, GlobalLagrangeGrid):
             # grid_values = np.empty((self.f.output_length(), np.prod(self.grid.numPoints)))
             # points = self.grid.getPoints()
@@ -1381,11 +1453,9 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
             #     grid_values[:, i] = self.f(point)
             grid_values = self.operation.get_component_grid_values(component_grid, self.grid.get_coordinates())
         for d in range(0, self.dim):
-            k=0
-            refinement_dim = self.refinement.get_refinement_container_for_dim(d)
             if isinstance(self.grid_surplusses, GlobalBSplineGrid) or isinstance(self.grid_surplusses, GlobalLagrangeGrid):
-                hierarchization_operator = HierarchizationLSG(self.grid)
-                surplusses_1d = hierarchization_operator.hierarchize_poles_for_dim(np.array(grid_values.T), self.grid.numPoints, d)
+                self.hierarchization_operator.grid = self.grid
+                surplusses_1d = self.hierarchization_operator.hierarchize_poles_for_dim(np.array(grid_values.T), self.grid.numPoints, d)
                 surplus_pole = np.zeros((self.operation.point_output_length(), self.grid.numPoints[d]))
                 stride = int(np.prod(self.grid.numPoints[d+1:]))
                 for j in range(self.grid.numPoints[d]):
@@ -1393,59 +1463,63 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
                     while i < np.prod(self.grid.numPoints):
                         surplus_pole[:,j] += np.sum(abs(surplusses_1d[:,i:i+stride])) #* weights[i:i+stride]))
                         i += stride * self.grid.numPoints[d]
-            if not (isinstance(self.grid_surplusses, GlobalBSplineGrid) or isinstance(self.grid_surplusses, GlobalLagrangeGrid)) and len(children_indices[d]) > 0:
+                # position of each point in the 1D grid
+                point_positions = {}
+                for j, point in enumerate(grid_points[d]):
+                    point_positions.setdefault(point, j)
+                volumes_d = []
+                for child_info in children_indices[d]:
+                    index_child = point_positions[child_info.child] - int(not(self.grid.boundary))
+                    volumes_d.append(surplus_pole[:, index_child] / np.prod(self.grid.numPoints) * self.grid.numPoints[d] * self.grid.weights[d][index_child])
+                volumes.append(volumes_d)
+            elif len(children_indices[d]) > 0:
                 #print(children_indices)
-                volumes, evaluations = self.sum_up_volumes_for_point_completely_vectorized(child_infos=children_indices[d], grid_points=grid_points, d=d, component_grid=component_grid)
+                volumes_d, evaluations = self.sum_up_volumes_for_point_completely_vectorized(child_infos=children_indices[d], grid_points=grid_points, d=d, component_grid=component_grid)
+                volumes.append(volumes_d)
+            else:
+                volumes.append([])
+        return volumes
+
+    def distribute_surplus_volumes(self, volumes: Sequence[Sequence[Sequence[float]]], children_indices: Sequence[Sequence[int]], component_grid: ComponentGridInfo) -> None:
+        """This method adds the surplus volume of each child to the RefinementObjects in its support.
+
+        :param volumes: Volumes of the children for each dimension (see calculate_surplus_volumes)
+        :param children_indices: List of children for each dimension
+        :param component_grid: Component grid to which the volumes belong
+        :return: None
+        """
+        tol = 10**-84
+        for d in range(0, self.dim):
+            refinement_dim = self.refinement.get_refinement_container_for_dim(d)
+            # look up the RefinementObjects in the support of all children at once:
+            # [first, last) are the objects with left_parent <= start < right_parent (up to the tolerance)
+            left_parents = np.array([child_info.left_parent for child_info in children_indices[d]], dtype=float)
+            right_parents = np.array([child_info.right_parent for child_info in children_indices[d]], dtype=float)
+            factors_left = np.where(left_parents < 0, 1 + tol, 1 - tol)
+            factors_right = np.where(right_parents < 0, 1 - tol, 1 + tol)
+            factors_end = np.where(right_parents >= 0, 1 - tol, 1 + tol)
+            first_positions, last_positions = refinement_dim.get_positions_in_intervals(left_parents * factors_left, right_parents * factors_end)
+            _, ends = refinement_dim.get_interval_index()
             for i, child_info in enumerate(children_indices[d]):
                 left_parent = child_info.left_parent
                 right_parent = child_info.right_parent
                 child = child_info.child
-                if isinstance(self.grid_surplusses, GlobalBSplineGrid) or isinstance(self.grid_surplusses, GlobalLagrangeGrid):
-                    index_child = grid_points[d].index(child) - int(not(self.grid.boundary))
-                    volume = surplus_pole[:, index_child] / np.prod(self.grid.numPoints) * self.grid.numPoints[d] * self.grid.weights[d][index_child]
-                    evaluations = np.prod(self.grid.numPoints) / self.grid.numPoints[d]
-                else:
-                    volume = volumes[i]
-
-                    #if True:#not self.grid_surplusses.modified_basis:
-                    #    #volume2, evaluations = self.sum_up_volumes_for_point_vectorized(child_info=child_info, grid_points=grid_points, d=d, component_grid=component_grid)
-                    #    #if volume != volume2:
-                    #    #    print(volume, volume2, component_grid, child, left_parent, right_parent)
-                    #    #    assert False
-                    #else:
-                    #    volume, evaluations = self.sum_up_volumes_for_point_vectorized(child_info=child_info, grid_points=grid_points, d=d, component_grid=component_grid)
-                    assert volume is not None
-
-                k_old = 0
-                if left_parent < 0:
-                    factor_left = (1 + tol)
-                else:
-                    factor_left = (1 - tol)
-                for i in range(refinement_dim.size() ):
-                    if refinement_dim.get_object(i).start >= left_parent * factor_left:
-                        k_old = i
-                        break
-                k = k_old
-                refine_obj = refinement_dim.get_object(k)
-                if right_parent < 0:
-                    factor_right = (1 - tol)
-                else:
-                    factor_right = (1 + tol)
+                volume = volumes[d][i]
+                assert volume is not None
+
+                factor_left = factors_left[i]
+                factor_right = factors_right[i]
+                k_old = first_positions[i] if first_positions[i] < refinement_dim.size() else 0
+                k = last_positions[i]
+                refine_obj = refinement_dim.get_object(k_old)
                 if not (refine_obj.start >= left_parent * factor_left and refine_obj.end <= right_parent * factor_right):
                     for child_info in children_indices[d]:
                         print(child_info.left_parent, child_info.child, child_info.right_parent)
                 assert refine_obj.start >= left_parent * factor_left and refine_obj.end <= right_parent * factor_right
-                max_level = 1
-                while k < refinement_dim.size():
-                    refine_obj = refinement_dim.get_object(k)
-                    factor = 1 - tol if right_parent >= 0 else 1 + tol
-                    if refine_obj.start >= right_parent * factor:
-                        break
-                    assert refine_obj.end <= right_parent * factor_right
-                    k += 1
-                    max_level = max(max_level, max(refine_obj.levels))
-                for i in range(k_old, k):
-                    refine_obj = refinement_dim.get_object(i)
+                # the ends are sorted as well, so it is sufficient to check the last object in the support
+                assert k == k_old or ends[k - 1] <= right_parent * factor_right
+                for position in range(k_old, k):
+                    refine_obj = refinement_dim.get_object(position)
                     num_area_in_support = (k-k_old)
                     # ~ fraction_of_support = (refine_obj.end - refine_obj.start)/(right_parent - left_parent)
                     modified_volume = volume/num_area_in_support ** 2 #/ 2**(max_level - log2((self.b[d] - self.a[d])/(right_parent - left_parent))) #/  (num_area_in_support)**2
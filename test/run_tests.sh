@@ -1,8 +1,11 @@
 python3 test_BasisFunctions.py
 python3 test_combiScheme.py
+python3 test_Function.py
+python3 test_FunctionCache.py
 python3 test_Hierarchization.py
 python3 test_Integration_UQ.py
 python3 test_Integrator.py
+python3 test_PolynomialChaos.py
 python3 test_RefinementContainer.py
 python3 test_RefinementObject.py
 python3 test_spatiallyAdaptiveExtendSplit.py
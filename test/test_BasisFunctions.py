@@ -53,6 +53,44 @@ class TestBasisFunctions(unittest.TestCase):
                     if points2[j] < points[max(i - 1, 0)] or points2[j] > points[min(i+1, len(points) - 1)]:
                         self.assertEqual(basis(points2[j]), 0.0)
 
+    def test_bspline(self):
+        np.random.seed(0)
+        for p in [1, 3, 5]:
+            knots = np.linspace(-1, 2, 13)
+            num_splines = len(knots) - p - 1
+            x = np.random.rand(100) * 3 - 1
+            matrix = get_bspline_matrix(p, knots, x)
+            # at most p+1 splines are non-zero at each point
+            self.assertTrue(matrix.nnz <= len(x) * (p + 1))
+            splines = [BSpline(p, i, knots) for i in range(num_splines)]
+            self.assertTrue(np.allclose(matrix.toarray(), np.array([spline(x) for spline in splines]).T,
+                                        rtol=0, atol=1e-14))
+            # partition of unity between knots[p] and knots[-p-1]
+            inner = (knots[p] <= x) & (x < knots[-p - 1])
+            self.assertTrue(np.allclose(np.sum(matrix.toarray(), axis=1)[inner], 1.0, rtol=0, atol=1e-14))
+            for i, spline in enumerate(splines):
+                # scalar (recursive) and array evaluations coincide
+                self.assertAlmostEqual(spline(x[0]), spline.evaluate_points(x)[0], 14)
+                self.assertAlmostEqual(spline.get_first_derivative(x[0]), spline.evaluate_first_derivative_points(x)[0],
+                                       12)
+                self.assertAlmostEqual(spline.get_second_derivative(x[0]),
+                                       spline.evaluate_second_derivative_points(x)[0], 10)
+                # the derivatives match finite differences
+                epsilon = 1e-6
+                finite_difference = (spline(x + epsilon) - spline(x - epsilon)) / (2 * epsilon)
+                self.assertTrue(np.allclose(spline.get_first_derivative(x), finite_difference, rtol=0, atol=1e-5))
+                if p > 1:
+                    finite_difference = (spline.get_first_derivative(x + epsilon) -
+                                         spline.get_first_derivative(x - epsilon)) / (2 * epsilon)
+                    self.assertTrue(np.allclose(spline.evaluate_second_derivative_points(x), finite_difference,
+                                                rtol=0, atol=1e-4))
+                # the integral of a B-spline on a uniform knot vector is the knot distance
+                coords, weights = np.polynomial.legendre.leggauss(p // 2 + 1)
+                self.assertAlmostEqual(spline.get_integral(-1, 2, coords, weights), knots[1] - knots[0], 13)
+            self.assertTrue(np.allclose(get_bspline_matrix(p, knots, x, derivative=1).toarray(),
+                                        np.array([spline.get_first_derivative(x) for spline in splines]).T,
+                                        rtol=0, atol=1e-12))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -152,6 +152,22 @@ class TestDensityEstimation(unittest.TestCase):
                                             point_j=point_1, domain_j=dom_1)
         self.assertAlmostEqual((4.0 / 9.0) - res[0], 0.0)
 
+    def test_solve_R_matrix_kronecker(self):
+        dim = 3
+        data = np.random.rand(100, dim)
+        for lambd in [0.0, 0.1]:
+            operation = DensityEstimation(data, dim, lambd=lambd)
+            operation.initialize()
+            for levelvec in [(1, 2, 3), (3, 1, 2), (2, 2, 2)]:
+                operation.grid.setCurrentArea(np.zeros(dim), np.ones(dim), levelvec)
+                R = operation.build_R_matrix_sparse(levelvec)
+                numbOfPoints = np.prod(operation.grid.levelToNumPoints(levelvec))
+                self.assertEqual((numbOfPoints, numbOfPoints), R.shape)
+                self.assertTrue(np.allclose(R.toarray(), operation.build_R_matrix(levelvec)))
+                b = operation.calculate_B(operation.data, levelvec)
+                alphas = operation.solve_R_matrix_kronecker(levelvec, b)
+                self.assertTrue(np.allclose(alphas, solve(R.toarray(), b)))
+
     def test_calculate_R_value_analytically(self):
         DE = DensityEstimation(data=[], dim=1)
         dom_1 = [(-1.0, 1.0)]
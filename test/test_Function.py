@@ -0,0 +1,68 @@
+import unittest
+import sparseSpACE
+import numpy as np
+from scipy.stats import norm, uniform
+from sparseSpACE.Function import *
+
+
+class TestFunction(unittest.TestCase):
+
+    def test_eval_vectorized(self):
+        np.random.seed(3)
+        points = np.random.rand(200, 3)
+        gaussian = GenzGaussian(np.ones(3) * 0.5, np.ones(3))
+        discontinuous = GenzDiscontinious2([1, 2, 3], [0.6, 0.3, 0.5])
+        functions = [(FunctionG(3), points),
+                     (FunctionGShifted(3), points),
+                     (FunctionUQ(), points - 0.5),
+                     (FunctionUQShifted(), points - 0.5),
+                     (FunctionUQNormal(gaussian, [0.5] * 3, [0.2] * 3, -np.inf, np.inf), points),
+                     (FunctionCantileverBeamD(), points + [2.9e7, 500, 1000]),
+                     (FunctionPower(discontinuous, 2), points),
+                     (FunctionPolynomial([1, 2, 3], 3), points),
+                     (discontinuous, points),
+                     (FunctionShift(gaussian, lambda x: [x[0] + 0.1, 2 * x[1], x[2]]), points),
+                     (FunctionCompose([(gaussian, 2.0), (FunctionG(3), -1.0)]), points),
+                     (FunctionConcatenate([gaussian, discontinuous]), points),
+                     (FunctionInverseTransform(FunctionUQ(), [norm, uniform, norm]), points * 0.98 + 0.01),
+                     (FunctionUQWeighted(FunctionUQ(), gaussian), points - 0.5)]
+        for f, f_points in functions:
+            values = np.array([np.ravel(f.eval(p)) for p in f_points])
+            values_vectorized = np.reshape(f.eval_vectorized(f_points), np.shape(values))
+            self.assertTrue(np.allclose(values, values_vectorized, rtol=10**-14, atol=10**-15), type(f).__name__)
+            # the batched call uses eval_vectorized and checks the output length
+            f.reset_dictionary()
+            self.assertTrue(np.allclose(f(f_points), values, rtol=10**-14, atol=10**-15), type(f).__name__)
+            # additional leading dimensions are kept
+            self.assertEqual(np.shape(f.eval_vectorized_output(np.reshape(f_points, (20, 10, 3)))),
+                             (20, 10, f.output_length()))
+        # in debug mode the vectorized results are compared with eval at the original (not shifted) coordinates
+        for f in [FunctionGShifted(3), FunctionUQShifted()]:
+            f.debug = True
+            f.eval_vectorized(points)
+
+    def test_wrappers_forward_batches(self):
+        class ScalarFunction(Function):
+            def __init__(self):
+                super().__init__()
+                self.num_scalar_evaluations = 0
+
+            def eval(self, coordinates):
+                self.num_scalar_evaluations += 1
+                return sum(coordinates)
+
+            def eval_vectorized(self, coordinates):
+                return np.sum(coordinates, axis=-1)
+
+        points = np.random.rand(50, 2)
+        inner = ScalarFunction()
+        for f in [FunctionPower(inner, 2), FunctionConcatenate([inner, inner]), FunctionUQWeighted(inner, inner),
+                  FunctionCompose([(inner, 1.0)]), FunctionShift(inner, lambda x: x)]:
+            f(points)
+        self.assertEqual(inner.num_scalar_evaluations, 0)
+        # functions that use the cached values of the inner function also do so for batches
+        self.assertEqual(inner.get_f_dict_size(), len(points))
+
+
+if __name__ == '__main__':
+    unittest.main()
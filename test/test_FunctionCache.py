@@ -0,0 +1,195 @@
+import unittest
+import os
+import pickle
+import tempfile
+import numpy as np
+import sparseSpACE
+from sparseSpACE.Function import *
+from sparseSpACE.spatiallyAdaptiveSingleDimension2 import *
+
+
+class CountingFunction(Function):
+    def __init__(self):
+        super().__init__()
+        self.num_evaluations = 0
+
+    def eval(self, coordinates):
+        self.num_evaluations += 1
+        return np.sum(coordinates)
+
+
+class TestFunctionCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_persistence(self):
+        f = CountingFunction()
+        cache = SQLiteFunctionCache(self.filename)
+        f.set_persistent_cache(cache)
+        points = [(0.25, 0.5), (0.5, 0.5), (1.0, 0.0)]
+        for p in points:
+            self.assertEqual(f(p)[0], sum(p))
+        self.assertEqual(f.num_evaluations, 3)
+        self.assertEqual(cache.get_statistics()['misses'], 3)
+
+        # the persistent cache survives the reset of the in-memory dictionaries
+        f.reset_dictionary()
+        for p in points:
+            self.assertEqual(f(p)[0], sum(p))
+        self.assertEqual(f.num_evaluations, 3)
+        self.assertEqual(cache.get_statistics()['hits'], 3)
+
+        # a new function object (e.g. in a new run) reads the values from the same file
+        cache.close()
+        f_new = CountingFunction()
+        f_new.set_persistent_cache(SQLiteFunctionCache(self.filename))
+        for p in points:
+            self.assertEqual(f_new(p)[0], sum(p))
+        self.assertEqual(f_new.num_evaluations, 0)
+
+        # the cache is restored after pickling
+        cache_restored = pickle.loads(pickle.dumps(f_new.persistent_cache))
+        self.assertEqual(len(cache_restored), 3)
+        self.assertTrue(np.array_equal(cache_restored.get((0.5, 0.5)), [1.0]))
+
+    def test_lru_eviction(self):
+        cache = SQLiteFunctionCache(self.filename, max_entries=3)
+        for i in range(3):
+            cache.put((i, 0.0), [float(i)])
+        # access the oldest entry so that the second entry becomes the least recently used one
+        self.assertTrue(np.array_equal(cache.get((0, 0.0)), [0.0]))
+        cache.put((3, 0.0), [3.0])
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get((1, 0.0)))
+        self.assertIsNotNone(cache.get((0, 0.0)))
+        statistics = cache.get_statistics()
+        self.assertEqual(statistics['evictions'], 1)
+        self.assertEqual(statistics['hits'], 2)
+        self.assertEqual(statistics['misses'], 1)
+
+    def test_namespaces(self):
+        cache1 = SQLiteFunctionCache(self.filename, namespace="f1")
+        cache2 = SQLiteFunctionCache(self.filename, namespace="f2")
+        cache1.put((0.5,), [1.0, 2.0])
+        self.assertIsNone(cache2.get((0.5,)))
+        # coordinates are quantized so that floating point noise does not produce new entries
+        self.assertTrue(np.array_equal(cache1.get((0.5 + 1e-15,)), [1.0, 2.0]))
+        cache1.clear()
+        self.assertEqual(len(cache1), 0)
+
+    def test_batched_lookup(self):
+        f = CountingFunction()
+        f([(0.5, 0.5)])
+        f((0.25, 0.25))
+        f.set_persistent_cache(SQLiteFunctionCache(self.filename))
+        f.persistent_cache.put((1.0, 1.0), [2.0])
+        points = [(0.5, 0.5), (0.0, 0.5), (0.25, 0.25), (1.0, 1.0), (0.0, 0.5), (0.75, 0.0)]
+        values = f(points)
+        self.assertEqual(np.shape(values), (len(points), 1))
+        self.assertTrue(np.array_equal(values[:, 0], [sum(p) for p in points]))
+        # only the two new distinct points are evaluated
+        self.assertEqual(f.num_evaluations, 4)
+        self.assertEqual(f.get_f_dict_size(), 5)
+        self.assertEqual(f.persistent_cache.get_statistics()['hits'], 1)
+        self.assertEqual(len(f.persistent_cache), 3)
+        f(points)
+        self.assertEqual(f.num_evaluations, 4)
+
+    def test_read_only_lookup(self):
+        for compact_cache in [False, True]:
+            f = CountingFunction()
+            if compact_cache:
+                f.activate_compact_cache()
+            f((0.5, 0.5))
+            f.set_persistent_cache(SQLiteFunctionCache(self.filename, namespace=str(compact_cache)))
+            f.persistent_cache.put((1.0, 1.0), [2.0])
+            points = np.array([(0.5, 0.5), (0.0, 0.5), (1.0, 1.0), (0.0, 0.5), (0.75, 0.0)])
+            values = f.call_read_only(points)
+            self.assertTrue(np.array_equal(values[:, 0], np.sum(points, axis=1)))
+            # only the misses are evaluated and their values are only stored in the persistent cache
+            self.assertEqual(f.num_evaluations, 3)
+            self.assertEqual(f.get_f_dict_size(), 1)
+            self.assertEqual(len(f.persistent_cache), 3)
+            # the distinct points are counted once, also if they are stored in f_dict later on
+            f((0.0, 0.5))
+            f.call_read_only(points)
+            self.assertEqual(f.num_evaluations, 3)
+            self.assertEqual(f.get_num_distinct_points(), 4)
+        # wrapper functions forward the batches without storing them in the dictionary of the inner function
+        f = CountingFunction()
+        f_power = FunctionPower(f, 2)
+        self.assertEqual(f_power.call_read_only(np.array([(0.5, 1.0), (1.0, 1.0)]))[1, 0], 4.0)
+        self.assertEqual(f.get_f_dict_size(), 0)
+        self.assertEqual(f.get_num_distinct_points(), 2)
+        # without read-only mode the inner function stores the values as before
+        f_power(np.array([(0.25, 1.0)]))
+        self.assertEqual(f.get_f_dict_size(), 1)
+
+    def test_compact_cache(self):
+        cache = CompactFunctionCache(initial_capacity=4)
+        points = np.random.rand(1000, 3)
+        points[500:] = points[:500]
+        values = np.random.rand(1000, 2)
+        cache.update_many(points, values)
+        self.assertEqual(len(cache), 500)
+        # the last value of a duplicate point is stored as for dictionaries
+        self.assertTrue(np.array_equal(cache.get(tuple(points[0])), values[500]))
+        self.assertTrue(np.array_equal(cache.lookup(np.random.rand(10, 3) + 2), -np.ones(10)))
+        cache[(0.0, -0.0, 0.0)] = [1.0, 2.0]
+        self.assertTrue((-0.0, 0.0, 0.0) in cache)
+        self.assertEqual(np.shape(cache.keys()), (501, 3))
+        # get returns a copy of the cached values
+        cache.get(tuple(points[0]))[:] = -1
+        self.assertTrue(np.array_equal(cache.get(tuple(points[0])), values[500]))
+        # concurrent insertions from several threads (with overlapping points) must not mix up keys and values
+        from concurrent.futures import ThreadPoolExecutor
+        cache = CompactFunctionCache(initial_capacity=4)
+        points = np.random.rand(4000, 3)
+        chunks = [points[i * 500:i * 500 + 1000] for i in range(7)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda chunk: cache.update_many(chunk, chunk), chunks))
+        self.assertEqual(len(cache), 4000)
+        found, cached_values = cache.get_many(points)
+        self.assertTrue(np.all(found))
+        self.assertTrue(np.array_equal(cached_values, points))
+        cache = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(len(cache), 4000)
+
+        f = CountingFunction()
+        f((0.5, 0.5))
+        f.activate_compact_cache()
+        points = [(0.5, 0.5), (0.0, 0.5), (0.25, 0.25), (0.0, 0.5)]
+        values = f(points)
+        self.assertTrue(np.array_equal(values[:, 0], [sum(p) for p in points]))
+        self.assertEqual(f.num_evaluations, 3)
+        self.assertEqual(f.get_f_dict_size(), 3)
+        self.assertEqual(f((0.25, 0.25))[0], 0.5)
+        self.assertEqual(f.num_evaluations, 3)
+
+    def test_compact_cache_adaptive_integration(self):
+        a = -3
+        b = 6
+        d = 2
+        results = []
+        for compact_cache in [False, True]:
+            grid = GlobalTrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False)
+            f = GenzGaussian(np.ones(d) * 1.5, np.ones(d) * 0.3)
+            if compact_cache:
+                f.activate_compact_cache()
+            operation = Integration(f, grid=grid, dim=d)
+            spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3,
+                                                                   operation=operation)
+            _, _, _, combiintegral, _, _, _, _, _, _ = spatiallyAdaptive.performSpatiallyAdaptiv(
+                lmin=1, lmax=2, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1, max_evaluations=200,
+                print_output=False)
+            results.append((combiintegral, f.get_f_dict_size()))
+        self.assertAlmostEqual(results[0][0][0], results[1][0][0], places=12)
+        self.assertEqual(results[0][1], results[1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -52,5 +52,81 @@ class TestHierarchization(unittest.TestCase):
                     factor = abs(f(p)[0] if f(p)[0] != 0 else 1)
                     self.assertAlmostEqual((f(p)[0] - f_values[i][0]) / factor, 0, 11)
 
+    def test_hierarchize_poles(self):
+        a = -1
+        b = 2
+        d = 3
+        grid = GlobalLagrangeGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False, p=3)
+        levelvec = [2, 4, 3]
+        grid_points = [np.linspace(a, b, 2 ** l + 1) for l in levelvec]
+        grid_levels = [np.zeros(2 ** l + 1, dtype=int) for l in levelvec]
+        for i in range(d):
+            for l2 in range(1, levelvec[i] + 1):
+                offset = 2 ** (levelvec[i] - l2)
+                for j in range(offset, len(grid_levels[i]), 2 * offset):
+                    grid_levels[i][j] = l2
+        grid.set_grid(grid_points, grid_levels)
+        numPoints = grid.numPoints
+        grid_values = np.random.rand(2, int(np.prod(numPoints)))
+        hierarchization = HierarchizationLSG(grid)
+        surplusses = hierarchization(np.array(grid_values), numPoints, grid)
+        # reference: the surplusses interpolate the grid values, i.e. the tensor product of the 1D basis matrices
+        # applied to the surplusses gives the grid values
+        matrices = [np.array([[grid.get_basis(k, j)(grid.get_coordinates_dim(k)[i]) for j in range(numPoints[k])]
+                              for i in range(numPoints[k])]) for k in range(d)]
+        full_matrix = matrices[0]
+        for k in range(1, d):
+            full_matrix = np.kron(full_matrix, matrices[k])
+        self.assertTrue(np.allclose(np.dot(full_matrix, surplusses.T), grid_values.T, rtol=0, atol=1e-12))
+        # the factorizations of the 1D matrices are reused
+        self.assertEqual(len(hierarchization.factorization_cache), d)
+        hierarchization(np.array(grid_values), numPoints, grid)
+        self.assertEqual(len(hierarchization.factorization_cache), d)
+        # the cache entries are identified by the structure of the grid and not by the basis function objects
+        grid.set_grid(grid_points, grid_levels)
+        hierarchization(np.array(grid_values), numPoints, grid)
+        self.assertEqual(len(hierarchization.factorization_cache), d)
+        grid_other_degree = GlobalLagrangeGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False, p=5)
+        grid_other_degree.set_grid(grid_points, grid_levels)
+        hierarchization(np.array(grid_values), numPoints, grid_other_degree)
+        self.assertEqual(len(hierarchization.factorization_cache), 2 * d)
+
+    def test_interpolate_vectorized(self):
+        a = -1
+        b = 2
+        d = 3
+        for grid in [GlobalLagrangeGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False, p=3),
+                     GlobalBSplineGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False, p=3)]:
+            levelvec = [2, 3, 2]
+            grid_points = [list(np.linspace(a, b, 2 ** l + 1)) for l in levelvec]
+            grid_levels = [np.zeros(2 ** l + 1, dtype=int) for l in levelvec]
+            for i in range(d):
+                for l2 in range(1, levelvec[i] + 1):
+                    offset = 2 ** (levelvec[i] - l2)
+                    for j in range(offset, len(grid_levels[i]), 2 * offset):
+                        grid_levels[i][j] = l2
+            grid.set_grid(grid_points, grid_levels)
+            f = GenzGaussian(np.ones(d) * 0.5, np.ones(d) * 2)
+            grid.integrate(f, levelvec, a * np.ones(d), b * np.ones(d))
+            component_grid = ComponentGridInfo(levelvec, 1)
+            surplusses = grid.get_surplusses(levelvec)
+            evaluation_points = np.random.rand(20, d) * (b - a) + a
+            f_values = grid.interpolate(evaluation_points, component_grid)
+            # reference: sum over all tensor product basis functions
+            for n, p in enumerate(evaluation_points):
+                value = 0.0
+                for i, index in enumerate(get_cross_product_range(grid.numPoints)):
+                    value += surplusses[0, i] * np.prod([grid.get_basis(k, index[k])(p[k]) for k in range(d)])
+                self.assertAlmostEqual(f_values[n][0], value, 12)
+            # the interpolant reproduces the function values in the grid points
+            self.assertTrue(np.allclose(grid.interpolate(get_cross_product_list(grid_points), component_grid),
+                                        f(get_cross_product_list(grid_points)), rtol=0, atol=1e-12))
+            # evaluation on a grid gives the same result as the evaluation of the cross product
+            points_1D = [np.random.rand(m) * (b - a) + a for m in [3, 4, 5]]
+            self.assertTrue(np.allclose(grid.interpolate_grid(points_1D, component_grid),
+                                        grid.interpolate(get_cross_product_list(points_1D), component_grid),
+                                        rtol=0, atol=1e-12))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
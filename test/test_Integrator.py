@@ -14,7 +14,7 @@ class TestIntegrator(unittest.TestCase):
         b = 6
         for d in range(2, 5):
             grid = GlobalTrapezoidalGrid(a*np.ones(d), b*np.ones(d), boundary= True, modified_basis = False)
-            for integrator in [IntegratorArbitraryGrid(grid), IntegratorArbitraryGridScalarProduct(grid)]:
+            for integrator in [IntegratorArbitraryGrid(grid), IntegratorArbitraryGridScalarProduct(grid), IntegratorTensorProduct(grid)]:
                 grid.integrator = integrator
                 for l in range(7 - d):
                     f = FunctionLinear([10*(i+1) for i in range(d)])
@@ -31,6 +31,62 @@ class TestIntegrator(unittest.TestCase):
                     #print(integral, f.getAnalyticSolutionIntegral(a*np.ones(d), b*np.ones(d)), f.eval(np.ones(d)))
                     self.assertAlmostEqual((integral[0] - f.getAnalyticSolutionIntegral(a*np.ones(d), b*np.ones(d))) / abs(f.getAnalyticSolutionIntegral(a*np.ones(d), b*np.ones(d))), 0.0, places=13)
 
+    def test_integrate_tensor_product(self):
+        a = -1
+        b = 2
+        for d in range(1, 5):
+            for boundary in [True, False]:
+                grid = TrapezoidalGrid(a*np.ones(d), b*np.ones(d), boundary=boundary)
+                f = GenzGaussian(np.ones(d) * 0.5, np.ones(d) * 2)
+                levelvec = [2 + i for i in range(d)]
+                grid.setCurrentArea(a*np.ones(d), b*np.ones(d), levelvec)
+                reference = IntegratorArbitraryGridScalarProduct(grid)(f, grid.numPoints, a*np.ones(d), b*np.ones(d))
+                f_concatenated = FunctionConcatenate([f, FunctionLinear(np.ones(d))])
+                integral = IntegratorTensorProduct(grid)(f_concatenated, grid.numPoints, a*np.ones(d), b*np.ones(d))
+                self.assertEqual(len(integral), 2)
+                self.assertAlmostEqual(integral[0] / reference[0], 1.0, places=13)
+                self.assertTrue(np.array_equal(get_cross_product_numpy_array(grid.coordinate_array),
+                                               np.array(grid.getPoints())))
+                grid.set_chunk_size(5)
+                integral_chunked = IntegratorTensorProduct(grid)(f_concatenated, grid.numPoints, a*np.ones(d),
+                                                                 b*np.ones(d))
+                self.assertTrue(np.allclose(integral_chunked, integral, rtol=1e-13, atol=0))
+                # the integrator for arbitrary grids evaluates the points in chunks as well
+                f_concatenated.reset_dictionary()
+                integral_arbitrary = IntegratorArbitraryGrid(grid)(f_concatenated, grid.numPoints, a*np.ones(d),
+                                                                   b*np.ones(d))
+                self.assertTrue(np.allclose(integral_arbitrary, integral, rtol=1e-13, atol=0))
+                operation = Integration(f, grid=grid, dim=d)
+                operation_chunked = Integration(f, grid=grid, dim=d, chunk_size=5)
+                self.assertTrue(np.array_equal(operation.get_component_grid_values(None, grid.coordinate_array),
+                                               operation_chunked.get_component_grid_values(None, grid.coordinate_array)))
+
+    def test_chunked_integration_memory(self):
+        d = 3
+        a = np.zeros(d)
+        b = np.ones(d)
+        chunk_size = 100
+        for integrator in [IntegratorTensorProduct, IntegratorArbitraryGrid]:
+            num_points = []
+            for chunk_size_combi in [None, chunk_size]:
+                f = GenzGaussian(np.ones(d) * 0.5, np.ones(d) * 2)
+                grid = TrapezoidalGrid(a, b)
+                grid.integrator = integrator(grid)
+                grid.set_chunk_size(chunk_size_combi)
+                operation = Integration(f, grid=grid, dim=d, chunk_size=chunk_size_combi)
+                combiObject = StandardCombi(a, b, operation=operation)
+                combiObject.perform_operation(1, 7)
+                num_points.append(combiObject.get_total_num_points())
+                self.assertAlmostEqual(operation.integral[0] / f.getAnalyticSolutionIntegral(a, b), 1.0, places=3)
+            # the chunks are not stored in the function dictionary but the points are still counted once
+            self.assertLessEqual(f.get_f_dict_size(), chunk_size)
+            self.assertEqual(num_points[0], num_points[1])
+        # integrators that evaluate all points at once ignore the chunk size
+        grid = TrapezoidalGrid(a, b)
+        grid.integrator = IntegratorArbitraryGridScalarProduct(grid)
+        with self.assertWarns(UserWarning):
+            grid.set_chunk_size(chunk_size)
+
     def test_integrate_basis_functions(self):
         a = -3
         b = 6
@@ -69,5 +125,126 @@ class TestIntegrator(unittest.TestCase):
                     # Here exactness is not guaranteed but it should be close
                     self.assertAlmostEqual((integral[0] - f.getAnalyticSolutionIntegral(a*np.ones(d), b*np.ones(d))) / abs(f.getAnalyticSolutionIntegral(a*np.ones(d), b*np.ones(d))), 0.0, places=11)
 
+    def test_quadrature_rule_cache(self):
+        d = 2
+        areas = [([0, 0], [1, 1]), ([0, 0.5], [0.5, 1]), ([0.25, 0], [0.5, 0.25])]
+        results = []
+        for cache_size in [0, 1024]:
+            Grid1d.set_quadrature_rule_cache_size(cache_size)
+            Grid1d.clear_quadrature_rule_cache()
+            grids = [TrapezoidalGrid(np.zeros(d), np.ones(d), boundary=False, modified_basis=True),
+                     ClenshawCurtisGrid(np.zeros(d), np.ones(d)), GaussLegendreGrid(np.zeros(d), np.ones(d)),
+                     BSplineGrid(np.zeros(d), np.ones(d), boundary=True, p=3)]
+            f = GenzGaussian(np.ones(d) * 0.4, np.ones(d) * 3)
+            result = []
+            # every area is visited twice so that the second visit is served from the cache
+            for _ in range(2):
+                for grid in grids:
+                    for start, end in areas:
+                        for levelvec in [[1, 2], [3, 2]]:
+                            integral = grid.integrate(f, levelvec, np.array(start, dtype=float), np.array(end, dtype=float))
+                            result.append((integral[0], np.copy(grid.get_points_and_weights()[1])))
+            results.append(result)
+        for (integral, weights), (integral_cached, weights_cached) in zip(results[0], results[1]):
+            self.assertEqual(integral, integral_cached)
+            self.assertTrue(np.array_equal(weights, weights_cached))
+        self.assertTrue(0 < len(Grid1d.quadrature_rule_cache) <= Grid1d.quadrature_rule_cache_size)
+        # the affine invariant rules are stored only once per level and boundary treatment
+        self.assertEqual(len([key for key in Grid1d.quadrature_rule_cache if key[0] == GaussLegendreGrid1D]), 3)
+        # concurrent lookups and evictions in a small cache must not corrupt the shared cache
+        from concurrent.futures import ThreadPoolExecutor
+        Grid1d.set_quadrature_rule_cache_size(4)
+        def integrate_levels(level):
+            grid = GaussLegendreGrid(np.zeros(d), np.ones(d))
+            return [grid.integrate(f, [level, l], np.zeros(d), np.ones(d))[0] for l in range(1, 8)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results_concurrent = list(executor.map(integrate_levels, list(range(1, 8)) * 4))
+        Grid1d.clear_quadrature_rule_cache()
+        self.assertEqual(results_concurrent[:7] * 4, results_concurrent)
+        self.assertEqual(len(Grid1d.quadrature_rule_cache), 0)
+        Grid1d.set_quadrature_rule_cache_size(1024)
+
+    def test_leja_sequence(self):
+        grid = LejaGrid1D(a=0, b=1, boundary=True)
+        grid.set_current_area(0, 1, 2)
+        # the sequences are nested and extended incrementally
+        sequence = grid.get_leja_sequence(5, -1, 2)
+        self.assertEqual(grid.get_leja_sequence(3, -1, 2), sequence[:3])
+        self.assertEqual(grid.get_leja_sequence(7, -1, 2)[:5], sequence)
+        # high levels use the precomputed table and integrate polynomials exactly
+        grid.set_current_area(0, 2, 30)
+        self.assertEqual(len(grid.coords), 61)
+        for degree in [5, 30, 60]:
+            self.assertAlmostEqual(np.inner(grid.weights, grid.coords ** degree) / (2 ** (degree + 1) / (degree + 1)), 1, 10)
+        # sequences of other weight functions are not cached and the caches are bounded
+        num_sequences = len(LejaGrid1D.leja_sequences)
+        grid.get_leja_sequence(4, 0, 1, weightFunction=lambda x: 1.0 - (x - 0.3) ** 2)
+        self.assertEqual(len(LejaGrid1D.leja_sequences), num_sequences)
+        self.assertLessEqual(len(LejaGrid1D.leja_weights), LejaGrid1D.leja_cache_size)
+        # concurrent extensions of the same sequence give the sequence of the sequential computation
+        from concurrent.futures import ThreadPoolExecutor
+        reference = grid.get_leja_sequence(9, -2, 1)
+        LejaGrid1D.leja_sequences.pop((-2, 1, 1e-14))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            sequences = list(executor.map(lambda n: grid.get_leja_sequence(n, -2, 1), [9, 5, 8, 3, 9, 7]))
+        for sequence in sequences:
+            self.assertEqual(sequence, reference[:len(sequence)])
+        self.assertEqual(LejaGrid1D.leja_sequences[(-2, 1, 1e-14)], reference)
+
+    def test_high_order_weight_cache(self):
+        d = 3
+        grid = GlobalHighOrderGrid(np.zeros(d), np.ones(d), boundary=True, max_degree=5, split_up=True)
+        grid_uncached = GlobalHighOrderGrid(np.zeros(d), np.ones(d), boundary=True, max_degree=5, split_up=True,
+                                            weight_cache_size=0)
+        grid_points = [list(np.linspace(0, 1, 5)), list(np.linspace(0, 1, 9)), [0, 0.25, 0.5, 0.625, 0.75, 1]]
+        grid_levels = [[0, 2, 1, 2, 0], [0, 3, 2, 3, 1, 3, 2, 3, 0], [0, 2, 1, 3, 2, 0]]
+        for points, levels in [(grid_points, grid_levels),
+                               # the new point set of the first dimension is already cached from the second one
+                               ([list(np.linspace(0, 1, 9))] + grid_points[1:], [grid_levels[1]] + grid_levels[1:])]:
+            grid.set_grid(points, levels)
+            grid_uncached.set_grid(points, levels)
+            for k in range(d):
+                self.assertTrue(np.array_equal(grid.weights[k], grid_uncached.weights[k]))
+        self.assertEqual(len(grid.weight_cache), 3)
+        self.assertEqual(len(grid_uncached.weight_cache), 0)
+
+    def test_monte_carlo(self):
+        d = 3
+        a = np.zeros(d)
+        b = np.ones(d) * 2
+        f = GenzGaussian(np.ones(d), np.ones(d))
+        reference_solution = f.getAnalyticSolutionIntegral(a, b)
+        for sampling in ['random', 'sobol', 'halton']:
+            integrator = IntegratorMonteCarlo(sampling=sampling, seed=42, chunk_size=1000)
+            integral = integrator(f, [2**13], a, b)
+            self.assertEqual(integrator.num_samples, 2**13)
+            self.assertLess(abs(integral[0] - reference_solution), 5 * integrator.error_estimate[0])
+            # QMC is much more accurate than the standard error of plain Monte Carlo
+            if sampling != 'random':
+                self.assertLess(integrator.error_estimate[0], 0.1 * math.sqrt(integrator.variance[0] / 2**13))
+        # stops as soon as the error estimate is below the tolerance
+        integrator = IntegratorMonteCarlo(sampling='sobol', seed=42, chunk_size=64, tolerance=10**-3)
+        integral = integrator(f, [2**16], a, b)
+        self.assertLess(integrator.num_samples, 2**16)
+        self.assertLess(integrator.error_estimate[0], 10**-3)
+        self.assertLess(abs(integral[0] - reference_solution), 5 * 10**-3)
+        # sample numbers which are not divisible by the number of streams are split across the streams
+        for num_points in [[1001], [3], [5, 7]]:
+            integrator = IntegratorMonteCarlo(sampling='halton', seed=42, chunk_size=100)
+            integral = integrator(f, num_points, a, b)
+            self.assertEqual(integrator.num_samples, np.prod(num_points))
+            self.assertTrue(np.isfinite(integral[0]))
+        # samples are mapped through the ppfs of the (truncated) distributions
+        from scipy.stats import norm, uniform
+        integrator = IntegratorMonteCarlo(sampling='sobol', seed=42, distributions=[norm, uniform])
+        integral = integrator(lambda x: x[0] * x[1], [2**13], [-2, 0], [3, 1])
+        self.assertAlmostEqual(integral[0], 0.5 * (norm.pdf(-2) - norm.pdf(3)), 3)
+        # montecarlo returns the mean of the function values, also for domains with zero volume
+        from sparseSpACE.MonteCarlo import montecarlo
+        mean = montecarlo(FunctionCustom(lambda x: x[0] + x[1]), 2**12, 2, [0, 0.5], [1, 0.5])
+        self.assertIsInstance(mean, float)
+        self.assertAlmostEqual(mean, 1.0, 1)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
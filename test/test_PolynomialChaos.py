@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import scipy.stats as sps
+import scipy.special
+from sparseSpACE.PolynomialChaos import *
+
+
+class TestPolynomialChaos(unittest.TestCase):
+    # checks the orthonormality of the polynomials with a Gauss quadrature of the distribution
+    def check_orthonormality(self, polynomials, nodes, weights, max_degree, places):
+        values = polynomials.evaluate(nodes, max_degree)
+        gram_matrix = np.dot(values * weights, values.T)
+        np.testing.assert_almost_equal(gram_matrix, np.eye(max_degree + 1), decimal=places)
+
+    def test_orthonormal_polynomials(self):
+        max_degree = 8
+        points, weights = np.polynomial.legendre.leggauss(20)
+        self.check_orthonormality(OrthonormalPolynomials1D.legendre(-1, 3), 1 + 2 * points, weights / 2, max_degree, 12)
+        points, weights = np.polynomial.hermite_e.hermegauss(20)
+        self.check_orthonormality(OrthonormalPolynomials1D.hermite(0.2, 1.5), 0.2 + 1.5 * points,
+                                  weights / np.sum(weights), max_degree, 12)
+        # Gauss-Jacobi quadrature for the weight (1 - t)^2 (1 + t) which belongs to Beta(2, 3) on [-1, 1]
+        points, weights = scipy.special.roots_jacobi(20, 2, 1)
+        self.check_orthonormality(OrthonormalPolynomials1D.jacobi(2, 3, 1, 4), 2.5 + 1.5 * points,
+                                  weights / np.sum(weights), max_degree, 12)
+
+    def test_stieltjes(self):
+        # the discretized Stieltjes procedure has to reproduce the known recurrence coefficients
+        max_degree = 6
+        for distribution, reference in [(sps.norm(0.2, 1.5), OrthonormalPolynomials1D.hermite(0.2, 1.5)),
+                                         (sps.uniform(-1, 4), OrthonormalPolynomials1D.legendre(-1, 3)),
+                                         (sps.beta(2, 3, loc=1, scale=3), OrthonormalPolynomials1D.jacobi(2, 3, 1, 4))]:
+            alphas, betas = OrthonormalPolynomials1D.stieltjes(distribution.ppf).get_recurrence_coefficients(max_degree)
+            alphas_reference, betas_reference = reference.get_recurrence_coefficients(max_degree)
+            np.testing.assert_allclose(alphas, alphas_reference, rtol=10 ** -6, atol=10 ** -6)
+            np.testing.assert_allclose(betas, betas_reference, rtol=10 ** -6)
+
+    def test_multi_indices(self):
+        multi_indices = OrthonormalPolynomialBasis.get_multi_indices(3, 2)
+        self.assertEqual(len(multi_indices), 10)
+        self.assertTrue(np.all(np.sum(multi_indices, axis=1) <= 2))
+        self.assertTrue(np.all(np.diff(np.sum(multi_indices, axis=1)) >= 0))
+        multi_indices = OrthonormalPolynomialBasis.get_multi_indices(3, [3, 1, 0])
+        self.assertEqual(multi_indices.tolist(), [[0, 0, 0], [1, 0, 0], [0, 1, 0], [2, 0, 0], [1, 1, 0], [3, 0, 0],
+                                                  [2, 1, 0]])
+
+    def test_expansion(self):
+        # f(x, y) = 1 + x + 2 y + x y with x, y uniformly distributed in [-1, 1] is represented exactly by a PCE of
+        # total degree 2 so the statistics are known analytically
+        polynomials = OrthonormalPolynomials1D.legendre(-1, 1)
+        basis = OrthonormalPolynomialBasis([polynomials, polynomials],
+                                           OrthonormalPolynomialBasis.get_multi_indices(2, 2))
+        points_1d, weights_1d = np.polynomial.legendre.leggauss(4)
+        nodes = np.array([(x, y) for x in points_1d for y in points_1d])
+        weights = np.array([wx * wy for wx in weights_1d for wy in weights_1d]) / 4
+        values = (1 + nodes[:, 0] + 2 * nodes[:, 1] + nodes[:, 0] * nodes[:, 1]).reshape((-1, 1))
+        pce = PolynomialChaosExpansion.from_quadrature(basis, nodes, weights, values)
+        test_points = np.random.rand(10, 2) * 2 - 1
+        np.testing.assert_allclose(pce(test_points)[:, 0], 1 + test_points[:, 0] + 2 * test_points[:, 1] +
+                                   test_points[:, 0] * test_points[:, 1])
+        # Var(x) = 1/3, Var(2y) = 4/3, Var(xy) = 1/9
+        variance = 1 / 3 + 4 / 3 + 1 / 9
+        self.assertAlmostEqual(pce.get_expectation()[0], 1.0)
+        self.assertAlmostEqual(pce.get_variance()[0], variance)
+        np.testing.assert_allclose(pce.get_first_order_sobol_indices()[:, 0], [1 / 3 / variance, 4 / 3 / variance])
+        np.testing.assert_allclose(pce.get_total_order_sobol_indices()[:, 0],
+                                   [(1 / 3 + 1 / 9) / variance, (4 / 3 + 1 / 9) / variance])
+        # the chaospy polynomial is the same polynomial
+        import chaospy as cp
+        polynomial = pce.to_chaospy()
+        self.assertEqual(polynomial.shape, (1,))
+        np.testing.assert_allclose(polynomial(*test_points.T)[0], pce(test_points)[:, 0])
+        np.testing.assert_allclose(cp.around(polynomial, 3)(*test_points.T)[0], pce(test_points)[:, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -259,5 +259,70 @@ class TestRefinementContainer(unittest.TestCase):
             self.assertEqual(container.size(), 100)
             self.assertEqual(len(container.get_new_objects()), 100)
 
+    def test_heap_selection(self):
+        # initialize container with random volumes
+        np.random.seed(7)
+        ref_objects = []
+        grid = TrapezoidalGrid(np.zeros(2), np.ones(2))
+        for d in range(200):
+            ref_object = RefinementObjectSingleDimension(0, 1, 0, 1, (0, 1), grid, 0, 1)
+            ref_object.volume = np.array([np.random.rand()])
+            ref_object.evaluations = np.random.randint(1, 5)
+            ref_objects.append(ref_object)
+        container = RefinementContainer(ref_objects, 1, error_estimator=ErrorCalculatorSingleDimVolumeGuided())
+        for d in range(200):
+            container.calc_error(d, np.inf)
+            container.set_benefit(d)
+        for _ in range(3):
+            objects = container.get_objects()
+            max_benefit = max(float(obj.benefit) for obj in objects)
+            self.assertEqual(container.get_max_benefit(), max_benefit)
+            self.assertEqual(container.get_max_error(), max(float(obj.error) for obj in objects))
+            self.assertAlmostEqual(float(container.get_total_error()), sum(float(obj.error) for obj in objects))
+            # the candidates above the margin are returned in order of their positions
+            container.clear_new_objects()
+            tolerance = 0.5 * max_benefit
+            expected = [i for i, obj in enumerate(objects) if obj.benefit >= tolerance]
+            positions = []
+            while True:
+                is_found, position, next_obj = container.get_next_object_for_refinement(tolerance)
+                if not is_found:
+                    break
+                positions.append(position)
+                container.refine(position)
+            self.assertEqual(positions, expected)
+            # the refined objects are removed and the new objects get new errors
+            container.apply_remove()
+            container.refinement_postprocessing()
+            for i in range(container.size() - container.new_objects_size(), container.size()):
+                container.get_object(i).volume = np.array([np.random.rand()])
+                container.get_object(i).evaluations = np.random.randint(1, 5)
+                container.calc_error(i, np.inf)
+                container.set_benefit(i)
+        # the running total is recomputed after reinitialization
+        container.reinit_new_objects()
+        self.assertEqual(container.get_total_error(), 0.0)
+
+
+    def test_interval_index(self):
+        grid = TrapezoidalGrid(np.zeros(2), np.ones(2))
+        ref_objects = [RefinementObjectSingleDimension(i / 8, (i + 1) / 8, 0, 1, (3, 3), grid, 0, 1) for i in range(8)]
+        container = RefinementContainer(ref_objects, 1, error_estimator=ErrorCalculatorSingleDimVolumeGuided())
+        for _ in range(3):
+            # refine every third object and sort the new objects into the container
+            for position in range(0, container.size(), 3):
+                container.refine(position)
+            container.apply_remove(sort=True)
+            starts, ends = container.get_interval_index()
+            self.assertEqual(list(starts), [obj.start for obj in container.get_objects()])
+            self.assertEqual(list(ends), [obj.end for obj in container.get_objects()])
+            lower_bounds = np.random.rand(50)
+            upper_bounds = lower_bounds + np.random.rand(50) * 0.5
+            first, last = container.get_positions_in_intervals(lower_bounds, upper_bounds)
+            for i in range(50):
+                positions = [k for k, obj in enumerate(container.get_objects()) if lower_bounds[i] <= obj.start < upper_bounds[i]]
+                self.assertEqual(list(range(first[i], last[i])), positions)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -90,6 +90,36 @@ class TestRegression(unittest.TestCase):
         self.assertEqual(C[0][1], C[1][2])
         self.assertEqual(C[1][0], -0.3333333333333333)
 
+    def test_calculate_alphas_matrix_free(self):
+        """
+        Test that the matrix-free CG solver computes the same surpluses as the dense solver
+        """
+        np.random.seed(42)
+        data = np.random.rand(200, 3)
+        target = np.sin(np.sum(data, axis=1))
+
+        for regularization_matrix in ['C', 'I']:
+            regression = Regression(data=data, target_values=target, regularization=0.01,
+                                    regularization_matrix=regularization_matrix)
+            regression.training_target_values = regression.target_values
+            regression.training_data = regression.data
+
+            levelvec = [2, 3, 1]
+            numPoints = 2 ** (np.asarray(levelvec, dtype=int))
+            numPoints -= 1
+            regression.grid.numPoints = numPoints
+
+            A = regression.build_A_matrix(levelvec)
+            self.assertTrue(np.allclose(regression.build_A_matrix_sparse(levelvec).toarray(), A, rtol=0, atol=1e-14))
+            alphas = np.random.rand(len(A[0]))
+            self.assertTrue(np.allclose(regression.apply_C_matrix(levelvec, alphas),
+                                        np.dot(regression.build_C_matrix(levelvec), alphas), rtol=0, atol=1e-13))
+
+            alphas_dense = regression.solve_regression_smooth(levelvec)
+            regression.solver = 'cg'
+            alphas_matrix_free = regression.solve_regression_smooth(levelvec)
+            self.assertTrue(np.allclose(alphas_matrix_free, alphas_dense, rtol=0, atol=1e-7))
+
     def test_Opticom_sum_always_1(self):
         """
         Test that the sum of the coefficients (component grids) is always 1 after Opticom
@@ -1,6 +1,7 @@
 import unittest
 import sparseSpACE
 from sparseSpACE.StandardCombi import *
+from sparseSpACE.DimAdaptiveCombi import *
 import math
 from sparseSpACE.Function import *
 
@@ -57,6 +58,38 @@ class TestStandardCombi(unittest.TestCase):
                         factor = abs(f(p)[0] if f(p)[0] != 0 else 1)
                         self.assertAlmostEqual((f(p)[0] - interpolated_points[i][0])/factor, 0, 13)
 
+    def test_interpolation_multilinear(self):
+        for d in range(1, 5):
+            mesh_points_grid = [np.linspace(-1, 2, 3 + i) for i in range(d)]
+            values = np.random.rand(np.prod([len(grid_d) for grid_d in mesh_points_grid]), 4)
+            evaluation_points = np.random.rand(20, d) * 3 - 1
+            evaluation_points[0] = -1
+            evaluation_points[1] = 2
+            interpolated_values = Interpolation.interpolate_points(values, d, None, mesh_points_grid, evaluation_points)
+            reference_values = Interpolation.interpolate_points(values, d, None, mesh_points_grid, evaluation_points,
+                                                                use_interpn=True)
+            self.assertEqual(np.shape(interpolated_values), (20, 4))
+            self.assertTrue(np.allclose(interpolated_values, reference_values, rtol=1e-13, atol=1e-13))
+
+    def test_executors(self):
+        a = -1
+        b = 7
+        d = 3
+        f = GenzGaussian(np.ones(d) * 3, np.ones(d) * 0.1)
+        grid_points = get_cross_product_list([np.linspace(a, b, 4, endpoint=False) for _ in range(d)])
+        results = []
+        for executor in [SerialComponentGridExecutor(), ThreadComponentGridExecutor(num_workers=3),
+                         ProcessComponentGridExecutor(num_workers=2)]:
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b), dim=d)
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation,
+                                          executor=executor)
+            scheme, error, integral = standardCombi.perform_operation(1, 4)
+            results.append((integral, standardCombi(grid_points)))
+        # the partial results are merged in a fixed order so all executors return identical results
+        for integral, interpolated_values in results[1:]:
+            self.assertTrue(np.array_equal(integral, results[0][0]))
+            self.assertTrue(np.array_equal(interpolated_values, results[0][1]))
+
     def test_number_of_points(self):
         a = -3
         b = 7.3
@@ -76,5 +109,25 @@ class TestStandardCombi(unittest.TestCase):
                         self.assertEqual(standardCombi.get_num_points_component_grid(component_grid.levelvector, False), np.prod(standardCombi.grid.levelToNumPoints(component_grid.levelvector)))
 
 
+    def test_dim_adaptive(self):
+        a = np.zeros(3)
+        b = np.ones(3)
+        f = GenzCornerPeak(coeffs=np.array([3.0, 1.0, 0.5]))
+        reference_solution = f.getAnalyticSolutionIntegral(a, b)
+        for refinements_per_iteration in [1, 4]:
+            operation = Integration(f, grid=TrapezoidalGrid(a, b), dim=3, reference_solution=reference_solution)
+            dimAdaptiveCombi = DimAdaptiveCombi(a, b, operation=operation, print_level=print_levels.NONE)
+            scheme, error, integral, errors, num_points = dimAdaptiveCombi.perform_combi(
+                1, 2, 10**-3, refinements_per_iteration=refinements_per_iteration)
+            self.assertLess(error / abs(reference_solution), 10**-3)
+            self.assertEqual(len(errors), len(num_points))
+            # the incrementally updated result equals the combination of the final scheme
+            combined_integral = sum(operation.grid.integrate(f, component_grid.levelvector, a, b) * component_grid.coefficient for component_grid in scheme)
+            self.assertAlmostEqual(integral[0], combined_integral[0], 14)
+            self.assertEqual(sum(component_grid.coefficient for component_grid in scheme), 1)
+            # the most important dimension is refined the most
+            self.assertEqual(np.argmax(dimAdaptiveCombi.lmax), 0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -49,6 +49,102 @@ class TestUncertaintyQuantification(unittest.TestCase):
         assert abs(E - E_ref) < 0.3, E
         assert abs(Var - Var_ref) < 1.0, Var
 
+    def test_expectation_variance_chunked(self):
+        # The chunked evaluation of the component grids has to give the same results as the evaluation of all points
+        # at once and count the same distinct points
+        dim = 3
+        distributions = [("Normal", 0.2, 1.0) for _ in range(dim)]
+        a = np.array([-np.inf] * dim)
+        b = np.array([np.inf] * dim)
+        results = []
+        for chunk_size in [None, 7]:
+            op = UncertaintyQuantification(FunctionUQ(), distributions, a, b, chunk_size=chunk_size)
+            grid = GlobalTrapezoidalGridWeighted(a, b, op, boundary=False)
+            op.set_grid(grid)
+            self.assertEqual(grid.chunk_size, chunk_size)
+            op.set_expectation_variance_Function()
+            combiinstance = SpatiallyAdaptiveSingleDimensions2(a, b, operation=op, norm=2,
+                                                               use_volume_weighting=True,
+                                                               grid_surplusses=op.get_grid())
+            combiinstance.performSpatiallyAdaptiv(1, 2, ErrorCalculatorSingleDimVolumeGuided(), tol=0,
+                                                  max_evaluations=100, print_output=False)
+            (E,), (Var,) = op.calculate_expectation_and_variance(combiinstance)
+            results.append((E, Var, op.get_distinct_points(None)))
+        self.assertAlmostEqual(results[0][0], results[1][0], places=12)
+        self.assertAlmostEqual(results[0][1], results[1][1], places=12)
+        self.assertEqual(results[0][2], results[1][2])
+
+    def test_moments_from_nodes(self):
+        # The moments calculated from the deduplicated nodes have to match a summation over all nodes of the
+        # component grids
+        dim = 2
+        a = np.zeros(dim)
+        b = np.ones(dim)
+        problem_function = FunctionCustom([lambda x: np.exp(x[0]) * np.sin(3 * x[1]), lambda x: x[0] * x[1] ** 2])
+        op = UncertaintyQuantification(problem_function, "Uniform", a, b)
+        op.set_grid(GlobalTrapezoidalGrid(a, b, boundary=True))
+        op.set_expectation_variance_Function()
+        combiinstance = SpatiallyAdaptiveSingleDimensions2(a, b, operation=op)
+        combiinstance.performSpatiallyAdaptiv(1, 2, ErrorCalculatorSingleDimVolumeGuided(), tol=0,
+                                              max_evaluations=100, print_output=False)
+        nodes, weights = combiinstance.get_points_and_weights()
+        moments = op.calculate_moments(combiinstance, [1, 2, 3])
+        self.assertEqual(np.shape(moments), (3, 2))
+        self.assertLess(len(op.nodes), len(nodes))
+        self.assertEqual(len(np.unique(op.nodes, axis=0)), len(op.nodes))
+        for i, k in enumerate([1, 2, 3]):
+            moment_reference = sum(problem_function(node) ** k * weight for node, weight in zip(nodes, weights))
+            np.testing.assert_allclose(moments[i], moment_reference, rtol=1e-12)
+            np.testing.assert_allclose(op.calculate_moment(combiinstance, k=k, use_combiinstance_solution=False),
+                                       moment_reference, rtol=1e-12)
+        E, Var = op.calculate_expectation_and_variance(combiinstance, use_combiinstance_solution=False)
+        np.testing.assert_allclose(E, moments[0], rtol=1e-12)
+        np.testing.assert_allclose(Var, moments[1] - moments[0] ** 2, rtol=1e-12)
+
+    def test_distribution_moments(self):
+        # The closed form moments of the intervals between grid points have to match numerical integration
+        from scipy import integrate
+        distributions = [(UQDistribution.uniform(-1, 3), sps.uniform(-1, 4), np.linspace(-1, 3, 7)),
+                         (UQDistribution.triangle(0, 0.3, 1), sps.triang(0.3, scale=1), np.linspace(0, 1, 7)),
+                         (UQDistribution.normal(0.2, 1.5), sps.norm(0.2, 1.5), [-np.inf, -2, -0.5, 0.2, 1, 3, np.inf]),
+                         (UQDistribution.truncated_normal(0.2, 1.5, -1, 2),
+                          sps.truncnorm(-0.8, 1.2, loc=0.2, scale=1.5), np.linspace(-1, 2, 7)),
+                         (UQDistribution.laplace(0.5, 2), sps.laplace(0.5, 2), [-np.inf, -3, 0, 0.5, 1, 4, np.inf]),
+                         (UQDistribution.beta(2, 3, 1, 4), sps.beta(2, 3, loc=1, scale=3), np.linspace(1, 4, 7))]
+        for distribution, reference, points in distributions:
+            moments_0, moments_1 = distribution.get_interval_moments(points)
+            np.testing.assert_allclose(moments_0, np.diff(reference.cdf(points)), atol=10 ** -14)
+            moments_1_reference = [integrate.quad(lambda x: x * reference.pdf(x), x1, x2, epsabs=10 ** -13)[0]
+                                   for x1, x2 in zip(points[:-1], points[1:])]
+            np.testing.assert_allclose(moments_1, moments_1_reference, atol=10 ** -12)
+            self.assertAlmostEqual(distribution.get_first_moment(points[1], points[2]), moments_1_reference[1])
+            # the ppf works on arrays
+            np.testing.assert_allclose(distribution.ppf(np.array([0.1, 0.5, 0.9])), reference.ppf([0.1, 0.5, 0.9]))
+            integral_reference = integrate.quad(lambda x: np.cos(x) * reference.pdf(x), points[1], points[4],
+                                                epsabs=10 ** -13)[0]
+            self.assertAlmostEqual(distribution.calculate_integral(np.cos, points[1], points[4]), integral_reference,
+                                   places=9)
+        # without a closed form only the new intervals of a refined grid are integrated numerically
+        distribution = UQDistribution(sps.norm.pdf, sps.norm.cdf, sps.norm.ppf)
+        distribution.get_interval_moments([-1, 0, 1])
+        moments_0, moments_1 = distribution.get_interval_moments([-1, -0.5, 0, 1])
+        self.assertEqual(set(distribution.cached_interval_moments), {(-1, 0), (0, 1), (-1, -0.5), (-0.5, 0)})
+        np.testing.assert_allclose(moments_0, np.diff(sps.norm.cdf([-1, -0.5, 0, 1])))
+        np.testing.assert_allclose(moments_1, np.diff(-sps.norm.pdf([-1, -0.5, 0, 1])), rtol=10 ** -6)
+        # the least recently used intervals are evicted from the bounded cache
+        distribution = UQDistribution(sps.norm.pdf, sps.norm.cdf, sps.norm.ppf, interval_cache_size=3)
+        distribution.get_interval_moments([-1, -0.5, 0, 1])
+        distribution.get_interval_moments([-1, -0.5, 0.5])
+        self.assertEqual(list(distribution.cached_interval_moments), [(0, 1), (-1, -0.5), (-0.5, 0.5)])
+
+    def test_distribution_integral_wide_interval(self):
+        # A fixed Gauss-Legendre rule does not resolve the pdf on intervals which are wide compared to the standard
+        # deviation
+        func = lambda x: x ** 3 + 1
+        for distribution in [UQDistribution.normal(0, 1), UQDistribution.truncated_normal(0, 1, -37, 37)]:
+            for bound in [8, 37]:
+                self.assertAlmostEqual(distribution.calculate_integral(func, -bound, bound), 1.0, places=12)
+
     def test_pce(self):
         problem_function = FunctionUQ()
         dim = 3
@@ -61,6 +61,27 @@ class TestCombiScheme(unittest.TestCase):
                             sum_of_coefficients += component_grid.coefficient
                         self.assertEqual(sum_of_coefficients, 1)
 
+    def test_incremental_coefficients(self):
+        for d in range(2, 6):
+            combi_scheme = CombiScheme(dim=d)
+            for l in range(1, 8 - d):
+                for l2 in range(1, l+1):
+                    combi_scheme.init_adaptive_combi_scheme(lmin=l2, lmax=l)
+                    scheme = dict(combi_scheme.get_coefficient_changes())
+                    for i in range(10):
+                        combi_scheme.update_adaptive_combi(sorted(combi_scheme.active_index_set)[i % 3 - 1])
+                        # applying the changes to the previous scheme gives the new scheme
+                        for levelvec, coefficient in combi_scheme.get_coefficient_changes().items():
+                            if coefficient == 0:
+                                scheme.pop(levelvec, None)
+                            else:
+                                scheme[levelvec] = coefficient
+                        combi_grids = combi_scheme.getCombiScheme(lmin=l2, lmax=l, do_print=False)
+                        reference_grids = combi_scheme.get_coefficients_to_index_set(combi_scheme.get_index_set())
+                        coefficients = {tuple(g.levelvector): g.coefficient for g in combi_grids}
+                        self.assertEqual(coefficients, {tuple(g.levelvector): g.coefficient for g in reference_grids})
+                        self.assertEqual(coefficients, scheme)
+
     def test_downward_closed_adaptive(self):
         for d in range(2, 6):
             combi_scheme = CombiScheme(dim=d)
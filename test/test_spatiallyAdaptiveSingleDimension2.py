@@ -121,5 +121,37 @@ class TestSpatiallyAdaptiveSingleDimension2(unittest.TestCase):
                         factor = abs(f(points[i])[0]) if abs(f(points[i])[0]) != 0 else 1
                         self.assertAlmostEqual((value[0] - f(points[i])[0]) / factor, 0.0, places=10)
 
+    def test_reuse_component_grid_results(self):
+        class IntegrationCounted(Integration):
+            def __init__(self, *args, reuse=True, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.reuse = reuse
+                self.computations = 0
+
+            def compute_result_dimension_wise(self, gridPointCoordsAsStripes, grid_point_levels, component_grid):
+                self.computations += 1
+                return super().compute_result_dimension_wise(gridPointCoordsAsStripes, grid_point_levels, component_grid)
+
+            def supports_result_reuse_dimension_wise(self):
+                return self.reuse
+
+        d = 3
+        a = np.zeros(d)
+        b = np.ones(d)
+        f = GenzDiscontinious(border=np.ones(d) * 0.3, coeffs=np.ones(d) * 5)
+        results = []
+        operations = []
+        for reuse in [True, False]:
+            grid = GlobalTrapezoidalGrid(a, b, boundary=True, modified_basis=False)
+            operation = IntegrationCounted(f, grid=grid, dim=d, reference_solution=f.getAnalyticSolutionIntegral(a, b), reuse=reuse)
+            spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a, b, operation=operation)
+            results.append(spatiallyAdaptive.performSpatiallyAdaptiv(1, 2, ErrorCalculatorSingleDimVolumeGuided(), -1, max_evaluations=2000, print_output=False))
+            operations.append(operation)
+        # reusing the results of unchanged component grids does not change the refinement
+        self.assertEqual(list(results[0][3]), list(results[1][3]))
+        self.assertEqual(results[0][5], results[1][5])
+        self.assertEqual(results[0][7], results[1][7])
+        self.assertLess(operations[0].computations, operations[1].computations)
+
 if __name__ == '__main__':
     unittest.main()